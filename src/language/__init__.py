@@ -5,17 +5,27 @@
 This file contains a class to create the translation object.
 
 In this file the function _() or self._() will be initialised.
+
+The catalogs are loaded once per process and language list and kept,
+so that the translation object of a message costs a dictionary lookup
+instead of reading and parsing the .mo files again.
 """
 
 
 import gettext
-import multiprocessing
+import threading
 
 
 class Language(object):
     """
-    The purpose of this class is to keep the CreateTranslationObject 
-    function multiprocessing safe.
+    This class creates the translation objects of the bot and caches
+    them per process.
+
+    The cache maps the domain, the locale directory and the languages
+    to the loaded translation object, a lock keeps two threads from
+    loading the same one. Every process has its own cache, it's
+    dropped when the object is pickled to a new process. The cached
+    objects are shared by all the callers and must not be changed.
     """
     
     def __init__(self,
@@ -26,17 +36,31 @@ class Language(object):
                 the default languages of the bot.
         """
 
-        self.RLock = multiprocessing.RLock() 
         self.DefaultLanguages = DefaultLanguages
         self.Localedir = "language"
         self.Domain = "Telegram"
-
+        
+        # the loaded translation objects of this process, the lock is 
+        # only taken to load a missing one
+        self.Catalogs = {}
+        self.Lock = threading.Lock()
+    
+    def __getstate__(self):
+        State = self.__dict__.copy()
+        State["Catalogs"] = {}
+        del State["Lock"]
+        return State
+    
+    def __setstate__(self, State):
+        self.__dict__.update(State)
+        self.Lock = threading.Lock()
         
     def CreateTranslationObject(self,
                                 Languages = None,
                                 ):
         """
-        This function returns a gettext object.
+        This function returns a gettext object, it's loaded on the 
+        first call with the languages.
 
         Variables:
             Languages            ``array of strings or None``
@@ -54,12 +78,20 @@ class Language(object):
         else:
             raise TypeError
 
-        with self.RLock:
-            LanguageObject = gettext.translation(
-                                    domain = self.Domain,
-                                    localedir=self.Localedir,
-                                    languages=Languages
-                                )
+        Key = (self.Domain, self.Localedir, tuple(Languages))
+        LanguageObject = self.Catalogs.get(Key)
+        if LanguageObject is not None:
+            return LanguageObject
+        
+        with self.Lock:
+            LanguageObject = self.Catalogs.get(Key)
+            if LanguageObject is None:
+                LanguageObject = gettext.translation(
+                                        domain = self.Domain,
+                                        localedir=self.Localedir,
+                                        languages=Languages
+                                    )
+                self.Catalogs[Key] = LanguageObject
 
         return LanguageObject
 
@@ -0,0 +1,287 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the data a SubWorker loads once for a whole batch of
+updates.
+
+Instead of looking up the user, his language and his session state for
+every single message, the users of all the updates of a batch are
+loaded with one query and their sessions with a second one. The
+message processors of the batch read and update these entries, so that
+a later message of the same user in the batch sees the changes of the
+earlier ones.
+"""
+
+# standard lib
+import collections
+
+
+class Batch(object):
+    """
+    This class holds the users and the sessions of a batch of updates.
+
+    .. code-block:: python\n
+        Batch = Batch.Load(SqlObject, Cursor, Updates)
+        for Update in Updates:
+            MessageProcessor(Update, ..., Batch = Batch).InterpretMessage()
+    """
+
+    USER_QUERY = (
+        "SELECT User_Table.External_Id, User_Table.Internal_Id, "
+        "User_Table.Is_Admin, User_Setting_Table.User_String FROM "
+        "User_Table LEFT JOIN (User_Setting_Table INNER JOIN Setting_Table "
+        "ON User_Setting_Table.Master_Setting_Id=Setting_Table.Id AND "
+        "Setting_Table.Setting_Name='Language') ON "
+        "User_Setting_Table.Set_By_User=User_Table.Internal_Id "
+        "WHERE User_Table.External_Id IN ({Placeholders});"
+        )
+    """
+    The internal id, the admin state and the language of the users.
+    """
+
+    SESSION_QUERY = (
+        "SELECT Command_By_User, Command, Last_Used_Id, Last_Used_Data "
+        "FROM Session_Table WHERE Command_By_User IN ({Placeholders});"
+        )
+    """
+    The last commands of the users.
+    """
+
+    def __init__(self, Users = None, Sessions = None):
+        """
+        Variables:
+            Users                         ``dictionary``
+                the external user id and the dictionary with the
+                Internal_Id, Is_Admin and Language of the user
+
+            Sessions                      ``dictionary``
+                the internal user id and the dictionary with the
+                Command, Last_Used_Id and Last_Used_Data of the user
+        """
+        self.Users = Users if Users is not None else {}
+        self.Sessions = Sessions if Sessions is not None else {}
+
+    @staticmethod
+    def GetUserId(Update):
+        """
+        This method returns the external id of the sender of an update,
+        None if it has no sender.
+
+        Variables:
+            Update                        ``dictionary``
+                the update from the telegram servers
+        """
+        try:
+            return Update["message"]["from"]["id"]
+        except (KeyError, TypeError):
+            return None
+
+    @staticmethod
+    def GroupByUser(Updates):
+        """
+        This method returns the updates grouped by their sender, in the
+        order of the first update of every sender.
+
+        Variables:
+            Updates                       ``list``
+                the updates of the batch
+        """
+        Groups = collections.OrderedDict()
+        for Update in Updates:
+            Groups.setdefault(Batch.GetUserId(Update), []).append(Update)
+        return Groups
+
+    @staticmethod
+    def GroupIndependent(Updates):
+        """
+        This method returns the updates split into groups that can be
+        processed at the same time. The updates of a chat and the
+        updates of a sender are always in the same group, in their
+        order.
+
+        Variables:
+            Updates                       ``list``
+                the updates of the batch
+        """
+        Groups = {}
+        Owners = {}
+        for Position, Update in enumerate(Updates):
+            try:
+                ChatId = Update["message"]["chat"]["id"]
+            except (KeyError, TypeError):
+                ChatId = None
+            Keys = [Key for Key in (("Chat", ChatId),
+                                    ("User", Batch.GetUserId(Update)))
+                    if Key[1] is not None]
+            Found = sorted(set(Owners[Key] for Key in Keys if Key in Owners))
+            if Found:
+                Group = Found[0]
+                # the update connects several groups, they become one
+                for Other in Found[1:]:
+                    Groups[Group].extend(Groups.pop(Other))
+                    for Key, Owner in Owners.items():
+                        if Owner == Other:
+                            Owners[Key] = Group
+            else:
+                Group = Position
+                Groups[Group] = []
+            Groups[Group].append((Position, Update))
+            for Key in Keys:
+                Owners[Key] = Group
+        return [[Update for Position, Update in sorted(Groups[Group],
+                                                      key = lambda x: x[0])]
+                for Group in sorted(Groups)]
+
+    @staticmethod
+    def _Select_(SqlObject, Cursor, Query, Keys):
+        """
+        This method runs a query with an IN clause over all the keys.
+        """
+        Keys = list(Keys)
+        if not Keys:
+            return []
+        Query = Query.format(Placeholders = ", ".join(["%s"] * len(Keys)))
+        return SqlObject.ExecuteTrueQuery(Cursor, Query, tuple(Keys)) or []
+
+    @classmethod
+    def Load(cls, SqlObject, Cursor, Updates, UserCache = None,
+             Sessions = None):
+        """
+        This method loads the users and the sessions of all the senders
+        of the updates, with one query each. The users found in the
+        cache aren't queried, the queried ones are added to it. The
+        sessions are loaded into the session store instead, if there is
+        one.
+
+        Variables:
+            SqlObject                     ``sql.Api``
+                the database connection of the worker
+
+            Cursor                        ``object``
+                a dictionary cursor of the database connection
+
+            Updates                       ``list``
+                the updates of the batch
+
+            UserCache                     ``None or messages.user_cache.UserCache``
+                the recently seen users of the worker
+
+            Sessions                      ``None or messages.session.MemorySessionStore``
+                the sessions kept by the worker
+        """
+        UserIds = [UserId for UserId in cls.GroupByUser(Updates)
+                   if UserId is not None]
+
+        Users = {}
+        if UserCache is not None:
+            for UserId in UserIds:
+                User = UserCache.Get(UserId)
+                if User is not None:
+                    Users[UserId] = User
+            UserIds = [UserId for UserId in UserIds if UserId not in Users]
+        for Row in cls._Select_(SqlObject, Cursor, cls.USER_QUERY, UserIds):
+            Users[Row["External_Id"]] = {
+                "Internal_Id": Row["Internal_Id"],
+                "Is_Admin": bool(Row["Is_Admin"]),
+                "Language": Row["User_String"],
+                }
+            # a user without a language isn't completely registered
+            if UserCache is not None and Row["User_String"] is not None:
+                UserCache.Set(Row["External_Id"], Row["Internal_Id"],
+                              bool(Row["Is_Admin"]), Row["User_String"])
+
+        if Sessions is not None:
+            Sessions.Prefetch(SqlObject, Cursor,
+                              [User["Internal_Id"] for User in Users.values()])
+            return cls(Users)
+
+        Sessions = {}
+        for Row in cls._Select_(SqlObject, Cursor, cls.SESSION_QUERY,
+                                [User["Internal_Id"]
+                                 for User in Users.values()]):
+            Sessions[Row["Command_By_User"]] = {
+                "Command": Row["Command"],
+                "Last_Used_Id": Row["Last_Used_Id"],
+                "Last_Used_Data": Row["Last_Used_Data"],
+                }
+        # the known users without a session have none
+        for User in Users.values():
+            Sessions.setdefault(User["Internal_Id"], None)
+
+        return cls(Users, Sessions)
+
+    def GetUser(self, UserId):
+        """
+        This method returns the loaded user, None if he isn't known.
+
+        Variables:
+            UserId                        ``integer``
+                the external id of the user
+        """
+        return self.Users.get(UserId)
+
+    def SetUser(self, UserId, InternalId, IsAdmin, Language):
+        """
+        This method adds or replaces a user, for example after he has
+        been added to the database.
+
+        Variables:
+            UserId                        ``integer``
+                the external id of the user
+
+            InternalId                    ``integer``
+                the internal id of the user
+
+            IsAdmin                       ``boolean``
+                if the user is an admin
+
+            Language                      ``string``
+                the language setting of the user
+        """
+        self.Users[UserId] = {"Internal_Id": InternalId,
+                              "Is_Admin": IsAdmin,
+                              "Language": Language}
+        self.Sessions.setdefault(InternalId, None)
+
+    def HasSession(self, InternalId):
+        """
+        This method returns True if the session of the user has been
+        loaded (even if he has none), so that it doesn't have to be
+        queried.
+
+        Variables:
+            InternalId                    ``integer``
+                the internal id of the user
+        """
+        return InternalId in self.Sessions
+
+    def GetSession(self, InternalId):
+        """
+        This method returns the last command of the user, None if there
+        is none.
+
+        Variables:
+            InternalId                    ``integer``
+                the internal id of the user
+        """
+        return self.Sessions.get(InternalId)
+
+    def UpdateSession(self, InternalId, **Columns):
+        """
+        This method changes the loaded session of the user, after it has
+        been changed in the database.
+
+        Variables:
+            InternalId                    ``integer``
+                the internal id of the user
+
+            Columns                       ``dictionary``
+                the changed columns of the Session_Table
+        """
+        Session = self.Sessions.get(InternalId)
+        if Session is None:
+            Session = {"Command": None, "Last_Used_Id": None,
+                       "Last_Used_Data": None}
+            self.Sessions[InternalId] = Session
+        Session.update(Columns)
@@ -25,6 +25,20 @@ class MessageToBeSend(object):
         https://core.telegram.org/bots/api
     """
     
+    INTERACTIVE = "Interactive"
+    """
+    The lane of the replies to the users, they are sent first.
+    """
+    ADMIN = "Admin"
+    """
+    The lane of the answers to the admin commands.
+    """
+    BULK = "Bulk"
+    """
+    The lane of the broadcasts and the long replies, they only get what
+    the other lanes leave of the rate limits.
+    """
+    
     def __init__(
                  self, 
                  ToChatId,
@@ -33,6 +47,7 @@ class MessageToBeSend(object):
                  DisableWebPagePreview=False,
                  DisableNotification = False,
                  ReplyToMessageId=None,
+                 Lane = INTERACTIVE,
                  ):
         """
         The init of the class.
@@ -109,6 +124,11 @@ class MessageToBeSend(object):
                 id given
                 read more:
                     https://telegram.org/blog/replies-mentions-hashtags      
+            
+            Lane                  ``string``
+                the lane of the output the message is sent in (see
+                ``network.limiter.MessageScheduler``), INTERACTIVE,
+                ADMIN or BULK
                     
         """
         
@@ -119,6 +139,7 @@ class MessageToBeSend(object):
         self.DisableNotification = DisableNotification
         self.ReplyToMessageId = ReplyToMessageId
         self.ReplyMarkup = {}
+        self.Lane = Lane
     
     def SetParserMode(self, Parser="HTML"):
         """
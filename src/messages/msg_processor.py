@@ -9,6 +9,8 @@ import datetime
 # The custom modules
 from . import message # imports in the same folder (module)
 from . import emojis
+from . import batch
+from . import router
 
 class MessagePreProcessor(object):
     """
@@ -43,6 +45,31 @@ class MessagePreProcessor(object):
         }
     
     """
+    
+    REGISTER_USER_QUERY = (
+        "INSERT INTO User_Table (External_Id, User_Name, First_Name, "
+        "Last_Name) VALUES (%(External_Id)s, %(User_Name)s, "
+        "%(First_Name)s, %(Last_Name)s) ON DUPLICATE KEY UPDATE "
+        "Internal_Id=LAST_INSERT_ID(Internal_Id);"
+        )
+    """
+    Adds the user, if he exists already nothing is changed. The 
+    internal id is the last row id in both cases.
+    """
+    
+    REGISTER_SETTING_QUERY = (
+        "INSERT INTO User_Setting_Table (Master_Setting_Id, Set_By_User, "
+        "User_String) SELECT %(Setting)s, %(User)s, %(Value)s FROM DUAL "
+        "WHERE NOT EXISTS (SELECT 1 FROM User_Setting_Table WHERE "
+        "Master_Setting_Id=%(Setting)s AND Set_By_User=%(User)s);"
+        )
+    """
+    Adds a setting of the user, if he doesn't have it yet.
+    """
+    
+    # the id and the default of the language setting, they are the same
+    # for all the users, so they are only queried once per process
+    _DefaultLanguage = None
 
     def __init__(self, 
                  MessageObject,
@@ -51,12 +78,31 @@ class MessagePreProcessor(object):
                  Cursor,
                  LanguageObject,
                  LoggingObject,
-                 ConfigurationObject,):
+                 ConfigurationObject,
+                 Batch = None,
+                 UserCache = None,
+                 Sessions = None,
+                 BotName = None,):
         """
         Variables:
             MessageObject                 ``object``
                 the message to be analysed message
                 
+            Batch                         ``None or messages.batch.Batch``
+                the users and sessions loaded for the whole batch of 
+                updates, None queries them for this message
+                
+            UserCache                     ``None or messages.user_cache.UserCache``
+                the recently seen users of the worker, the changes of 
+                the user are written through to it
+                
+            Sessions                      ``None or messages.session.MemorySessionStore``
+                the sessions kept by the worker, None reads and writes 
+                them in the database directly
+                
+            BotName                       ``None or string``
+                the username of the bot, the commands addressed to 
+                another bot are ignored, None takes every name as its own
 
         """
 
@@ -77,8 +123,13 @@ class MessagePreProcessor(object):
         self.SqlCursor = Cursor
 
         self.LoggingObject = LoggingObject
+        self.BotName = BotName
 
         self.ConfigurationObject = ConfigurationObject
+        
+        self.Batch = Batch
+        self.UserCache = UserCache
+        self.Sessions = Sessions
 
         # This variable is needed for the logger so that the log end up 
         # getting printed in the correct language.
@@ -122,30 +173,42 @@ class MessagePreProcessor(object):
             # Unique identifier for this user or bot
             self.UserId = MessageObject["message"]["from"]["id"]
 
-        # Add user to the system if not exists
-        if self.UserExists() is False:
-            self.AddUser()
+        # The user may have been loaded with the batch.
+        User = None
+        if self.Batch is not None:
+            User = self.Batch.GetUser(self.UserId)
+        if User is None and self.UserCache is not None:
+            User = self.UserCache.Get(self.UserId)
         
-        # Get the Internal user id
-        self.InternalUserId, self.IsAdmin = self.GetUserData()
-
-        # Here we are initialising the function for the translations.
-        # Get the user settings from the user that has send the message
-        Query = ("SELECT User_Setting_Table.User_String FROM "
-                 "User_Setting_Table INNER JOIN Setting_Table ON "
-                 "User_Setting_Table.Master_Setting_Id="
-                 "Setting_Table.Id WHERE Setting_Table.Setting_Name=%s"
-                 " AND User_Setting_Table.Set_By_User=%s;"
-                 )
-
-        Data = ("Language", self.InternalUserId)
-
-        self.LanguageName = (
-            self.SqlObject.ExecuteTrueQuery(
-                self.SqlCursor,
-                Query,
-                Data
-            )[0]["User_String"])
+        if User is None or User["Language"] is None:
+            # The users of a batch have been queried already, a missing
+            # one is new.
+            if self.Batch is None:
+                User = self.LoadUser()
+            else:
+                User = None
+            
+            # Add user to the system if not exists
+            if User is None or User[2] is None:
+                User = self.AddUser()
+            
+            # Get the Internal user id, his admin state and his language
+            self.InternalUserId, self.IsAdmin, self.LanguageName = User
+            
+            if self.Batch is not None:
+                self.Batch.SetUser(self.UserId, 
+                                   self.InternalUserId, 
+                                   self.IsAdmin, 
+                                   self.LanguageName)
+            if self.UserCache is not None:
+                self.UserCache.Set(self.UserId, 
+                                   self.InternalUserId, 
+                                   self.IsAdmin, 
+                                   self.LanguageName)
+        else:
+            self.InternalUserId = User["Internal_Id"]
+            self.IsAdmin = User["Is_Admin"]
+            self.LanguageName = User["Language"]
         
         self.LanguageObject = LanguageObject
         
@@ -315,6 +378,8 @@ class MessagePreProcessor(object):
 
         if  MessageObject is not None:
             if len(MessageObject.Text) > 4096:
+                # a long reply mustn't hold back the other replies
+                MessageObject.Lane = message.MessageToBeSend.BULK
                 TemporaryObjectHolder = MessageObject
                 for TextPart in MessageProcessor.Chunker(MessageObject.Text, 4095):
                     TemporaryObjectHolder.Text = TextPart
@@ -361,57 +426,92 @@ class MessagePreProcessor(object):
         else:
             return True
 
+    def _GetDefaultLanguage_(self):
+        """
+        This method returns the id and the default value of the language
+        setting, they are queried on the first use only.
+        """
+        if MessagePreProcessor._DefaultLanguage is None:
+            MasterSetting = self.SqlObject.SelectEntry(
+                self.SqlCursor,
+                FromTable="Setting_Table",
+                Columns=["Id", "Default_String"],
+                Where=[["Setting_Name", "=", "%s"]],
+                Data=("Language")
+            )[0]
+            MessagePreProcessor._DefaultLanguage = (
+                MasterSetting["Id"], MasterSetting["Default_String"])
+        return MessagePreProcessor._DefaultLanguage
+    
+    def LoadUser(self):
+        """
+        This method returns the internal id, the admin state and the 
+        language of the user with a single query, None if he doesn't 
+        exist. The language is None if he has no language setting.
+        
+        Variables:
+            \-
+        """
+        Rows = self.SqlObject.ExecuteTrueQuery(
+            self.SqlCursor,
+            batch.Batch.USER_QUERY.format(Placeholders = "%s"),
+            (self.UserId,)
+        )
+        if not Rows:
+            return None
+        return (Rows[0]["Internal_Id"], 
+                bool(Rows[0]["Is_Admin"]), 
+                Rows[0]["User_String"])
+
     def AddUser(self, ):
         """
         This method will add a new user to the database.
         
+        The user and his default settings are added in a single 
+        transaction, the default settings are only queried once per 
+        process. The user is loaded after he has been added, if he 
+        existed already (for example because another worker has been 
+        faster) his own admin state and language are returned and only
+        a missing setting is added. The affected rows can't tell the 
+        two cases apart, with CLIENT_FOUND_ROWS an existing user counts
+        as one row like a new one.
+        
+        It returns the internal id, the admin state and the language of
+        the user.
+        
         Variables:
             \-
         """
+        SettingId, DefaultLanguage = self._GetDefaultLanguage_()
+        
         # Insert into user
-        TableName = "User_Table"
-        Columns = {
-            "External_Id": self.UserId,
-            "User_Name": self.UserName,
-            "First_Name": self.UserFirstName,
-            "Last_Name": self.UserLastName
-        }
-
-        self.SqlObject.InsertEntry(self.SqlCursor, TableName, Columns)
-        self.SqlObject.Commit()
-
-        # insert default settings
-        # get default values
-
-        # get the default settings
-        # get the default language
-        FromTable = "Setting_Table"
-        Columns = ["Id", "Default_String"]
-        Where = [["Setting_Name", "=", "%s"]]
-        Data = ("Language")
-        MasterSetting = self.SqlObject.SelectEntry(
+        self.SqlObject.ExecuteTrueQuery(
             self.SqlCursor,
-            FromTable=FromTable,
-            Columns=Columns,
-            Where=Where,
-            Data=Data
-        )[0]
-
-        TableName = "User_Setting_Table"
-        self.InternalUserId = self.GetUserData()[0]
-        Columns = {
-            "Master_Setting_Id": MasterSetting["Id"],
-            "Set_By_User": self.InternalUserId,
-            "User_String": MasterSetting["Default_String"]
-        }
-
-        self.SqlObject.InsertEntry(
-            self.SqlCursor,
-            TableName,
-            Columns
+            self.REGISTER_USER_QUERY,
+            {
+                "External_Id": self.UserId,
+                "User_Name": self.UserName,
+                "First_Name": self.UserFirstName,
+                "Last_Name": self.UserLastName
+            }
         )
-
+        InternalUserId, IsAdmin, Language = self.LoadUser()
+        
+        # insert default settings
+        if Language is None:
+            self.SqlObject.ExecuteTrueQuery(
+                self.SqlCursor,
+                self.REGISTER_SETTING_QUERY,
+                {
+                    "Setting": SettingId,
+                    "User": InternalUserId,
+                    "Value": DefaultLanguage
+                }
+            )
+            Language = DefaultLanguage
+        
         self.SqlObject.Commit()
+        return InternalUserId, IsAdmin, Language
 
     def GetUserData(self):
         """
@@ -556,7 +656,7 @@ class MessagePreProcessor(object):
                 "Group_Name": self.GroupName
             },
         )
-        self.SqlObject.Commit(self.SqlCursor)
+        self.SqlObject.Commit()
 
     def GetInternalGroupId(self):
         """
@@ -616,12 +716,23 @@ class MessagePreProcessor(object):
             Columns["Last_Used_Data"] = LastUsedData
             Duplicate["Last_Used_Data"] = LastUsedData
 
+        # The store writes the session back later on.
+        if self.Sessions is not None:
+            self.Sessions.Set(self.SqlObject, 
+                              self.SqlCursor, 
+                              self.InternalUserId, 
+                              **Duplicate)
+            return
+
         SetLastSendCommand = self.SqlObject.InsertEntry(
             self.SqlCursor,
             TableName=TableName,
             Columns=Columns,
             Duplicate=Duplicate)
         self.SqlObject.Commit()
+        
+        if self.Batch is not None:
+            self.Batch.UpdateSession(self.InternalUserId, **Duplicate)
 
     def GetLastSendCommand(self):
         """
@@ -645,24 +756,35 @@ class MessagePreProcessor(object):
            
         """
 
-        FromTable = "Session_Table"
-        Columns = ["Command", "Last_Used_Id", "Last_Used_Data"]
-        Where = [["Command_By_User", "=", "%s"]]
-        Data = (self.InternalUserId,)
-        LastSendCommand = self.SqlObject.SelectEntry(
-            self.SqlCursor,
-            FromTable=FromTable,
-            Columns=Columns,
-            Where=Where,
-            Data=Data
-        )
+        if self.Sessions is not None:
+            LastSendCommand = self.Sessions.Get(self.SqlObject, 
+                                                self.SqlCursor, 
+                                                self.InternalUserId)
+            LastSendCommand = [LastSendCommand] if LastSendCommand else []
+        elif (self.Batch is not None and 
+                self.Batch.HasSession(self.InternalUserId)):
+            LastSendCommand = self.Batch.GetSession(self.InternalUserId)
+            LastSendCommand = [LastSendCommand] if LastSendCommand else []
+        else:
+            FromTable = "Session_Table"
+            Columns = ["Command", "Last_Used_Id", "Last_Used_Data"]
+            Where = [["Command_By_User", "=", "%s"]]
+            Data = (self.InternalUserId,)
+            LastSendCommand = self.SqlObject.SelectEntry(
+                self.SqlCursor,
+                FromTable=FromTable,
+                Columns=Columns,
+                Where=Where,
+                Data=Data
+            )
 
         if len(LastSendCommand) > 0:
-            LastSendCommand =  LastSendCommand[0]
+            LastSendCommand =  dict(LastSendCommand[0])
         else:
+            LastSendCommand = {}
             LastSendCommand["Last_Used_Id"] = None
             LastSendCommand["Command"] = None
-            LastSendCommand["Last_Used_Data"] = none
+            LastSendCommand["Last_Used_Data"] = None
         return LastSendCommand
 
     def ClearLastCommand(self):
@@ -673,6 +795,14 @@ class MessagePreProcessor(object):
             \-
         """
 
+        if self.Sessions is not None:
+            self.Sessions.Set(self.SqlObject, 
+                              self.SqlCursor, 
+                              self.InternalUserId, 
+                              Command = "0", 
+                              Last_Used_Id = 0)
+            return
+
         self.SqlObject.UpdateEntry(
             Cursor=self.SqlCursor,
             TableName="Session_Table",
@@ -683,6 +813,11 @@ class MessagePreProcessor(object):
             Where=[["Command_By_User", self.InternalUserId]],
             Autocommit=True
         )
+        
+        if self.Batch is not None:
+            self.Batch.UpdateSession(self.InternalUserId, 
+                                     Command = "0", 
+                                     Last_Used_Id = 0)
 
     def ChangeUserLanguage(self, Language):
         """
@@ -710,6 +845,18 @@ class MessagePreProcessor(object):
             Where=[["Master_User_Id", self.InternalUserId]],
             Autocommit=True
         )
+        
+        if self.Batch is not None:
+            self.Batch.SetUser(self.UserId, 
+                               self.InternalUserId, 
+                               self.IsAdmin, 
+                               Language)
+        if self.UserCache is not None:
+            # the other workers forget the old language
+            self.UserCache.Update(self.UserId, 
+                                  self.InternalUserId, 
+                                  self.IsAdmin, 
+                                  Language)
         try:
             self.LanguageName = Language
             Language = self.LanguageObject.CreateTranslationObject(self.LanguageName)
@@ -772,8 +919,26 @@ class MessageProcessor(MessagePreProcessor):
                         }
         }
     
+    The commands and the answers are dispatched by the routers below, a
+    new command is a method decorated with its route.
     """
     
+    # the commands in the private chats, in the groups and the answers
+    # in the admin conversation by its state
+    UserCommands = router.CommandRouter()
+    GroupCommands = router.CommandRouter()
+    AdminCommands = router.CommandRouter()
+    
+    # the keyboards of the admin conversation, they are translated once
+    # per language
+    ADMIN_KEYBOARD = (("anime",), ("channel",), ("back",))
+    ANIME_KEYBOARD = (("publish list",), ("add anime",), 
+                      ("configure anime",), ("remove anime",), ("back",))
+    CHANNEL_KEYBOARD = (("add channel",), ("change description",), 
+                        ("send description",), ("delete channel",), 
+                        ("back",))
+    YES_NO_KEYBOARD = (("YES",), ("NO",))
+    
     def InterpretMessage(self):
         """
         This method interprets the user text.
@@ -797,8 +962,14 @@ class MessageProcessor(MessagePreProcessor):
             # If the name of the bot is used in the
             # command delete the @NameOfBot
             self.Text = re.sub(r"^(@\w+[bB]ot\s+)?", "", self.Text)
+            # and behind the command (/start@NameOfBot), a command for
+            # another bot of the group isn't answered
+            self.Text = router.CommandRouter.StripBotName(self.Text, 
+                                                          self.BotName)
 
-            if self.Text.startswith("/"):
+            if self.Text is None:
+                MessageObject = None
+            elif self.Text.startswith("/"):
 
                 if self.InGroup is False:
                     MessageObject = self.InterpretUserCommand(MessageObject)
@@ -831,89 +1002,104 @@ class MessageProcessor(MessagePreProcessor):
         This method is used as an interpreter of the user send
         commands. It returns the MessageObject
         after analysing and modifying the MessageObject to respond
-        the user Text.
+        the user Text. The command is looked up in the UserCommands.
 
         Variables:
             - MessageObject                    ``object``
                 is the message object that has to be modified
         """
-        # register the command in the database for later use
-        if self.Text.startswith("/start"):
-            MessageObject.Text = self._("Welcome.\nWhat can I do for you?"
-                                            "\nPress /help for all my commands"
-                                            )
-            Markup = [
-                        ["/help"],
-                        ["/list"]
-                    ]
-            if self.IsAdmin is True:
-                Markup[0].append("/admin")
-                    
-            MessageObject.ReplyKeyboardMarkup(Markup,
-                 OneTimeKeyboard=True
-            )
+        return self.UserCommands.Dispatch(self, MessageObject, None, self.Text)
+
+    @UserCommands.Route("/start")
+    def _StartCommand_(self, MessageObject):
+        MessageObject.Text = self._("Welcome.\nWhat can I do for you?"
+                                        "\nPress /help for all my commands"
+                                        )
+        Markup = [
+                    ["/help"],
+                    ["/list"]
+                ]
+        if self.IsAdmin is True:
+            Markup[0].append("/admin")
                 
-            self.ClearLastCommand()
-
-        # this command will list the anime content on the server
-        elif self.Text == "/list":
-            # this command will send the anime list
-            MessageObject.Text = self._("Sorry\nAt the moment this command is not supported")
+        MessageObject.ReplyKeyboardMarkup(Markup,
+             OneTimeKeyboard=True
+        )
             
-        elif self.Text == "/done":
-            self.Text = "/start"
-            MessageObject = self.InterpretUserCommand(MessageObject)
-
-        elif self.Text == "/help":
-            MessageObject.Text = self._(
-                "Work in progress! @AnimeSubBot is a bot."
-            )
+        self.ClearLastCommand()
+        return MessageObject
 
-        elif self.Text == "/admin":
-            # if that person is an administrator.
-            if self.IsAdmin:
-                self.InterpretAdminCommands(MessageObject)
-                self.SetLastSendCommand("/admin", None)
-            else:
-                MessageObject.Text = self._("You don't have the right to use that command.")
-            
-        # the settings are right now not supported, maybe later.
-            """elif self.Text == "/settings":
-                # This command will send the possible setting to the user
-                self.SetLastSendCommand("/settings", None)
-                MessageObject.Text = self._("Please, choose the setting to change:"
-                                            )
-                MessageObject.ReplyKeyboardMarkup(
-                    [
-                        ["/language"],
-                        ["/comming soon"]
-                    ],
-                    OneTimeKeyboard=True
-                )
-                
-            elif self.Text == "/language":
-                # This option will change the user language
-                # Set the last send command
-    
-                self.SetLastSendCommand("/language")
-    
-                MessageObject.Text = self._(
-                    "Please choose your preferred language:"
-                )
-                MessageObject.ReplyKeyboardMarkup([
-                    ["English"],
-                    ["Deutsch"],
-                    ["Français"]
-                ],
-                    OneTimeKeyboard=True
-                )
-            """
+    # this command will list the anime content on the server
+    @UserCommands.Route("/list")
+    def _ListCommand_(self, MessageObject):
+        # this command will send the anime list
+        MessageObject.Text = self._("Sorry\nAt the moment this command is not supported")
+        return MessageObject
+        
+    @UserCommands.Route("/done")
+    def _DoneCommand_(self, MessageObject):
+        self.Text = "/start"
+        return self.InterpretUserCommand(MessageObject)
+
+    @UserCommands.Route("/help")
+    def _HelpCommand_(self, MessageObject):
+        MessageObject.Text = self._(
+            "Work in progress! @AnimeSubBot is a bot."
+        )
+        return MessageObject
 
+    @UserCommands.Route("/admin")
+    def _AdminCommand_(self, MessageObject):
+        # if that person is an administrator.
+        if self.IsAdmin:
+            self.InterpretAdminCommands(MessageObject)
+            self.SetLastSendCommand("/admin", None)
         else:
-            # send that the command is unknown
-            MessageObject.Text = self._("I apologize, but this command is not supported.\n"
-                                        "Press or enter /help to get help.")
+            MessageObject.Text = self._("You don't have the right to use that command.")
+        return MessageObject
+        
+    # the settings are right now not supported, maybe later.
+    """
+    @UserCommands.Route("/settings")
+    def _SettingsCommand_(self, MessageObject):
+        # This command will send the possible setting to the user
+        self.SetLastSendCommand("/settings", None)
+        MessageObject.Text = self._("Please, choose the setting to change:"
+                                    )
+        MessageObject.ReplyKeyboardMarkup(
+            [
+                ["/language"],
+                ["/comming soon"]
+            ],
+            OneTimeKeyboard=True
+        )
+        return MessageObject
+        
+    @UserCommands.Route("/language")
+    def _LanguageCommand_(self, MessageObject):
+        # This option will change the user language
+        # Set the last send command
+
+        self.SetLastSendCommand("/language")
 
+        MessageObject.Text = self._(
+            "Please choose your preferred language:"
+        )
+        MessageObject.ReplyKeyboardMarkup([
+            ["English"],
+            ["Deutsch"],
+            ["Français"]
+        ],
+            OneTimeKeyboard=True
+        )
+        return MessageObject
+    """
+
+    @UserCommands.Route()
+    def _UnknownCommand_(self, MessageObject):
+        # send that the command is unknown
+        MessageObject.Text = self._("I apologize, but this command is not supported.\n"
+                                    "Press or enter /help to get help.")
         return MessageObject
 
     def InterpretUserNonCommand(self, MessageObject):
@@ -956,18 +1142,21 @@ class MessageProcessor(MessagePreProcessor):
             MessageObject                 ``object``
                 is the message object that has to be modified
         """
-        
-
-        if self.Text == "/help":
-            MessageObject.Text = self._(
-                "Work in progress! @AnimeSubBot is a bot"
-            )
-        
+        return self.GroupCommands.Dispatch(self, MessageObject, None, self.Text)
+    
+    @GroupCommands.Route("/help")
+    def _GroupHelpCommand_(self, MessageObject):
+        MessageObject.Text = self._(
+            "Work in progress! @AnimeSubBot is a bot"
+        )
         return MessageObject
 
     def InterpretAdminCommands(self, MessageObject):
         """
         This command will interpret all the admin send commands.
+        
+        The answers are looked up in the AdminCommands by the last 
+        command of the admin, the state of the conversation.
 
         Variables:
             MessageObject                 ``object``
@@ -986,185 +1175,180 @@ class MessageProcessor(MessagePreProcessor):
             - configure anime
             - remove Anime 
         """
+        MessageObject.Lane = message.MessageToBeSend.ADMIN
         if self.Text != "/admin":
-            if self.LastSendCommand == "/admin":
-                # the default screen
-                if self.Text.startswith(self._("anime")):
-                    MessageObject.Text = self._("What do you want to do?")
-                    MessageObject.ReplyKeyboardMarkup(
-                        [
-                            [self._("publish list")],
-                            [self._("add anime")],
-                            [self._("configure anime")],
-                            [self._("remove anime")],                        
-                            [self._("back")],
-                        ],
-                        OneTimeKeyboard=True
-                    )
-                    self.SetLastSendCommand("/admin anime", None)
-                        
-                elif self.Text.startswith(self._("channel")):
-                    MessageObject.Text = self._("What do you want to do?")
-                    MessageObject.ReplyKeyboardMarkup(
-                        [
-                            [self._("add channel")],
-                            [self._("change description")],
-                            [self._("send description")],
-                            [self._("delete channel")],
-                            [self._("back")],
-                        ],
-                        OneTimeKeyboard=True
-                    )
-                    self.SetLastSendCommand("/admin channel", None)
-                elif self.Text == self._("back"):
-                    self.Text = "/start"
-
-                    MessageObject = self.InterpretUserCommand(MessageObject)
-                    
-            elif self.LastSendCommand.startswith("/admin anime"):
-                # the anime commands
-                if self.Text == "publish list":
-                    # 1) publish to channel
-                    pass
-                elif self.Text == "add anime":
-                    # Please enter the url and be patient while the program extracts the information. To cancel please write CANCEL. -- ;:; -> delimeter
-                    # 1) automatic (a) vs manual entry (b)
-                    # 2a) extract URL =?> CANCEL -> to admin
-                    # 3a) confirm Yes -> save data / No -> to admin
-                    # 4a) add telegram url
-                    # 2b) enter name
-                    # 3b) enter publish date
-                    # 4b) enter myanimelist.net url
-                    # 5b) enter telegram url
-                    pass
-                elif self.Text == "configure anime":
-                    # 1) search by name
-                    # 2) show possible names (repeats until correct)
-                    # 3) change by data => Telegram URL; Date; Name;
-                    pass
-                elif self.Text == "remove anime":
-                    # 1) search by name
-                    # 2) show possible names (repeats until correct)
-                    # 3) check if user is sure and then delete anime
-                    pass
-                elif self.Text == "back":
-                    self.Text = "/admin"
-                    self.ClearLastCommand()
-                    self.InterpretUserCommand(MessageObject)
-                    
-            elif self.LastSendCommand.startswith("/admin channel"):
-                # the channel commands
-                ChannelObject = Channel(self.SqlObject, self.SqlCursor)
-                if self.LastSendCommand.startswith("/admin channel"):
-                    if self.Text == "add channel" or self.LastSendCommand.startswith("/admin channel"):
-                        # add new channel
-                        # 1) Please enter the name of the channel - enter CANSEL to exit
-                        # 1a) back to admin hub
-                        # 2) check if channel exists - save (a) or error (b)
-                        # 2a) save channel name
-                        # 2b) back to admin channnel
-                        # 3a) enter description 
-                        # 3b) chancel => return to admin hub
-                        # 3ab) is the text ok Yes / No
-                        # 4a) enter buttons to use with description YES / NO
-                        # 4b) chancel => return to admin hub
-                        # 5a) success
-                        if self.Text == "add channel":
-                            MessageObject.Text = self._("Please send the name of the channel in this form @example_channel or send /done")
-                            self.SetLastSendCommand("/admin channel add", None)
-                        if self.LastSendCommand.startswith("/admin channel add"):
-                            if self.LastSendCommand == "/admin channel add":
-                                # 2) check if channel exists - save (a) or error (b)
-                                if self.Text.startswith("@"):
-                                    # enter the channel name into the database if the channel doesnt't exists yet
-                                    if ChannelObject.ChannelExists(self.Text) is True:
-                                        # 2b) back to admin channnel
-                                        MessageObject.Text = self._("The channel already exists.\nTo change the description choose \"change description\" in the options.")
-                                        self.SetLastSendCommand("/admin channel")
-                                    else:
-                                        # 3a) enter description 
-                                        ChannelObject.AddChannel(self.Text, ByUser = self.InternalUserId)
-                                        MessageObject.Text = self._("Please enter the channel description, to chancel send CANCEL")
-                                        self.SetLastSendCommand("/admin channel add channel description", LastUsedData = self.Text)
-
-                            elif self.LastSendCommand == "/admin channel add description":
-                                if self.Text != "CANCEL":
-                                    
-                                    
-                                                
-                                    MessageObject.Text = self._("Is the description to your liking?")
-                                    MessageObject.ReplyKeyboardMarkup([
-                                        [self._("YES")],
-                                        [self._("NO")]
-                                    ],
-                                        OneTimeKeyboard=True
-                                    )
-                                # 4a) enter buttons to use with description
-                                if self.Text != "CANCEL":
-                                
-                                    MessageObject.Text = self._("Do you wish to add buttons?")
-                                    MessageObject.ReplyKeyboardMarkup([
-                                        [self._("YES")],
-                                        [self._("NO")]
-                                    ],
-                                        OneTimeKeyboard=True
-                                    )
-                                    # saving the description without buttons
-                                    ChannelObject.ChangeDescription(self.LastSendData, self.Text, ByUser = self.InternalUserId)
-                                    # saving the description without buttons                            
-                                    self.SetLastSendCommand("/admin channel add description buttons unsure", LastUsedData = self.LastSendData) 
-                                else:
-                                    MessageObj.Text = self._("To change the description choose \"change description\" in the options.")
-                                    self.SetLastSendCommand("/admin channel")
-                            elif self.LastSendCommand == "/admin channel add description buttons unsure":
-                                if self.Text == self._("YES"):
-                                    # 4a) enter buttons to use with description YES
-                                    MessageObject.Text = self._("Please send the buttons like this:\nText;Url\nText;Url")
-                                    self.SetLastSendCommand("/admin channel add description buttons sure", LastUsedData = self.LastSendData) 
-                                else:
-                                    # 4b) no => return to admin hub
-                                    self.SetLastSendCommand("/admin channel")
-                            elif self.LastSendCommand == "/admin channel add description buttons sure":
-                                ChannelObject.ChangeDescriptionButton(self.LastSendData, self.Text, self.InternalUserId)
-                                Description, Buttons = ChannelObject.GetDescription()
-
-                                MessageObject.Text = Description
-                                if Buttons is not None:
-                                    for Line in Buttons.split("\n"):
-                                        Text, Url = Line.split(";")
-                                        MessageObject.AddInlineButton(Text, Url)
-                                
-                                self._SendToQueue_(MessageObject)
-
-                                
-
-                    elif self.Text == "change description":
-                        pass
-                    elif self.Text == "send description":
-                        MessageObject.Text = Description
-                        if Buttons is not None:
-                            for Line in Buttons.split("\n"):
-                                Text, Url = Line.split(";")
-                                MessageObject.AddInlineButton(Text, Url)
-
-                    elif self.Text == "delete channel":
-                        pass
-                    elif self.Text == "back":
-                        self.Text = "/admin"
-                        self.ClearLastCommand()
-                        self.InterpretUserCommand(MessageObject)
-
-        else:               
-            MessageObject.Text = self._("How can I help you?")
+            return self.AdminCommands.Dispatch(self, 
+                                               MessageObject, 
+                                               self.LastSendCommand, 
+                                               self.Text)
+        
+        MessageObject.Text = self._("How can I help you?")
+        MessageObject.ReplyKeyboardMarkup(
+            self.AdminCommands.GetKeyboard(self, self.ADMIN_KEYBOARD),
+            OneTimeKeyboard=True
+        )
+        self.SetLastSendCommand("/admin", None)
+        return MessageObject
+    
+    # the default screen
+    @AdminCommands.Route("anime", "/admin", Translate = True)
+    def _AdminAnime_(self, MessageObject):
+        MessageObject.Text = self._("What do you want to do?")
+        MessageObject.ReplyKeyboardMarkup(
+            self.AdminCommands.GetKeyboard(self, self.ANIME_KEYBOARD),
+            OneTimeKeyboard=True
+        )
+        self.SetLastSendCommand("/admin anime", None)
+        return MessageObject
+    
+    @AdminCommands.Route("channel", "/admin", Translate = True)
+    def _AdminChannel_(self, MessageObject):
+        MessageObject.Text = self._("What do you want to do?")
+        MessageObject.ReplyKeyboardMarkup(
+            self.AdminCommands.GetKeyboard(self, self.CHANNEL_KEYBOARD),
+            OneTimeKeyboard=True
+        )
+        self.SetLastSendCommand("/admin channel", None)
+        return MessageObject
+    
+    @AdminCommands.Route("back", "/admin", Translate = True)
+    def _AdminBack_(self, MessageObject):
+        self.Text = "/start"
+        return self.InterpretUserCommand(MessageObject)
+    
+    # the anime commands
+    @AdminCommands.Route("publish list", "/admin anime", Translate = True)
+    def _AnimePublishList_(self, MessageObject):
+        # 1) publish to channel
+        return MessageObject
+    
+    @AdminCommands.Route("add anime", "/admin anime", Translate = True)
+    def _AnimeAdd_(self, MessageObject):
+        # Please enter the url and be patient while the program extracts the information. To cancel please write CANCEL. -- ;:; -> delimeter
+        # 1) automatic (a) vs manual entry (b)
+        # 2a) extract URL =?> CANCEL -> to admin
+        # 3a) confirm Yes -> save data / No -> to admin
+        # 4a) add telegram url
+        # 2b) enter name
+        # 3b) enter publish date
+        # 4b) enter myanimelist.net url
+        # 5b) enter telegram url
+        return MessageObject
+    
+    @AdminCommands.Route("configure anime", "/admin anime", Translate = True)
+    def _AnimeConfigure_(self, MessageObject):
+        # 1) search by name
+        # 2) show possible names (repeats until correct)
+        # 3) change by data => Telegram URL; Date; Name;
+        return MessageObject
+    
+    @AdminCommands.Route("remove anime", "/admin anime", Translate = True)
+    def _AnimeRemove_(self, MessageObject):
+        # 1) search by name
+        # 2) show possible names (repeats until correct)
+        # 3) check if user is sure and then delete anime
+        return MessageObject
+    
+    @AdminCommands.Route("back", "/admin anime", Translate = True)
+    @AdminCommands.Route("back", "/admin channel", Translate = True)
+    def _AdminMenuBack_(self, MessageObject):
+        self.Text = "/admin"
+        self.ClearLastCommand()
+        return self.InterpretUserCommand(MessageObject)
+    
+    # the channel commands
+    @AdminCommands.Route("add channel", "/admin channel", Translate = True)
+    def _ChannelAdd_(self, MessageObject):
+        # add new channel
+        # 1) Please enter the name of the channel - enter CANSEL to exit
+        # 1a) back to admin hub
+        # 2) check if channel exists - save (a) or error (b)
+        # 2a) save channel name
+        # 2b) back to admin channnel
+        # 3a) enter description 
+        # 3b) chancel => return to admin hub
+        # 3ab) is the text ok Yes / No
+        # 4a) enter buttons to use with description YES / NO
+        # 4b) chancel => return to admin hub
+        # 5a) success
+        MessageObject.Text = self._("Please send the name of the channel in this form @example_channel or send /done")
+        self.SetLastSendCommand("/admin channel add", None)
+        return MessageObject
+    
+    @AdminCommands.Route("change description", "/admin channel", Translate = True)
+    def _ChannelChangeDescription_(self, MessageObject):
+        return MessageObject
+    
+    @AdminCommands.Route("send description", "/admin channel", Translate = True)
+    def _ChannelSendDescription_(self, MessageObject):
+        return MessageObject
+    
+    @AdminCommands.Route("delete channel", "/admin channel", Translate = True)
+    def _ChannelDelete_(self, MessageObject):
+        return MessageObject
+    
+    @AdminCommands.Route(None, "/admin channel add")
+    def _ChannelAddName_(self, MessageObject):
+        # 2) check if channel exists - save (a) or error (b)
+        if self.Text.startswith("@"):
+            ChannelObject = Channel(self.SqlObject, self.SqlCursor)
+            # enter the channel name into the database if the channel doesnt't exists yet
+            if ChannelObject.ChannelExists(self.Text) is True:
+                # 2b) back to admin channnel
+                MessageObject.Text = self._("The channel already exists.\nTo change the description choose \"change description\" in the options.")
+                self.SetLastSendCommand("/admin channel")
+            else:
+                # 3a) enter description 
+                ChannelObject.AddChannel(self.Text, ByUser = self.InternalUserId)
+                MessageObject.Text = self._("Please enter the channel description, to chancel send CANCEL")
+                self.SetLastSendCommand("/admin channel add channel description", LastUsedData = self.Text)
+        return MessageObject
+    
+    @AdminCommands.Route(None, "/admin channel add description")
+    def _ChannelAddDescription_(self, MessageObject):
+        # 4a) enter buttons to use with description
+        if self.Text != "CANCEL":
+            ChannelObject = Channel(self.SqlObject, self.SqlCursor)
+            MessageObject.Text = self._("Do you wish to add buttons?")
             MessageObject.ReplyKeyboardMarkup(
-                [
-                    [self._("anime")],
-                    [self._("channel")],
-                    [self._("back")],
-                ],
+                self.AdminCommands.GetKeyboard(self, self.YES_NO_KEYBOARD),
                 OneTimeKeyboard=True
             )
-            self.SetLastSendCommand("/admin", None)
+            # saving the description without buttons
+            ChannelObject.ChangeDescription(self.LastSendData, self.Text, ByUser = self.InternalUserId)
+            # saving the description without buttons                            
+            self.SetLastSendCommand("/admin channel add description buttons unsure", LastUsedData = self.LastSendData) 
+        else:
+            MessageObject.Text = self._("To change the description choose \"change description\" in the options.")
+            self.SetLastSendCommand("/admin channel")
+        return MessageObject
+    
+    @AdminCommands.Route(None, "/admin channel add description buttons unsure")
+    def _ChannelAddButtons_(self, MessageObject):
+        if self.Text == self._("YES"):
+            # 4a) enter buttons to use with description YES
+            MessageObject.Text = self._("Please send the buttons like this:\nText;Url\nText;Url")
+            self.SetLastSendCommand("/admin channel add description buttons sure", LastUsedData = self.LastSendData) 
+        else:
+            # 4b) no => return to admin hub
+            self.SetLastSendCommand("/admin channel")
+        return MessageObject
+    
+    @AdminCommands.Route(None, "/admin channel add description buttons sure")
+    def _ChannelSaveButtons_(self, MessageObject):
+        ChannelObject = Channel(self.SqlObject, self.SqlCursor)
+        ChannelObject.ChangeDescriptionButton(self.LastSendData, self.Text, self.InternalUserId)
+        Description, Buttons = ChannelObject.GetDescription(self.LastSendData)
+
+        MessageObject.Text = Description
+        # the description is a broadcast
+        MessageObject.Lane = message.MessageToBeSend.BULK
+        if Buttons is not None:
+            for Line in Buttons.split("\n"):
+                Text, Url = Line.split(";")
+                MessageObject.AddInlineButton(Text, Url)
+        
+        self._SendToQueue_(MessageObject)
         return MessageObject
 
 class Channel(object):
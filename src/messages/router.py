@@ -0,0 +1,221 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the table that maps the texts of the users to the
+methods of the message processor answering them.
+
+A route is the state of the conversation (the last command of the
+session) together with a command or a button label. A message is looked
+up with a single dictionary access for its whole text and one for its
+first word, instead of walking through a chain of comparisons.
+
+The button labels are shown to the user in his language, so the labels
+of the routes are translated. The translations are made once per
+language and kept, like the translated keyboards.
+
+In a group a command can be addressed to the bot (/start@AnimeSubBot),
+it's routed like the command itself. A command addressed to another bot
+of the group has no route.
+"""
+
+import re
+
+
+class CommandRouter(object):
+    """
+    This class holds the routes of one kind of messages, for example the
+    commands of the users or the answers in the admin conversation.
+
+    The handlers are registered with the Route decorator and called with
+    the message processor and the message object, they return the
+    message object to send.
+
+    .. code-block:: python\n
+        class Processor(object):
+            Commands = CommandRouter()
+
+            @Commands.Route("/help")
+            def Help(self, MessageObject):
+                MessageObject.Text = self._("Help")
+                return MessageObject
+
+            def InterpretMessage(self):
+                return self.Commands.Dispatch(self, MessageObject,
+                                              None, self.Text)
+    """
+
+    COMMAND_BOT_NAME = re.compile(r"^(/\w+)@(\w+)")
+    """
+    The name of the bot behind a command.
+    """
+
+    def __init__(self):
+        # the handlers by (state, label), a label of None is called for
+        # every text in the state that has no route of its own
+        self.Routes = {}
+        # the labels that are translated
+        self.Labels = set()
+        # the label by its translation and the translated keyboards, for
+        # every language
+        self._Translations = {}
+        self._Keyboards = {}
+
+    def Route(self, Label = None, State = None, Translate = False):
+        """
+        This method returns a decorator that adds the function as the
+        handler of the label in the state.
+
+        Variables:
+            Label                         ``None or string``
+                the command or the button label, None handles all the
+                other texts of the state
+
+            State                         ``None or string``
+                the last command of the user, None if it doesn't matter
+
+            Translate                     ``boolean``
+                True if the label is shown to the user in his language
+        """
+        def Decorator(Function):
+            self.Add(Function, Label, State, Translate)
+            return Function
+        return Decorator
+
+    def Add(self, Function, Label = None, State = None, Translate = False):
+        """
+        This method adds the handler of the label in the state.
+
+        Variables:
+            Function                      ``function``
+                the handler, called with the message processor and the
+                message object
+
+            Label                         ``None or string``
+                the command or the button label
+
+            State                         ``None or string``
+                the last command of the user
+
+            Translate                     ``boolean``
+                True if the label is shown to the user in his language
+        """
+        if (State, Label) in self.Routes:
+            raise ValueError("The route {State} {Label} exists already."
+                             .format(State = State, Label = Label))
+        self.Routes[(State, Label)] = Function
+        if Translate and Label is not None:
+            self.Labels.add(Label)
+            self._Translations.clear()
+
+    @classmethod
+    def StripBotName(cls, Text, BotName = None):
+        """
+        This method returns the text without the name of the bot behind
+        its command, like /start for /start@AnimeSubBot. If the command
+        is addressed to another bot None is returned.
+
+        Variables:
+            Text                          ``None or string``
+                the text of the message
+
+            BotName                       ``None or string``
+                the username of the bot, None takes every name as its
+                own
+        """
+        if not Text:
+            return Text
+        Match = cls.COMMAND_BOT_NAME.match(Text)
+        if Match is None:
+            return Text
+        # the usernames don't depend on the case
+        if (BotName is not None and
+                Match.group(2).lower() != BotName.lstrip("@").lower()):
+            return None
+        return Match.group(1) + Text[Match.end():]
+
+    def _GetTranslations_(self, Processor):
+        """
+        This method returns the labels by their translation in the
+        language of the user.
+        """
+        Translations = self._Translations.get(Processor.LanguageName)
+        if Translations is None:
+            Translations = {Processor._(Label): Label
+                            for Label in self.Labels}
+            self._Translations[Processor.LanguageName] = Translations
+        return Translations
+
+    def Find(self, Processor, State, Text):
+        """
+        This method returns the handler of the text in the state, None
+        if there is none.
+
+        Variables:
+            Processor                     ``MessagePreProcessor``
+                the processor of the message, its LanguageName and _()
+                translate the labels
+
+            State                         ``None or string``
+                the last command of the user
+
+            Text                          ``string``
+                the text of the message
+        """
+        Translations = self._GetTranslations_(Processor)
+        Text = self.StripBotName(Text, getattr(Processor, "BotName", None))
+        if Text is None:
+            return None
+        Handler = self.Routes.get((State, Translations.get(Text, Text)))
+        if Handler is None and Text:
+            # a command or a label followed by more text
+            Word = Text.split(None, 1)[0]
+            Handler = self.Routes.get((State, Translations.get(Word, Word)))
+        if Handler is None:
+            Handler = self.Routes.get((State, None))
+        return Handler
+
+    def Dispatch(self, Processor, MessageObject, State, Text):
+        """
+        This method calls the handler of the text in the state and
+        returns the message object it returns. The message object is
+        returned unchanged if there is no handler.
+
+        Variables:
+            Processor                     ``MessagePreProcessor``
+                the processor of the message
+
+            MessageObject                 ``messages.message.MessageToBeSend``
+                the answer to the message
+
+            State                         ``None or string``
+                the last command of the user
+
+            Text                          ``string``
+                the text of the message
+        """
+        Handler = self.Find(Processor, State, Text)
+        if Handler is None:
+            return MessageObject
+        return Handler(Processor, MessageObject)
+
+    def GetKeyboard(self, Processor, Rows):
+        """
+        This method returns the rows of button labels translated into
+        the language of the user, they are translated once per language.
+
+        Variables:
+            Processor                     ``MessagePreProcessor``
+                the processor of the message
+
+            Rows                          ``tuple``
+                the rows of the keyboard, tuples of labels
+        """
+        Key = (Processor.LanguageName, Rows)
+        Keyboard = self._Keyboards.get(Key)
+        if Keyboard is None:
+            Keyboard = [[Processor._(Label) for Label in Row]
+                        for Row in Rows]
+            self._Keyboards[Key] = Keyboard
+        # the markup may be changed by the caller
+        return [list(Row) for Row in Keyboard]
@@ -0,0 +1,411 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+This module defines where the SubWorkers keep the sessions of the users,
+the last command and its data that lead the user through a conversation
+like the admin wizards.
+
+Without a store every step of a conversation reads and writes the
+Session_Table and commits. The MemorySessionStore keeps the sessions in
+the worker instead and writes the changed ones back to the database
+together, at most every FlushInterval seconds, with one statement and a
+single commit.
+
+The updates of a chat are always processed by the same worker, so a
+session is usually only used by one of them. If it's used by another
+one nevertheless (a group chat, a moved chat), the SessionVersions in
+shared memory tell it that its copy is outdated. It then waits until
+the change has been written back, before it loads the session again.
+
+A session that hasn't been changed for TimeToLive seconds is
+forgotten, an abandoned conversation is cleared on the way.
+"""
+
+# standard lib
+import ctypes
+import threading
+import multiprocessing
+
+import network.limiter
+from . import batch
+
+
+class SessionVersions(object):
+    """
+    This class counts the changes of the sessions in shared memory, as
+    well as the changes that haven't been written back yet.
+
+    The users are hashed onto a fixed amount of slots, users sharing a
+    slot only cost an additional load of their session.
+
+    It has to be created before the processes using it are started and
+    handed to them as an argument.
+    """
+
+    def __init__(self, Size = 65536):
+        """
+        Variables:
+            Size                          ``integer``
+                the amount of slots
+        """
+        self.Size = Size
+        self._Written = multiprocessing.RawArray(ctypes.c_uint64, Size)
+        self._Pending = multiprocessing.RawArray(ctypes.c_int64, Size)
+        self._Lock = multiprocessing.Lock()
+
+    def Get(self, Key):
+        """
+        This method returns the version of the session of the user.
+
+        Variables:
+            Key                           ``integer``
+                the internal id of the user
+        """
+        return self._Written[Key % self.Size]
+
+    def IsPending(self, Key):
+        """
+        This method returns True if a change of the slot of the user
+        hasn't been written back yet.
+
+        Variables:
+            Key                           ``integer``
+                the internal id of the user
+        """
+        return self._Pending[Key % self.Size] > 0
+
+    def Write(self, Key, Dirty):
+        """
+        This method counts a change of the session and returns its new
+        version.
+
+        Variables:
+            Key                           ``integer``
+                the internal id of the user
+
+            Dirty                         ``boolean``
+                True if the session hadn't been changed since it has
+                been written back the last time
+        """
+        Slot = Key % self.Size
+        with self._Lock:
+            self._Written[Slot] += 1
+            if Dirty:
+                self._Pending[Slot] += 1
+            return self._Written[Slot]
+
+    def Flushed(self, Keys):
+        """
+        This method counts the sessions that have been written back.
+
+        Variables:
+            Keys                          ``list``
+                the internal ids of the users
+        """
+        with self._Lock:
+            for Key in Keys:
+                self._Pending[Key % self.Size] -= 1
+
+class MemorySessionStore(object):
+    """
+    This class keeps the sessions of the users in the worker and writes
+    them back to the database in batches.
+
+    The sessions are dictionaries with the Command, Last_Used_Id and
+    Last_Used_Data of the Session_Table, None if the user has none. It
+    can be used by several threads, each one with its own connection.
+
+    .. code-block:: python\n
+        Store = MemorySessionStore(Versions = Versions)
+        Store.Prefetch(SqlObject, Cursor, InternalIds)
+        Store.Set(SqlObject, Cursor, InternalId, Command = "/admin")
+        Store.FlushIfDue(SqlObject, Cursor)
+    """
+
+    COLUMNS = ("Command", "Last_Used_Id", "Last_Used_Data")
+    """
+    The columns of a session.
+    """
+
+    FLUSH_QUERY = (
+        "INSERT INTO Session_Table (Command_By_User, Command, Last_Used_Id, "
+        "Last_Used_Data) VALUES {Rows} ON DUPLICATE KEY UPDATE "
+        "Command=VALUES(Command), Last_Used_Id=VALUES(Last_Used_Id), "
+        "Last_Used_Data=VALUES(Last_Used_Data);"
+        )
+    """
+    Writes the changed sessions back.
+    """
+
+    def __init__(self,
+                 TimeToLive = 3600,
+                 FlushInterval = 1.0,
+                 Versions = None,
+                 Clock = None,
+                 WaitTimeout = 0.5):
+        """
+        Variables:
+            TimeToLive                    ``float``
+                the seconds after which an unchanged session is
+                forgotten and an unfinished conversation is cleared
+
+            FlushInterval                 ``float``
+                the minimal seconds between two write backs
+
+            Versions                      ``None or SessionVersions``
+                the versions shared with the other workers, None if the
+                store is the only one
+
+            Clock                         ``None or network.limiter.Clock``
+                the time source, None uses the real time
+
+            WaitTimeout                   ``float``
+                the maximal seconds to wait for another worker to write
+                back a session
+        """
+        self.TimeToLive = float(TimeToLive)
+        self.FlushInterval = float(FlushInterval)
+        self.Versions = Versions or SessionVersions(1024)
+        self.Clock = Clock or network.limiter.Clock()
+        self.WaitTimeout = WaitTimeout
+
+        # the session, its version, the time of its last change and if
+        # it has to be written back, for every internal user id
+        self.Sessions = {}
+        self.LastFlush = self.Clock.Now()
+        self._Lock = threading.RLock()
+        # a single write back at a time, so that a session is counted as
+        # written back only once
+        self._FlushLock = threading.Lock()
+        self.Loads = 0
+        self.Flushes = 0
+
+    def __len__(self):
+        return len(self.Sessions)
+
+    def _IsFresh_(self, InternalId):
+        """
+        This method returns True if the session is held and hasn't been
+        changed by another worker.
+        """
+        Entry = self.Sessions.get(InternalId)
+        return (Entry is not None and
+                (Entry["Dirty"] or
+                 Entry["Version"] == self.Versions.Get(InternalId)))
+
+    def Prefetch(self, SqlObject, Cursor, InternalIds):
+        """
+        This method loads the sessions of the users that aren't held or
+        are outdated, with one query.
+
+        Variables:
+            SqlObject                     ``sql.Api``
+                the database connection of the thread
+
+            Cursor                        ``object``
+                a dictionary cursor of the database connection
+
+            InternalIds                   ``list``
+                the internal ids of the users
+        """
+        with self._Lock:
+            Missing = [InternalId for InternalId in set(InternalIds)
+                       if not self._IsFresh_(InternalId)]
+        if not Missing:
+            return
+        # a change of another worker is waited for, the own ones are
+        # written back first
+        if any(self.Versions.IsPending(InternalId) for InternalId in Missing):
+            self.Flush(SqlObject, Cursor)
+            Deadline = self.Clock.Now() + self.WaitTimeout
+            while (any(self.Versions.IsPending(InternalId)
+                       for InternalId in Missing) and
+                   self.Clock.Now() < Deadline):
+                self.Clock.Sleep(0.01)
+        # the versions are taken before the sessions are read, a change
+        # in between makes them outdated at once, a change that still
+        # hasn't been written back too
+        Versions = {InternalId: None if self.Versions.IsPending(InternalId)
+                                else self.Versions.Get(InternalId)
+                    for InternalId in Missing}
+        Rows = batch.Batch._Select_(SqlObject, Cursor,
+                                    batch.Batch.SESSION_QUERY, Missing)
+        Sessions = dict.fromkeys(Missing)
+        for Row in Rows:
+            Sessions[Row["Command_By_User"]] = {
+                    Column: Row[Column] for Column in self.COLUMNS}
+        Now = self.Clock.Now()
+        with self._Lock:
+            self.Loads += 1
+            for InternalId, Session in Sessions.items():
+                if self._IsFresh_(InternalId):
+                    # changed by another thread meanwhile
+                    continue
+                self.Sessions[InternalId] = {"Session": Session,
+                                             "Version": Versions[InternalId],
+                                             "Changed": Now,
+                                             "Dirty": False}
+
+    def _Change_(self, InternalId, Columns):
+        """
+        This method changes a held session. It has to be called with the
+        lock.
+        """
+        Entry = self.Sessions[InternalId]
+        if Entry["Session"] is None:
+            Entry["Session"] = dict.fromkeys(self.COLUMNS)
+        Entry["Session"].update(Columns)
+        Entry["Version"] = self.Versions.Write(InternalId,
+                                               not Entry["Dirty"])
+        Entry["Changed"] = self.Clock.Now()
+        Entry["Dirty"] = True
+
+    def _Expire_(self, InternalId):
+        """
+        This method clears an abandoned conversation. It has to be
+        called with the lock.
+        """
+        Entry = self.Sessions[InternalId]
+        if self.Clock.Now() - Entry["Changed"] < self.TimeToLive:
+            return
+        if (Entry["Session"] is not None and
+                Entry["Session"]["Command"] not in (None, "0")):
+            self._Change_(InternalId, {"Command": "0", "Last_Used_Id": 0})
+
+    def Get(self, SqlObject, Cursor, InternalId):
+        """
+        This method returns a copy of the session of the user, None if
+        he has none.
+
+        Variables:
+            SqlObject                     ``sql.Api``
+                the database connection of the thread
+
+            Cursor                        ``object``
+                a dictionary cursor of the database connection
+
+            InternalId                    ``integer``
+                the internal id of the user
+        """
+        self.Prefetch(SqlObject, Cursor, [InternalId])
+        with self._Lock:
+            self._Expire_(InternalId)
+            Session = self.Sessions[InternalId]["Session"]
+            return dict(Session) if Session is not None else None
+
+    def Set(self, SqlObject, Cursor, InternalId, **Columns):
+        """
+        This method changes the given columns of the session of the
+        user, it's written back later.
+
+        Variables:
+            SqlObject                     ``sql.Api``
+                the database connection of the thread
+
+            Cursor                        ``object``
+                a dictionary cursor of the database connection
+
+            InternalId                    ``integer``
+                the internal id of the user
+
+            Columns                       ``dictionary``
+                the changed columns of the Session_Table
+        """
+        # the columns not given keep their value
+        self.Prefetch(SqlObject, Cursor, [InternalId])
+        with self._Lock:
+            self._Change_(InternalId, Columns)
+
+    def Flush(self, SqlObject, Cursor):
+        """
+        This method writes all the changed sessions back with a single
+        statement and returns their amount.
+        
+        The sessions are committed at once, even inside of a batch, the
+        other workers may load them as soon as they are counted as
+        written back.
+
+        Variables:
+            SqlObject                     ``sql.Api``
+                the database connection of the thread
+
+            Cursor                        ``object``
+                a dictionary cursor of the database connection
+        """
+        with self._FlushLock:
+            with self._Lock:
+                self.LastFlush = self.Clock.Now()
+                Dirty = [(InternalId, Entry["Version"],
+                          dict(Entry["Session"]))
+                         for InternalId, Entry in self.Sessions.items()
+                         if Entry["Dirty"]]
+            if not Dirty:
+                return 0
+            Data = []
+            for InternalId, Version, Session in Dirty:
+                Data.append(InternalId)
+                Data.extend(Session[Column] for Column in self.COLUMNS)
+            SqlObject.ExecuteTrueQuery(
+                    Cursor,
+                    self.FLUSH_QUERY.format(
+                        Rows = ", ".join(["(%s, %s, %s, %s)"] * len(Dirty))),
+                    Data)
+            # the sessions stay to be written back if the commit failed
+            if SqlObject.Commit(Force = True) is False:
+                return 0
+
+            Written = []
+            with self._Lock:
+                self.Flushes += 1
+                for InternalId, Version, Session in Dirty:
+                    Entry = self.Sessions.get(InternalId)
+                    # a session changed meanwhile stays to be written back
+                    if (Entry is not None and Entry["Dirty"] and
+                            Entry["Version"] == Version):
+                        Entry["Dirty"] = False
+                        Written.append(InternalId)
+            self.Versions.Flushed(Written)
+            return len(Dirty)
+
+    def FlushIfDue(self, SqlObject, Cursor):
+        """
+        This method writes the changed sessions back, if the last time
+        has been at least FlushInterval seconds ago, and forgets the
+        sessions that haven't been used for TimeToLive seconds.
+
+        Variables:
+            SqlObject                     ``sql.Api``
+                the database connection of the thread
+
+            Cursor                        ``object``
+                a dictionary cursor of the database connection
+        """
+        if self.Clock.Now() - self.LastFlush < self.FlushInterval:
+            return 0
+        with self._Lock:
+            for InternalId in list(self.Sessions.keys()):
+                self._Expire_(InternalId)
+        Amount = self.Flush(SqlObject, Cursor)
+        with self._Lock:
+            Now = self.Clock.Now()
+            for InternalId, Entry in list(self.Sessions.items()):
+                if (not Entry["Dirty"] and
+                        Now - Entry["Changed"] >= self.TimeToLive):
+                    del self.Sessions[InternalId]
+        return Amount
+
+    def GetMetrics(self):
+        """
+        This method returns the amount of held and changed sessions, as
+        well as the amount of loads and write backs.
+
+        Variables:
+            \-
+        """
+        with self._Lock:
+            return {"Sessions": len(self.Sessions),
+                    "Dirty": sum(Entry["Dirty"]
+                                 for Entry in self.Sessions.values()),
+                    "Loads": self.Loads,
+                    "Flushes": self.Flushes}
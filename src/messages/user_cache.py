@@ -0,0 +1,257 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the cache of the users in a SubWorker.
+
+The internal id, the admin state and the language of a user are needed
+for every message he sends, but they hardly ever change. Every worker
+keeps the recently seen users in a cache, so that a user who wrote a
+moment ago doesn't cost any query.
+
+A worker that changes a user writes the change through to the database
+and publishes the id of the user to an InvalidationLog in shared
+memory. Every other cache reads the log before it answers and forgets
+the users published since, so no worker serves a stale language or
+admin state longer than until its next lookup. The entries expire after
+a while as well, to pick up the changes made in the database by hand.
+"""
+
+# standard lib
+import ctypes
+import threading
+import collections
+import multiprocessing
+
+import network.limiter
+
+
+class InvalidationLog(object):
+    """
+    This class is a ring of the ids of the changed users in shared
+    memory, every process reads it from its own position.
+
+    It has to be created before the processes using it are started and
+    handed to them as an argument.
+
+    .. code-block:: python\n
+        Log = InvalidationLog()
+        Log.Publish(UserId)
+        Sequence, UserIds = Log.Read(LastSequence)
+    """
+
+    def __init__(self, Size = 4096):
+        """
+        Variables:
+            Size                          ``integer``
+                the amount of ids kept, a reader that is further behind
+                has to forget everything
+        """
+        self.Size = Size
+        self._Keys = multiprocessing.RawArray(ctypes.c_int64, Size)
+        self._Sequence = multiprocessing.RawValue(ctypes.c_uint64, 0)
+        self._Lock = multiprocessing.Lock()
+
+    def Publish(self, Key):
+        """
+        This method adds the id of a changed user.
+
+        Variables:
+            Key                           ``integer``
+                the external id of the user
+        """
+        with self._Lock:
+            Sequence = self._Sequence.value
+            self._Keys[Sequence % self.Size] = Key
+            self._Sequence.value = Sequence + 1
+
+    def GetSequence(self):
+        """
+        This method returns the amount of ids published so far, it's
+        read without the lock.
+
+        Variables:
+            \-
+        """
+        return self._Sequence.value
+
+    def Read(self, Since):
+        """
+        This method returns the current sequence and the ids published
+        after Since, None instead of the ids if some of them have been
+        overwritten already.
+
+        Variables:
+            Since                         ``integer``
+                the sequence returned by the last read
+        """
+        with self._Lock:
+            Sequence = self._Sequence.value
+            if Sequence - Since > self.Size:
+                return Sequence, None
+            return Sequence, [self._Keys[Number % self.Size]
+                              for Number in range(Since, Sequence)]
+
+class UserCache(object):
+    """
+    This class is a LRU cache of the users with a time to live.
+
+    The entries have the form of the users of ``messages.batch.Batch``,
+    a dictionary with the Internal_Id, Is_Admin and Language of the
+    user. It can be used by several threads.
+
+    .. code-block:: python\n
+        Cache = UserCache(10000, 300, Invalidations = Log)
+        User = Cache.Get(UserId)
+        if User is None:
+            Cache.Set(UserId, InternalId, IsAdmin, Language)
+    """
+
+    def __init__(self,
+                 MaxSize = 10000,
+                 TimeToLive = 300,
+                 Clock = None,
+                 Invalidations = None):
+        """
+        Variables:
+            MaxSize                       ``integer``
+                the maximal amount of users, the least recently used
+                ones are forgotten first
+
+            TimeToLive                    ``float``
+                the seconds a user is kept after it has been loaded
+
+            Clock                         ``None or network.limiter.Clock``
+                the time source, None uses the real time
+
+            Invalidations                 ``None or InvalidationLog``
+                the changes of the users shared between the processes,
+                None only sees the own changes
+        """
+        self.MaxSize = max(1, int(MaxSize))
+        self.TimeToLive = float(TimeToLive)
+        self.Clock = Clock or network.limiter.Clock()
+        self.Invalidations = Invalidations
+
+        self.Users = collections.OrderedDict()
+        self._Seen = (Invalidations.GetSequence()
+                      if Invalidations is not None else 0)
+        self._Lock = threading.Lock()
+        self.Hits = 0
+        self.Misses = 0
+
+    def __len__(self):
+        return len(self.Users)
+
+    def _Sync_(self):
+        """
+        This method forgets the users published by the other processes.
+        It has to be called with the lock.
+        """
+        if (self.Invalidations is None or
+                self.Invalidations.GetSequence() == self._Seen):
+            return
+        self._Seen, UserIds = self.Invalidations.Read(self._Seen)
+        if UserIds is None:
+            self.Users.clear()
+            return
+        for UserId in UserIds:
+            self.Users.pop(UserId, None)
+
+    def Get(self, UserId):
+        """
+        This method returns the user, None if it isn't cached.
+
+        Variables:
+            UserId                        ``integer``
+                the external id of the user
+        """
+        with self._Lock:
+            self._Sync_()
+            Entry = self.Users.get(UserId)
+            if Entry is None or Entry[0] <= self.Clock.Now():
+                if Entry is not None:
+                    del self.Users[UserId]
+                self.Misses += 1
+                return None
+            self.Users.move_to_end(UserId)
+            self.Hits += 1
+            return dict(Entry[1])
+
+    def Set(self, UserId, InternalId, IsAdmin, Language):
+        """
+        This method adds a user that has been loaded from the database.
+
+        Variables:
+            UserId                        ``integer``
+                the external id of the user
+
+            InternalId                    ``integer``
+                the internal id of the user
+
+            IsAdmin                       ``boolean``
+                if the user is an admin
+
+            Language                      ``string``
+                the language setting of the user
+        """
+        with self._Lock:
+            self._Sync_()
+            self.Users[UserId] = (self.Clock.Now() + self.TimeToLive,
+                                  {"Internal_Id": InternalId,
+                                   "Is_Admin": IsAdmin,
+                                   "Language": Language})
+            self.Users.move_to_end(UserId)
+            while len(self.Users) > self.MaxSize:
+                self.Users.popitem(last = False)
+
+    def Invalidate(self, UserId):
+        """
+        This method forgets a user in this and in all the other caches,
+        for example after his admin state has been changed.
+
+        Variables:
+            UserId                        ``integer``
+                the external id of the user
+        """
+        if self.Invalidations is not None:
+            self.Invalidations.Publish(UserId)
+        with self._Lock:
+            self._Sync_()
+            self.Users.pop(UserId, None)
+
+    def Update(self, UserId, InternalId, IsAdmin, Language):
+        """
+        This method replaces a user after it has been changed in the
+        database, the other caches forget him.
+
+        Variables:
+            UserId                        ``integer``
+                the external id of the user
+
+            InternalId                    ``integer``
+                the internal id of the user
+
+            IsAdmin                       ``boolean``
+                if the user is an admin
+
+            Language                      ``string``
+                the language setting of the user
+        """
+        self.Invalidate(UserId)
+        self.Set(UserId, InternalId, IsAdmin, Language)
+
+    def GetMetrics(self):
+        """
+        This method returns the size and the hit rate of the cache.
+
+        Variables:
+            \-
+        """
+        with self._Lock:
+            Lookups = self.Hits + self.Misses
+            return {"Users": len(self.Users),
+                    "Hits": self.Hits,
+                    "Misses": self.Misses,
+                    "HitRate": round(self.Hits / Lookups, 3)
+                               if Lookups else 0.0}
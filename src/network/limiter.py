@@ -0,0 +1,508 @@
+#!/usr/bin/env python3.4
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the rate limiting needed to stay in the limits of
+the telegram bot API.
+
+From the telegram bot FAQ:
+
+    When sending messages inside a particular chat, avoid sending more
+    than one message per second. If you're sending bulk notifications
+    to multiple users, the API will not allow more than 30 messages per
+    second or so. Also note that your bot will not be able to send more
+    than 20 messages per minute to the same group.
+"""
+
+# python standard library
+import time
+import collections
+
+
+class Clock(object):
+    """
+    This class is the time source of the rate limiter.
+
+    It's a class of its own, so that it can be replaced by the
+    FakeClock to test the rate limiter without waiting.
+    """
+
+    def Now(self):
+        """
+        This method returns the current time in seconds.
+
+        Variables:
+            \-
+        """
+        return time.monotonic()
+
+    def Sleep(self, Seconds):
+        """
+        This method waits the given seconds.
+
+        Variables:
+            Seconds                       ``float``
+                the seconds to wait
+        """
+        time.sleep(Seconds)
+
+class FakeClock(Clock):
+    """
+    This class is a clock that only moves if it's told so.
+    """
+
+    def __init__(self, Start = 0.0):
+        """
+        Variables:
+            Start                         ``float``
+                the time the clock starts with
+        """
+        self.Time = Start
+
+    def Now(self):
+        """
+        This method returns the current time of the fake clock.
+
+        Variables:
+            \-
+        """
+        return self.Time
+
+    def Advance(self, Seconds):
+        """
+        This method moves the clock forward.
+
+        Variables:
+            Seconds                       ``float``
+                the seconds to move the clock
+        """
+        self.Time += Seconds
+
+    def Sleep(self, Seconds):
+        """
+        This method moves the clock forward instead of waiting.
+
+        Variables:
+            Seconds                       ``float``
+                the seconds to move the clock
+        """
+        self.Advance(Seconds)
+
+class TokenBucket(object):
+    """
+    This class is a simple token bucket.
+
+    The bucket holds up to Capacity tokens and is refilled with Rate
+    tokens per second. Every send message takes one token.
+    """
+
+    def __init__(self, Rate, Capacity, Now):
+        """
+        Variables:
+            Rate                          ``float``
+                the tokens added per second
+
+            Capacity                      ``float``
+                the maximal amount of tokens (the allowed burst)
+
+            Now                           ``float``
+                the current time
+        """
+        self.Rate = float(Rate)
+        self.Capacity = float(Capacity)
+        self.Tokens = float(Capacity)
+        self.LastRefill = Now
+
+    def _Refill_(self, Now):
+        """
+        This method adds the tokens for the time passed since the last
+        refill.
+        """
+        if Now > self.LastRefill:
+            Added = (Now - self.LastRefill) * self.Rate
+            self.Tokens = min(self.Capacity, self.Tokens + Added)
+            self.LastRefill = Now
+
+    def GetWaitTime(self, Now, Amount = 1):
+        """
+        This method returns the seconds until Amount tokens are
+        available, 0 if they are available right now.
+
+        Variables:
+            Now                           ``float``
+                the current time
+
+            Amount                        ``float``
+                the tokens needed, at most the capacity
+        """
+        self._Refill_(Now)
+        if self.Tokens >= Amount:
+            return 0.0
+        return (Amount - self.Tokens) / self.Rate
+
+    def Take(self, Now):
+        """
+        This method takes a token out of the bucket.
+
+        Variables:
+            Now                           ``float``
+                the current time
+        """
+        self._Refill_(Now)
+        self.Tokens -= 1
+
+    def IsFull(self, Now):
+        """
+        This method returns True if the bucket is completely refilled,
+        so that it can be forgotten.
+
+        Variables:
+            Now                           ``float``
+                the current time
+        """
+        self._Refill_(Now)
+        return self.Tokens >= self.Capacity
+
+class MessageScheduler(object):
+    """
+    This class decides which waiting message may be sent next.
+
+    The messages are held in one queue per chat, so that the messages of
+    a chat are always sent in order. A message to a group takes a token
+    of the limit of the chat and one of the limit of the group. The
+    chats are served round robin, a chat that has to wait (because of
+    its own limit or because of a retry_after given by the server)
+    doesn't hold back the other chats.
+
+    Every message belongs to a lane (see ``LANES``), the chats of a lane
+    have their own round. A chat is queued in a single lane at a time,
+    the lane of its oldest waiting message, the messages pushed after it
+    join that lane, so that they can't overtake it. The lanes share the
+    limits weighted fair: as long as all of them have messages, a lane
+    gets its weight as share of the sent messages. A lane whose chats
+    have to wait is skipped and doesn't hold back the others. The last
+    lane (the bulk messages) may only take a token of the global limit
+    if BulkReserve tokens are left for the other lanes, so that a reply
+    doesn't wait behind a broadcast.
+
+    .. code-block:: python\n
+        Scheduler = MessageScheduler()
+        Scheduler.Push(ChatId, MessageObject, "Interactive")
+        MessageObject = Scheduler.Pop()
+        if MessageObject is None:
+            time.sleep(Scheduler.GetWaitTime())
+    """
+
+    LANES = (("Interactive", 8), ("Admin", 4), ("Bulk", 1))
+    """
+    The default lanes and their weights, from the highest priority to
+    the lowest.
+    """
+
+    def __init__(self,
+                 GlobalRate = 30,
+                 ChatRate = 1,
+                 GroupRatePerMinute = 20,
+                 ChatBurst = 1,
+                 Clock = None,
+                 Lanes = None,
+                 BulkReserve = 0,
+                 GetLane = None,
+                 ):
+        """
+        Variables:
+            GlobalRate                    ``float``
+                the messages per second for all the chats together
+
+            ChatRate                      ``float``
+                the messages per second for a single chat
+
+            GroupRatePerMinute            ``float``
+                the messages per minute for a single group
+
+            ChatBurst                     ``integer``
+                the amount of messages a single chat may get at once
+
+            Clock                         ``None or Clock``
+                the time source, None uses the real time
+
+            Lanes                         ``None or list``
+                the names and the weights of the lanes, from the
+                highest priority to the lowest, None uses LANES
+
+            BulkReserve                   ``integer``
+                the tokens of the global limit the last lane leaves for
+                the other ones
+
+            GetLane                       ``None or function``
+                returns the name of the lane of a message, if Push
+                isn't given one, None puts them into the first lane
+        """
+        if Clock is None:
+            Clock = globals()["Clock"]()
+        self.Clock = Clock
+
+        self.ChatRate = ChatRate
+        self.ChatBurst = ChatBurst
+        self.GroupRate = GroupRatePerMinute / 60.0
+        self.GroupBurst = GroupRatePerMinute
+
+        self.GlobalBucket = TokenBucket(GlobalRate, GlobalRate,
+                                        self.Clock.Now())
+        # the buckets of the single chats, a group has its bucket per
+        # minute as second one
+        self.ChatBuckets = {}
+        # the weight, the pass (the messages sent divided by the weight)
+        # and the waiting messages of each chat of every lane, the chats
+        # in the order they are served
+        self.Lanes = collections.OrderedDict()
+        for Name, Weight in Lanes or self.LANES:
+            self.Lanes[Name] = {"Weight": float(Weight),
+                                "Pass": 0.0,
+                                "Chats": collections.OrderedDict(),
+                                "Amount": 0}
+        self.BulkLane = next(reversed(self.Lanes))
+        self.BulkReserve = max(0, min(float(BulkReserve),
+                                      self.GlobalBucket.Capacity - 1))
+        self.GetLane = GetLane
+        # the lane every chat with waiting messages is queued in
+        self.ChatLanes = {}
+        # the pass of the last served lane, a lane that had no messages
+        # starts there, so that it can't save up its share
+        self.Pass = 0.0
+        # the chats told to wait by the server, until when they wait
+        self.Blocked = {}
+        # all the chats wait until then, while the server is failing
+        self.PausedUntil = 0.0
+        self.Amount = 0
+
+    def __len__(self):
+        return self.Amount
+
+    @staticmethod
+    def IsGroup(ChatId):
+        """
+        This method returns True if the chat id belongs to a group,
+        groups, supergroups and channels have negative ids.
+
+        Variables:
+            ChatId                        ``integer or string``
+                the id of the chat
+        """
+        try:
+            return int(ChatId) < 0
+        except ValueError:
+            # a channel username like @channel
+            return True
+
+    def _GetChatBuckets_(self, ChatId, Now):
+        """
+        This method returns the buckets of the chat and creates them if
+        needed, a message has to take a token of each of them.
+        """
+        Buckets = self.ChatBuckets.get(ChatId)
+        if Buckets is None:
+            Buckets = (TokenBucket(self.ChatRate, self.ChatBurst, Now),)
+            if self.IsGroup(ChatId):
+                Buckets += (TokenBucket(self.GroupRate, self.GroupBurst,
+                                        Now),)
+            self.ChatBuckets[ChatId] = Buckets
+        return Buckets
+
+    def _GetChatWaitTime_(self, ChatId, Now):
+        """
+        This method returns the seconds the chat has to wait until its
+        next message may be sent.
+        """
+        WaitTime = max(Bucket.GetWaitTime(Now)
+                       for Bucket in self._GetChatBuckets_(ChatId, Now))
+        if ChatId in self.Blocked:
+            if self.Blocked[ChatId] <= Now:
+                del self.Blocked[ChatId]
+            else:
+                WaitTime = max(WaitTime, self.Blocked[ChatId] - Now)
+        return WaitTime
+
+    def _GetQueue_(self, ChatId, Item, Lane):
+        """
+        This method returns the queue of the chat in the lane of the
+        message and creates it if needed. A chat that is queued already
+        keeps its lane.
+        """
+        if ChatId in self.ChatLanes:
+            Lane = self.ChatLanes[ChatId]
+        elif Lane is None and self.GetLane is not None:
+            Lane = self.GetLane(Item)
+        if Lane not in self.Lanes:
+            Lane = next(iter(self.Lanes))
+        self.ChatLanes[ChatId] = Lane
+        Lane = self.Lanes[Lane]
+        if not Lane["Amount"]:
+            Lane["Pass"] = max(Lane["Pass"], self.Pass)
+        Lane["Amount"] += 1
+        self.Amount += 1
+        if ChatId not in Lane["Chats"]:
+            Lane["Chats"][ChatId] = collections.deque()
+        return Lane["Chats"][ChatId]
+
+    def Push(self, ChatId, Item, Lane = None):
+        """
+        This method adds a message at the end of the queue of the chat.
+
+        Variables:
+            ChatId                        ``integer or string``
+                the receiver of the message
+
+            Item                          ``object``
+                the message
+
+            Lane                          ``None or string``
+                the lane of the message, None asks GetLane
+        """
+        self._GetQueue_(ChatId, Item, Lane).append(Item)
+
+    def PushFront(self, ChatId, Item, Lane = None):
+        """
+        This method puts a message back to the front of the queue of the
+        chat, for example if it has to be sent again.
+
+        Variables:
+            ChatId                        ``integer or string``
+                the receiver of the message
+
+            Item                          ``object``
+                the message
+
+            Lane                          ``None or string``
+                the lane of the message, None asks GetLane
+        """
+        self._GetQueue_(ChatId, Item, Lane).appendleft(Item)
+
+    def GetDepths(self):
+        """
+        This method returns the amount of waiting messages of every
+        lane.
+
+        Variables:
+            \-
+        """
+        return {Name: Lane["Amount"] for Name, Lane in self.Lanes.items()}
+
+    def _GetLaneWaitTime_(self, Name, Now):
+        """
+        This method returns the seconds the lane has to wait for the
+        global limit.
+        """
+        if Name == self.BulkLane:
+            return self.GlobalBucket.GetWaitTime(Now, 1 + self.BulkReserve)
+        return self.GlobalBucket.GetWaitTime(Now)
+
+    def Pop(self, Exclude = ()):
+        """
+        This method returns the next message that may be sent right now
+        or None if every message has to wait.
+
+        The tokens of the buckets are taken, so the returned message
+        has to be sent.
+
+        Variables:
+            Exclude                       ``container``
+                the chats that must not be served, for example because
+                a message of them is still being sent
+        """
+        Now = self.Clock.Now()
+        if (not self.Amount or Now < self.PausedUntil or
+                self.GlobalBucket.GetWaitTime(Now) > 0):
+            return None
+
+        # the lane that is the most behind its share comes first, on a
+        # tie the one with the higher priority
+        Lanes = sorted((Lane["Pass"], Index, Name)
+                       for Index, (Name, Lane) in enumerate(self.Lanes.items())
+                       if Lane["Amount"])
+        for _, _, Name in Lanes:
+            if self._GetLaneWaitTime_(Name, Now) > 0:
+                continue
+            Lane = self.Lanes[Name]
+            for ChatId in Lane["Chats"]:
+                if (ChatId in Exclude or
+                        self._GetChatWaitTime_(ChatId, Now) > 0):
+                    continue
+
+                Queue = Lane["Chats"][ChatId]
+                Item = Queue.popleft()
+                Lane["Amount"] -= 1
+                self.Amount -= 1
+                # the served chat goes to the end of the round
+                if Queue:
+                    Lane["Chats"].move_to_end(ChatId)
+                else:
+                    del Lane["Chats"][ChatId]
+                    del self.ChatLanes[ChatId]
+                self.Pass = Lane["Pass"]
+                Lane["Pass"] += 1 / Lane["Weight"]
+
+                for Bucket in self.ChatBuckets[ChatId]:
+                    Bucket.Take(Now)
+                self.GlobalBucket.Take(Now)
+                self._ForgetIdleChats_(Now)
+                return Item
+        return None
+
+    def GetWaitTime(self, Exclude = ()):
+        """
+        This method returns the seconds until the next message may be
+        sent, None if there is no waiting message.
+
+        Variables:
+            Exclude                       ``container``
+                the chats that are not taken into account
+        """
+        Now = self.Clock.Now()
+        WaitTimes = [max(self._GetChatWaitTime_(ChatId, Now),
+                         self._GetLaneWaitTime_(Name, Now))
+                     for Name, Lane in self.Lanes.items()
+                     for ChatId in Lane["Chats"] if ChatId not in Exclude]
+        if not WaitTimes:
+            return None
+        return max(min(WaitTimes), self.PausedUntil - Now)
+
+    def Backoff(self, ChatId, RetryAfter):
+        """
+        This method blocks a chat for the time given by the server in
+        the retry_after field of a 429 answer.
+
+        Variables:
+            ChatId                        ``integer or string``
+                the chat that has to wait
+
+            RetryAfter                    ``integer or float``
+                the seconds to wait
+        """
+        Until = self.Clock.Now() + RetryAfter
+        self.Blocked[ChatId] = max(Until, self.Blocked.get(ChatId, Until))
+
+    def Pause(self, Seconds):
+        """
+        This method holds back the messages of all the chats, for
+        example while the telegram servers are failing.
+
+        Variables:
+            Seconds                       ``integer or float``
+                the seconds to wait
+        """
+        self.PausedUntil = max(self.PausedUntil, self.Clock.Now() + Seconds)
+
+    def _ForgetIdleChats_(self, Now):
+        """
+        This method removes the buckets of the chats without waiting
+        messages and a full bucket, so that the buckets don't pile up.
+        """
+        if len(self.ChatBuckets) < 1024:
+            return
+        for ChatId in list(self.ChatBuckets.keys()):
+            if (ChatId not in self.Blocked and
+                    all(Bucket.IsFull(Now)
+                        for Bucket in self.ChatBuckets[ChatId]) and
+                    ChatId not in self.ChatLanes):
+                del self.ChatBuckets[ChatId]
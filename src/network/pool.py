@@ -0,0 +1,311 @@
+#!/usr/bin/env python3.4
+# -*- coding: utf-8 -*-
+
+"""
+This module defines a pool of persistent HTTP/1.1 connections.
+
+Every process that talks to the telegram bot API holds its own pool, so
+that the TCP connect and the TLS handshake are only paid once per
+connection instead of once per request.
+"""
+
+# python standard library
+import io
+import select
+import threading
+import contextlib
+import http.client
+import urllib.error
+import urllib.parse
+
+
+class ConnectionPool(object):
+    """
+    This class keeps a number of keep-alive connections to a single
+    host open and hands them out to the callers.
+
+    The pool is thread safe, at most ``Size`` connections will be in use
+    at the same time. Idle connections are reused in a last in first
+    out order, so that the most recently used (and therefore least
+    likely to be closed by the server) connection is used first.
+    """
+
+    RECONNECT_ERRORS = (
+                        http.client.CannotSendRequest,
+                        http.client.BadStatusLine,
+                        ConnectionResetError,
+                        ConnectionAbortedError,
+                        BrokenPipeError,
+                        )
+    """
+    The errors that show that a reused connection has been closed by
+    the other side, before the request could be answered. The
+    RemoteDisconnected of Python 3.5 is a BadStatusLine.
+    """
+
+    IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+    """
+    The methods that may be resent after the request has been written
+    completely, a resent POST could send a message twice.
+    """
+
+    def __init__(self,
+                 Url,
+                 SSLContext = None,
+                 Size = 1,
+                 Timeout = 60,
+                 ):
+        """
+        Variables:
+            Url                           ``string``
+                an url of the server, only the scheme, the host and the
+                port are used.
+
+            SSLContext                    ``ssl.SSLContext or None``
+                the ssl context used for the https connections
+
+            Size                          ``integer``
+                the maximal amount of connections in use at the same
+                time
+
+            Timeout                       ``integer or float``
+                the default socket timeout in seconds
+        """
+        ParsedUrl = urllib.parse.urlsplit(Url)
+
+        self.Scheme = ParsedUrl.scheme
+        self.Host = ParsedUrl.hostname
+        self.Port = ParsedUrl.port
+        self.SSLContext = SSLContext
+        self.Size = max(1, int(Size))
+        self.Timeout = Timeout
+
+        # The idle connections and the lock protecting them.
+        self._IdleConnections = []
+        self._Lock = threading.Lock()
+        # This semaphore limits the connections in use.
+        self._Slots = threading.BoundedSemaphore(self.Size)
+
+        self.Statistics = {
+                           # a idle connection could be reused
+                           "Hits": 0,
+                           # a new connection had to be opened
+                           "Misses": 0,
+                           # an idle connection was closed by the server
+                           "Stale": 0,
+                           # a request had to be resent over a new
+                           # connection
+                           "Reconnects": 0,
+                           }
+
+    def _Count_(self, Counter):
+        """
+        This method increments one of the statistic counters.
+
+        Variables:
+            Counter                       ``string``
+                the name of the counter
+        """
+        with self._Lock:
+            self.Statistics[Counter] += 1
+
+    def GetStatistics(self):
+        """
+        This method returns a copy of the pool hit and miss counters.
+
+        Variables:
+            \-
+        """
+        with self._Lock:
+            Statistics = dict(self.Statistics)
+            Statistics["Idle"] = len(self._IdleConnections)
+        return Statistics
+
+    def _NewConnection_(self):
+        """
+        This method opens a new connection to the host.
+
+        Variables:
+            \-
+        """
+        if self.Scheme == "https":
+            return http.client.HTTPSConnection(self.Host,
+                                               self.Port,
+                                               timeout = self.Timeout,
+                                               context = self.SSLContext
+                                               )
+        else:
+            return http.client.HTTPConnection(self.Host,
+                                              self.Port,
+                                              timeout = self.Timeout
+                                              )
+
+    @staticmethod
+    def _IsStale_(Connection):
+        """
+        This method checks if an idle connection has been closed by the
+        server.
+
+        An idle keep-alive socket is never readable, if it is the server
+        either closed it (end of file) or sent something unexpected. In
+        both cases the connection can't be used anymore.
+
+        Variables:
+            Connection                    ``http.client.HTTPConnection``
+                the idle connection to check
+        """
+        if Connection.sock is None:
+            return False
+        try:
+            Readable, _, _ = select.select([Connection.sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(Readable)
+
+    def _Acquire_(self):
+        """
+        This method returns a connection and the information if it has
+        been reused or not.
+
+        Variables:
+            \-
+        """
+        self._Slots.acquire()
+        while True:
+            with self._Lock:
+                Connection = (self._IdleConnections.pop()
+                              if self._IdleConnections else None)
+            if Connection is None:
+                self._Count_("Misses")
+                return self._NewConnection_(), False
+            if self._IsStale_(Connection):
+                self._Count_("Stale")
+                Connection.close()
+                continue
+            self._Count_("Hits")
+            return Connection, True
+
+    def _Release_(self, Connection, Reusable):
+        """
+        This method will give the connection back to the pool.
+
+        Variables:
+            Connection                    ``http.client.HTTPConnection``
+                the connection to give back
+
+            Reusable                      ``boolean``
+                if the connection can be used for another request
+        """
+        try:
+            if Reusable is True:
+                with self._Lock:
+                    self._IdleConnections.append(Connection)
+            else:
+                Connection.close()
+        finally:
+            self._Slots.release()
+
+    def _Send_(self, Connection, Method, Url, Body, Headers, Timeout,
+               Progress = None):
+        """
+        This method sends the request over the connection and returns
+        the response. Progress["Sent"] is set as soon as the request
+        has been written completely.
+        """
+        if Timeout is not None:
+            Connection.timeout = Timeout
+            if Connection.sock is not None:
+                Connection.sock.settimeout(Timeout)
+        Connection.request(Method, Url, body = Body, headers = Headers)
+        if Progress is not None:
+            Progress["Sent"] = True
+        return Connection.getresponse()
+
+    @contextlib.contextmanager
+    def Open(self, Request, Timeout = None):
+        """
+        This method sends an ``urllib.request.Request`` over a pooled
+        connection.
+
+        It is meant to be used like ``urllib.request.urlopen``. The
+        response object is yielded and the connection is given back to
+        the pool, as soon as the with block is left. A response that
+        hasn't been read completely closes the connection.
+
+        Like urlopen it raises an ``urllib.error.HTTPError`` if the
+        server returns a status code of 400 or higher.
+
+        .. code-block:: python\n
+            with Pool.Open(Request) as Response:
+                Data = Response.read()
+
+        Variables:
+            Request                       ``urllib.request.Request``
+                the request to send
+
+            Timeout                       ``None, integer or float``
+                the socket timeout for this request, None uses the
+                default of the pool
+        """
+        Method = Request.get_method()
+        Url = Request.selector
+        Headers = dict(Request.header_items())
+        Headers["Connection"] = "keep-alive"
+        if Timeout is None:
+            Timeout = self.Timeout
+
+        Connection, Reused = self._Acquire_()
+        Response = None
+        Progress = {"Sent": False}
+        try:
+            try:
+                Response = self._Send_(Connection, Method, Url,
+                                       Request.data, Headers, Timeout,
+                                       Progress)
+            except ConnectionPool.RECONNECT_ERRORS:
+                if Reused is False:
+                    raise
+                # The request may have arrived if it has been written
+                # completely, only a request that can't have any effect
+                # is resent then.
+                if (Progress["Sent"] and 
+                        Method not in ConnectionPool.IDEMPOTENT_METHODS):
+                    raise
+                # The server closed the keep-alive connection before
+                # the request arrived, so it is safe to resend it.
+                self._Count_("Reconnects")
+                Connection.close()
+                Connection = self._NewConnection_()
+                Response = self._Send_(Connection, Method, Url,
+                                       Request.data, Headers, Timeout)
+
+            if Response.status >= 400:
+                Body = Response.read()
+                raise urllib.error.HTTPError(Request.full_url,
+                                             Response.status,
+                                             Response.reason,
+                                             Response.msg,
+                                             io.BytesIO(Body)
+                                             )
+            yield Response
+        except BaseException:
+            self._Release_(Connection,
+                           Response is not None and Response.isclosed()
+                           and not Response.will_close)
+            raise
+        else:
+            self._Release_(Connection,
+                           Response.isclosed() and not Response.will_close)
+
+    def Close(self):
+        """
+        This method closes all the idle connections of the pool.
+
+        Variables:
+            \-
+        """
+        with self._Lock:
+            IdleConnections = self._IdleConnections
+            self._IdleConnections = []
+        for Connection in IdleConnections:
+            Connection.close()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3.4
+# -*- coding: utf-8 -*-
+
+"""
+This module defines how the bot reacts to failures of the telegram
+servers.
+
+A failing request is retried after an exponentially growing delay with
+a random jitter, so that the processes don't retry in a hot loop and
+don't all come back at the same moment. A circuit breaker per method of
+the bot API stops sending requests at all, after several requests in a
+row have failed, until a single trial request succeeds again.
+"""
+
+# python standard library
+import random
+import socket
+import threading
+import urllib.error
+
+from . import limiter
+
+
+class CircuitOpenError(ConnectionError):
+    """
+    This error is raised instead of sending a request while the circuit
+    breaker of the method is open.
+    """
+
+    def __init__(self, Name, WaitTime):
+        super().__init__("The circuit breaker of {} is open for {:.1f} more"
+                         " seconds".format(Name, WaitTime))
+        self.Name = Name
+        self.WaitTime = WaitTime
+
+def IsTransient(Error):
+    """
+    This function returns True if the error shows that the server (or
+    the connection to it) has a problem, so that the request should be
+    tried again later. Errors in the request itself (4xx) are not
+    transient.
+
+    Variables:
+        Error                             ``Exception``
+            the error raised by the request
+    """
+    if isinstance(Error, urllib.error.HTTPError):
+        return Error.code >= 500
+    return isinstance(Error, (OSError, socket.timeout))
+
+class Backoff(object):
+    """
+    This class calculates the delays between retries.
+
+    The delay is drawn uniformly between 0 and Base * 2 ** Attempts, but
+    never more than Maximum ("full jitter").
+
+    .. code-block:: python\n
+        Delay = Backoff.Next()  # after a failure
+        Backoff.Reset()         # after a success
+    """
+
+    def __init__(self, Base = 1.0, Maximum = 60.0, Random = None):
+        """
+        Variables:
+            Base                          ``float``
+                the seconds of the first delay
+
+            Maximum                       ``float``
+                the maximal seconds of a delay
+
+            Random                        ``random.Random or None``
+                the random number generator, to get repeatable delays
+        """
+        self.Base = float(Base)
+        self.Maximum = float(Maximum)
+        self.Random = Random or random.Random()
+        self.Attempts = 0
+
+    def GetCeiling(self):
+        """
+        This method returns the longest possible next delay.
+
+        Variables:
+            \-
+        """
+        return min(self.Maximum, self.Base * 2 ** min(self.Attempts, 32))
+
+    def Next(self):
+        """
+        This method returns the delay before the next retry.
+
+        Variables:
+            \-
+        """
+        Delay = self.Random.uniform(0, self.GetCeiling())
+        self.Attempts += 1
+        return Delay
+
+    def Reset(self):
+        """
+        This method starts again with the shortest delay.
+
+        Variables:
+            \-
+        """
+        self.Attempts = 0
+
+class CircuitBreaker(object):
+    """
+    This class is a circuit breaker for a single method of the API.
+
+    It's closed at the beginning, so every request is allowed. After
+    FailureThreshold failures in a row it opens and no request is
+    allowed for ResetTimeout seconds. Then a single trial request is
+    allowed (half open), if it succeeds the breaker closes, else it
+    opens again. A trial request that hasn't finished after
+    TrialTimeout seconds counts as failed, so that a lost one can't
+    block the method for good.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half open"
+
+    def __init__(self,
+                 Name,
+                 FailureThreshold = 5,
+                 ResetTimeout = 30.0,
+                 Clock = None,
+                 OnChange = None,
+                 TrialTimeout = None):
+        """
+        Variables:
+            Name                          ``string``
+                the name of the guarded method
+
+            FailureThreshold              ``integer``
+                the failures in a row that open the breaker
+
+            ResetTimeout                  ``float``
+                the seconds until a trial request is allowed
+
+            Clock                         ``None or network.limiter.Clock``
+                the time source, None uses the real time
+
+            OnChange                      ``None or function``
+                is called with the breaker when its state changed
+
+            TrialTimeout                  ``None or float``
+                the seconds a trial request may take, None uses the
+                ResetTimeout
+        """
+        self.Name = Name
+        self.FailureThreshold = max(1, int(FailureThreshold))
+        self.ResetTimeout = float(ResetTimeout)
+        self.Clock = Clock or limiter.Clock()
+        self.OnChange = OnChange
+        self.TrialTimeout = float(self.ResetTimeout if TrialTimeout is None
+                                  else TrialTimeout)
+
+        self.State = CircuitBreaker.CLOSED
+        self.Failures = 0
+        self.OpenedAt = 0.0
+        self.TrialStartedAt = 0.0
+        self._Lock = threading.Lock()
+
+    def _SetState_(self, State):
+        Changed = State != self.State
+        self.State = State
+        return Changed
+
+    def _ExpireTrial_(self, Now):
+        """
+        This method opens the breaker again if the trial request is
+        overdue and returns True if it did. It has to be called with the
+        lock.
+        """
+        if (self.State != CircuitBreaker.HALF_OPEN or
+                Now < self.TrialStartedAt + self.TrialTimeout):
+            return False
+        self.Failures += 1
+        self._SetState_(CircuitBreaker.OPEN)
+        self.OpenedAt = Now
+        return True
+
+    def GetWaitTime(self):
+        """
+        This method returns the seconds until a request is allowed.
+
+        Variables:
+            \-
+        """
+        with self._Lock:
+            Now = self.Clock.Now()
+            if self.State == CircuitBreaker.HALF_OPEN:
+                # until the trial is given up and another one allowed
+                return max(0.0, self.TrialStartedAt + self.TrialTimeout +
+                           self.ResetTimeout - Now)
+            if self.State != CircuitBreaker.OPEN:
+                return 0.0
+            return max(0.0, self.OpenedAt + self.ResetTimeout - Now)
+
+    def Allow(self):
+        """
+        This method returns True if a request may be sent now.
+
+        Variables:
+            \-
+        """
+        with self._Lock:
+            if self.State == CircuitBreaker.CLOSED:
+                return True
+            Now = self.Clock.Now()
+            Changed = self._ExpireTrial_(Now)
+            Allowed = False
+            if (self.State == CircuitBreaker.OPEN and
+                    Now >= self.OpenedAt + self.ResetTimeout):
+                # exactly one trial request
+                self._SetState_(CircuitBreaker.HALF_OPEN)
+                self.TrialStartedAt = Now
+                Allowed = True
+        if Changed and self.OnChange is not None:
+            self.OnChange(self)
+        return Allowed
+
+    def Guard(self):
+        """
+        This method raises a CircuitOpenError if no request may be sent
+        now.
+
+        Variables:
+            \-
+        """
+        if not self.Allow():
+            raise CircuitOpenError(self.Name, self.GetWaitTime())
+
+    def RecordSuccess(self):
+        """
+        This method closes the breaker after a successful request.
+
+        Variables:
+            \-
+        """
+        with self._Lock:
+            self.Failures = 0
+            Changed = self._SetState_(CircuitBreaker.CLOSED)
+        if Changed and self.OnChange is not None:
+            self.OnChange(self)
+
+    def RecordFailure(self):
+        """
+        This method counts a failed request and opens the breaker if
+        needed.
+
+        Variables:
+            \-
+        """
+        with self._Lock:
+            self.Failures += 1
+            Changed = False
+            if (self.State == CircuitBreaker.HALF_OPEN or
+                    self.Failures >= self.FailureThreshold):
+                Changed = self._SetState_(CircuitBreaker.OPEN)
+                self.OpenedAt = self.Clock.Now()
+        if Changed and self.OnChange is not None:
+            self.OnChange(self)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3.4
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the concurrent sending of the outgoing messages.
+
+Instead of waiting for every answer before the next message is sent,
+several requests are kept in flight at the same time over the pooled
+connections. The blocking requests run in a thread pool, the loop of
+the sender waits for the first one to finish.
+"""
+
+# python standard library
+import urllib.error
+import concurrent.futures
+
+from . import resilience
+
+
+class AsyncSender(object):
+    """
+    This class sends the messages handed out by a
+    ``network.limiter.MessageScheduler`` with up to ``Concurrency``
+    requests at the same time.
+
+    Only one message per chat is in flight at any time, so the messages
+    of a chat still arrive in the order they have been scheduled.
+
+    .. code-block:: python\n
+        Sender = AsyncSender(Scheduler, Receive, Send, Done, 4)
+        Sender.Run(IsRunning)
+        Sender.Close()
+    """
+
+    def __init__(self,
+                 Scheduler,
+                 Receive,
+                 Send,
+                 Done,
+                 Concurrency = 4,
+                 PollTimeout = 0.1,
+                 Backoff = None,
+                 Failed = None,
+                 MaxAttempts = 5,
+                 ):
+        """
+        Variables:
+            Scheduler                     ``network.limiter.MessageScheduler``
+                the scheduler deciding what may be sent
+
+            Receive                       ``function``
+                is called with a timeout in seconds and returns a list
+                of (ChatId, Message) tuples to schedule, it may block
+                until the timeout is over
+
+            Send                          ``function``
+                sends a message and returns the answer, it's called in
+                a worker thread
+
+            Done                          ``function``
+                is called with the message and the answer of Send, when
+                a message has been sent
+
+            Concurrency                   ``integer``
+                the maximal amount of requests in flight
+
+            PollTimeout                   ``float``
+                the maximal seconds Receive waits for new messages
+
+            Backoff                       ``None or network.resilience.Backoff``
+                the delays all the chats wait after a failure of the
+                server, None uses the defaults of the Backoff
+
+            Failed                        ``None or function``
+                is called with the message and the error, when a message
+                is given up
+
+            MaxAttempts                   ``integer``
+                the maximal attempts to send a message that got an
+                unexpected error, a failed connection is retried until
+                it works again
+        """
+        self.Scheduler = Scheduler
+        self.Receive = Receive
+        self.Send = Send
+        self.Done = Done
+        self.Concurrency = max(1, int(Concurrency))
+        self.PollTimeout = PollTimeout
+        self.Backoff = Backoff or resilience.Backoff()
+        self.Failed = Failed
+        self.MaxAttempts = max(1, int(MaxAttempts))
+        # the failed attempts of the message in front of a chat
+        self.Attempts = {}
+
+        # the chats with a request in flight and their futures
+        self.InFlight = {}
+        self.SendExecutor = concurrent.futures.ThreadPoolExecutor(
+                                                            self.Concurrency)
+        # Receive has its own thread, so that waiting for new messages
+        # never takes a slot of the requests.
+        self.ReceiveExecutor = concurrent.futures.ThreadPoolExecutor(1)
+
+    def Push(self, ChatId, Message):
+        """
+        This method schedules a message to be sent.
+
+        Variables:
+            ChatId                        ``integer or string``
+                the receiver of the message
+
+            Message                       ``object``
+                the message handed to Send
+        """
+        self.Scheduler.Push(ChatId, (ChatId, Message))
+
+    def _StartSends_(self):
+        """
+        This method starts as many requests as the scheduler and the
+        concurrency allow.
+        """
+        while len(self.InFlight) < self.Concurrency:
+            Entry = self.Scheduler.Pop(Exclude = self.InFlight)
+            if Entry is None:
+                break
+            ChatId, Message = Entry
+            Future = self.SendExecutor.submit(self.Send, Message)
+            self.InFlight[ChatId] = (Message, Future)
+
+    def _FinishSends_(self):
+        """
+        This method handles the requests that have been answered.
+
+        A 429 answer blocks the chat for the retry_after of the server
+        and puts the message back in front of the chat. A failure of the
+        server (see ``network.resilience.IsTransient``) holds back all
+        the chats for a growing delay, the message is sent again too.
+        Any other error is retried the same way up to MaxAttempts times,
+        a refused message is given up at once.
+        """
+        for ChatId, (Message, Future) in list(self.InFlight.items()):
+            if not Future.done():
+                continue
+            del self.InFlight[ChatId]
+            try:
+                Answer = Future.result()
+            except urllib.error.HTTPError as Error:
+                if Error.code == 429:
+                    self.Scheduler.Backoff(ChatId,
+                                           getattr(Error, "RetryAfter", 1))
+                    self.Scheduler.PushFront(ChatId, (ChatId, Message))
+                elif resilience.IsTransient(Error):
+                    self.Scheduler.Pause(self._GetPause_(Error))
+                    self._Retry_(ChatId, Message, Error)
+                else:
+                    self._GiveUp_(ChatId, Message, Error)
+            except OSError as Error:
+                self.Scheduler.Pause(self._GetPause_(Error))
+                self.Scheduler.PushFront(ChatId, (ChatId, Message))
+            except Exception as Error:
+                # a broken answer, it's unlikely to be fixed by waiting
+                self.Scheduler.Pause(self._GetPause_(Error))
+                self._Retry_(ChatId, Message, Error)
+            else:
+                self.Attempts.pop(ChatId, None)
+                self.Backoff.Reset()
+                self.Done(Message, Answer)
+
+    def _Retry_(self, ChatId, Message, Error):
+        """
+        This method puts the message back in front of the chat, unless
+        it has failed MaxAttempts times already.
+        """
+        Attempts = self.Attempts.get(ChatId, 0) + 1
+        if Attempts >= self.MaxAttempts:
+            self._GiveUp_(ChatId, Message, Error)
+            return
+        self.Attempts[ChatId] = Attempts
+        self.Scheduler.PushFront(ChatId, (ChatId, Message))
+
+    def _GiveUp_(self, ChatId, Message, Error):
+        """
+        This method drops the message, the next one of the chat is sent.
+        """
+        self.Attempts.pop(ChatId, None)
+        if self.Failed is not None:
+            self.Failed(Message, Error)
+
+    def _GetPause_(self, Error):
+        """
+        This method returns the seconds all the chats wait after the
+        error, an open circuit breaker knows how long it stays open.
+        """
+        Delay = self.Backoff.Next()
+        if isinstance(Error, resilience.CircuitOpenError):
+            Delay = max(Delay, Error.WaitTime)
+        return Delay
+
+    def Run(self, IsRunning, IsOverdue = None):
+        """
+        This method sends the messages until IsRunning returns False
+        and all the received messages have been sent.
+
+        Variables:
+            IsRunning                     ``function``
+                returns False as soon as no new messages will arrive
+
+            IsOverdue                     ``None or function``
+                returns True if the draining has to stop, the messages
+                not sent yet stay in the scheduler (see Pending)
+        """
+        Receiving = None
+        Draining = False
+        while True:
+            if Receiving is None:
+                Draining = not IsRunning()
+                Receiving = self.ReceiveExecutor.submit(self.Receive,
+                                                        self.PollTimeout)
+
+            self._StartSends_()
+            Futures = set(Future for _, Future in self.InFlight.values())
+            Futures.add(Receiving)
+            # wait until something finishes or the scheduler allows the
+            # next message, if there is a free slot for it
+            WaitTime = None
+            if len(self.InFlight) < self.Concurrency:
+                WaitTime = self.Scheduler.GetWaitTime(Exclude = self.InFlight)
+            concurrent.futures.wait(
+                            Futures,
+                            timeout = WaitTime,
+                            return_when = concurrent.futures.FIRST_COMPLETED)
+
+            self._FinishSends_()
+            if Receiving.done():
+                Entries = Receiving.result()
+                Receiving = None
+                for ChatId, Message in Entries:
+                    self.Push(ChatId, Message)
+                if (Draining and not Entries and not self.InFlight
+                        and len(self.Scheduler) == 0):
+                    break
+            if (Draining and IsOverdue is not None and IsOverdue() and
+                    Receiving is None):
+                # the requests in flight are finished by Close
+                break
+
+    def Pending(self):
+        """
+        This method returns the amount of messages not sent yet, 
+        including the ones in flight.
+
+        Variables:
+            \-
+        """
+        return len(self.Scheduler) + len(self.InFlight)
+
+    def Close(self):
+        """
+        This method stops the threads of the sender. The requests still
+        in flight are finished, so that a message sent meanwhile is
+        handed to Done and not sent again.
+
+        Variables:
+            \-
+        """
+        self.SendExecutor.shutdown(wait = True)
+        self.ReceiveExecutor.shutdown(wait = True)
+        self._FinishSends_()
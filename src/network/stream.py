@@ -0,0 +1,195 @@
+#!/usr/bin/env python3.4
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the incremental reading of the answers of the
+telegram bot API.
+
+The body of a response is read in chunks, decompressed chunk by chunk
+and the elements of the ``result`` array are decoded one at a time, so
+that the first update can be processed before the last one has even
+been received and no complete copy of the body is ever held.
+"""
+
+# python standard library
+import json
+import zlib
+import codecs
+
+
+def IterateBody(Response, ChunkSize = 16384):
+    """
+    This function yields the decompressed body of a http response in
+    chunks.
+
+    The encoding is taken from the Content-Encoding header of the
+    response, gzip, deflate (with or without zlib header) and identity
+    are understood.
+
+    Variables:
+        Response                          ``http.client.HTTPResponse``
+            the response to read
+
+        ChunkSize                         ``integer``
+            the amount of bytes read at once
+    """
+    Encoding = (Response.getheader("Content-Encoding") or "").lower()
+    if Encoding == "gzip":
+        Decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif Encoding == "deflate":
+        # the zlib header is detected automatically
+        Decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+    else:
+        Decompressor = None
+
+    First = True
+    while True:
+        Chunk = Response.read(ChunkSize)
+        if not Chunk:
+            break
+        if Decompressor is None:
+            yield Chunk
+            continue
+        try:
+            Data = Decompressor.decompress(Chunk)
+        except zlib.error:
+            if Encoding != "deflate" or not First:
+                raise
+            # a raw deflate stream without any header
+            Decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            Data = Decompressor.decompress(Chunk)
+        First = False
+        if Data:
+            yield Data
+
+    if Decompressor is not None:
+        Chunk = Decompressor.flush()
+        if Chunk:
+            yield Chunk
+
+class ResultStream(object):
+    """
+    This class decodes an answer of the telegram bot API incrementally.
+
+    Iterating over it yields the elements of the ``result`` array one
+    at a time, all the other fields of the answer (like ``ok`` or
+    ``description``) are stored in ``Fields``.
+
+    .. code-block:: python\n
+        Stream = ResultStream(IterateBody(Response))
+        for Update in Stream:
+            ...
+        if Stream.Fields["ok"] is not True:
+            ...
+    """
+
+    WHITESPACE = " \t\n\r"
+
+    def __init__(self, Chunks, Key = "result"):
+        """
+        Variables:
+            Chunks                        ``iterable``
+                the byte chunks of the utf-8 encoded body
+
+            Key                           ``string``
+                the field whose array elements are yielded
+        """
+        self.Chunks = iter(Chunks)
+        self.Key = Key
+        self.Fields = {}
+
+        self._Decoder = codecs.getincrementaldecoder("utf-8")()
+        self._JSONDecoder = json.JSONDecoder()
+        self._Buffer = ""
+        self._Position = 0
+        self._Finished = False
+
+    def _Fill_(self):
+        """
+        This method adds the next chunk to the buffer, it returns False
+        if there is no chunk left.
+        """
+        if self._Finished:
+            return False
+        # the consumed part of the buffer is dropped
+        if self._Position:
+            self._Buffer = self._Buffer[self._Position:]
+            self._Position = 0
+        for Chunk in self.Chunks:
+            Text = self._Decoder.decode(Chunk)
+            if Text:
+                self._Buffer += Text
+                return True
+        self._Buffer += self._Decoder.decode(b"", True)
+        self._Finished = True
+        return False
+
+    def _Peek_(self):
+        """
+        This method skips the whitespace and returns the next character
+        without consuming it.
+        """
+        while True:
+            while (self._Position < len(self._Buffer) and
+                   self._Buffer[self._Position] in self.WHITESPACE):
+                self._Position += 1
+            if self._Position < len(self._Buffer):
+                return self._Buffer[self._Position]
+            if not self._Fill_():
+                raise ValueError("Unexpected end of the JSON data")
+
+    def _Expect_(self, Characters):
+        """
+        This method consumes the next character, it has to be one of
+        the given ones.
+        """
+        Character = self._Peek_()
+        if Character not in Characters:
+            raise ValueError("Expected one of {!r} at position {} but got "
+                             "{!r}".format(Characters, self._Position,
+                                           Character))
+        self._Position += 1
+        return Character
+
+    def _Value_(self):
+        """
+        This method decodes the next complete JSON value.
+        """
+        self._Peek_()
+        while True:
+            try:
+                Value, End = self._JSONDecoder.raw_decode(self._Buffer,
+                                                          self._Position)
+            except ValueError:
+                # the value isn't complete yet
+                if not self._Fill_():
+                    raise
+                continue
+            # A number at the end of the buffer could go on in the next
+            # chunk.
+            if End == len(self._Buffer) and self._Fill_():
+                continue
+            self._Position = End
+            return Value
+
+    def __iter__(self):
+        self._Expect_("{")
+        if self._Peek_() == "}":
+            self._Position += 1
+            return
+        while True:
+            Name = self._Value_()
+            self._Expect_(":")
+            if Name == self.Key and self._Peek_() == "[":
+                self._Position += 1
+                if self._Peek_() == "]":
+                    self._Position += 1
+                else:
+                    while True:
+                        yield self._Value_()
+                        if self._Expect_(",]") == "]":
+                            break
+            else:
+                self.Fields[Name] = self._Value_()
+            if self._Expect_(",}") == "}":
+                return
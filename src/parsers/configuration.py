@@ -200,8 +200,127 @@ class ConfigurationParser(DefaultConfigurationParser):
             # until to state a request the telegram server.
             # It's in milliseconds
             ("RequestTimer", 1000),
+            # The username of the bot, the commands addressed to another
+            # bot in a group (/start@OtherBot) are ignored.
+            ("BotName", "AnimeSubBot"),
             ("DefaultLanguage", "en_US,"),
             ("MaxWorker", 5),
+            # The autoscaler keeps the workers busy about 
+            # TargetUtilization of the time and the queued messages 
+            # processed in TargetDelay seconds. It samples the load 
+            # every ScaleInterval seconds, grows at most every 
+            # ScaleUpCooldown seconds and shrinks by one worker after
+            # ScaleDownCooldown idle seconds below LowUtilization.
+            ("MinWorker", 1),
+            ("TargetUtilization", 0.7),
+            ("LowUtilization", 0.3),
+            ("TargetDelay", 1.0),
+            ("ScaleInterval", 0.5),
+            ("ScaleUpCooldown", 5),
+            ("ScaleDownCooldown", 60),
+            # The workers started ahead of demand, with their database
+            # connection open, so that scaling up takes milliseconds.
+            ("WarmWorkers", 1),
+            # The maximal amount of updates a worker takes at once, 
+            # their users are loaded with one query and their changes
+            # committed once.
+            ("BatchSize", 32),
+            # The threads of every worker, each one with its own 
+            # database connection, so that one process waits for 
+            # several queries at once. 1 processes the updates in the
+            # worker itself.
+            ("WorkerThreads", 1),
+            # The amount of users every worker keeps in its cache and 
+            # the seconds a user is kept, a change of a user made by 
+            # the bot itself is seen by all the workers at once.
+            ("UserCacheSize", 10000),
+            ("UserCacheTime", 300),
+            # Where the sessions of the users are kept, "memory" writes
+            # them back to the database every SessionFlushInterval 
+            # seconds, "database" writes every change at once. An 
+            # unchanged session is forgotten after SessionTime seconds.
+            ("SessionStore", "memory"),
+            ("SessionTime", 3600),
+            ("SessionFlushInterval", 1.0),
+            # The amount of keep-alive connections to the telegram 
+            # servers per process.
+            ("InputConnections", 1),
+            ("OutputConnections", 4),
+            # The seconds the getUpdates request is held open by the 
+            # telegram server (long polling), 0 means short polling.
+            ("LongPollingTimeout", 30),
+            # The maximal amount of updates per getUpdates request.
+            ("UpdateLimit", 100),
+            # How the updates are received, either "polling" or 
+            # "webhook".
+            ("UpdateMode", "polling"),
+            # The sending limits of the telegram bot API, the messages
+            # per second for all chats and for a single chat and the 
+            # messages per minute for a single group (on top of the
+            # limit of a single chat).
+            ("GlobalRateLimit", 30),
+            ("ChatRateLimit", 1),
+            ("GroupRateLimit", 20),
+            ("ChatBurst", 1),
+            # The outgoing messages are sent in three lanes, the replies
+            # to the users, the answers to the admins and the bulk 
+            # messages (broadcasts, long replies). The lanes share the
+            # rate limits by their weights. The bulk lane always leaves
+            # BulkReserve messages of the burst of the GlobalRateLimit 
+            # to the other ones, so that a reply is sent at once.
+            ("InteractiveWeight", 8),
+            ("AdminWeight", 4),
+            ("BulkWeight", 1),
+            ("BulkReserve", 5),
+            # The minimal seconds between two fsyncs of the spool of 
+            # the outgoing messages.
+            ("SpoolSyncInterval", 0.05),
+            # The maximal amount of messages waiting in the scheduler of
+            # the output, above it the messages stay in their queue (and
+            # the input is paused when it's full).
+            ("SchedulerLimit", 10000),
+            # The minimal seconds between two checkpoints of the offset
+            # of the telegram updates, 0 saves after every batch.
+            ("OffsetCheckpointInterval", 1.0),
+            # The url of the bot API, the token is appended to it.
+            ("BaseUrl", "https://api.telegram.org/bot"),
+            # The maximal seconds to wait before a failed request is 
+            # tried again, the first delay is the RequestTimer.
+            ("BackoffMaximum", 60),
+            # The failed requests in a row after which a method of the
+            # bot API isn't called for BreakerResetTimeout seconds.
+            ("BreakerThreshold", 5),
+            ("BreakerResetTimeout", 30),
+            # The bytes of the shared memory between the telegram 
+            # processes and the workers, for each direction.
+            ("RingBufferSize", 4194304),
+            # The input stops taking updates when a queue is filled 
+            # above HighWater (a share of its size) and goes on when all
+            # of them are below LowWater, the telegram servers keep the
+            # updates meanwhile.
+            ("HighWater", 0.8),
+            ("LowWater", 0.5),
+            # The maximal amount of messages waiting to be logged.
+            ("MessageQueueSize", 10000),
+            # The seconds the shutdown may take, what hasn't been 
+            # processed or sent until then is saved to the disk. A 
+            # process gets ShutdownGrace seconds more to finish what 
+            # it's doing, before it's killed.
+            ("ShutdownTimeout", 30),
+            ("ShutdownGrace", 5),
+        ))
+
+        self["Webhook"] = collections.OrderedDict((
+            # The address the webhook server listens to.
+            ("Host", "0.0.0.0"),
+            ("Port", 8443),
+            # The public https url of the webhook, if it's empty the 
+            # webhook has to be set up by hand.
+            ("Url", ""),
+            # The secret path the updates are posted to, if it's empty
+            # it will be derived from the telegram token.
+            ("SecretToken", ""),
+            ("MaxConnections", 40),
         ))
 
         self["MySQL"] = collections.OrderedDict((
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3.4
+# -*- coding: utf-8 -*-
+
+"""
+This module defines when the MainWorker starts and stops SubWorkers.
+
+The SubWorkers add the seconds they spent on messages and the amount of
+messages to a shared ``WorkerStatistics``. From the difference between
+two samples the autoscaler knows the processing time per message and
+how busy the workers are (the opposite of their idle ratio), together
+with the depth of the input queue it decides how many workers are
+needed.
+
+To not flap between two sizes, the pool grows as soon as it's needed
+(but not more often than the up cooldown allows), it only shrinks after
+the workers have been idle and the queue empty for a while and only by
+one worker at a time.
+"""
+
+# python standard library
+import math
+import ctypes
+import collections
+import multiprocessing
+
+import network.limiter
+
+
+class WorkerStatistics(object):
+    """
+    This class holds the counters the SubWorkers share with the
+    MainWorker.
+
+    .. code-block:: python\n
+        Start = time.monotonic()
+        ...  # process the message
+        Statistics.Record(time.monotonic() - Start)
+    """
+
+    def __init__(self):
+        # the busy seconds and the amount of messages of all workers
+        self._Counters = multiprocessing.Array(ctypes.c_double, 2)
+
+    def Record(self, Seconds, Messages = 1):
+        """
+        This method adds a processed message.
+
+        Variables:
+            Seconds                       ``float``
+                the time spent on the message
+
+            Messages                      ``integer``
+                the amount of messages processed in that time
+        """
+        with self._Counters.get_lock():
+            self._Counters[0] += Seconds
+            self._Counters[1] += Messages
+
+    def Get(self):
+        """
+        This method returns the busy seconds and the amount of messages
+        since the start.
+
+        Variables:
+            \-
+        """
+        with self._Counters.get_lock():
+            return self._Counters[0], self._Counters[1]
+
+Decision = collections.namedtuple("Decision", (
+    "Time",
+    "Workers",
+    "Target",
+    "Reason",
+    "Depth",
+    "ProcessingTime",
+    "Utilization",
+    ))
+"""
+A sample of the autoscaler and the amount of workers it wants.
+"""
+
+class Autoscaler(object):
+    """
+    This class decides on the amount of SubWorkers.
+
+    .. code-block:: python\n
+        Scaler = Autoscaler(1, 5)
+        while True:
+            Decision = Scaler.Sample(Workers, Queue.qsize(),
+                                     *Statistics.Get())
+            # start or stop Decision.Target - Workers workers
+    """
+
+    def __init__(self,
+                 MinWorkers = 1,
+                 MaxWorkers = 5,
+                 TargetUtilization = 0.7,
+                 LowUtilization = 0.3,
+                 TargetDelay = 1.0,
+                 UpCooldown = 5.0,
+                 DownCooldown = 60.0,
+                 History = 100,
+                 Clock = None,
+                 ):
+        """
+        Variables:
+            MinWorkers                    ``integer``
+                the workers that are always running
+
+            MaxWorkers                    ``integer``
+                the maximal amount of workers
+
+            TargetUtilization             ``float``
+                the share of the time the workers should be busy, more
+                than this lets the pool grow
+
+            LowUtilization                ``float``
+                the workers have to be busy less than this share of the
+                time, before the pool shrinks
+
+            TargetDelay                   ``float``
+                the maximal seconds the queued messages should wait
+                until they have all been processed
+
+            UpCooldown                    ``float``
+                the minimal seconds between two changes of the size,
+                before the pool grows
+
+            DownCooldown                  ``float``
+                the seconds the pool has to be idle, before it shrinks
+
+            History                       ``integer``
+                the amount of decisions kept for the metrics
+
+            Clock                         ``None or network.limiter.Clock``
+                the time source, None uses the real time
+        """
+        self.MinWorkers = max(1, int(MinWorkers))
+        self.MaxWorkers = max(self.MinWorkers, int(MaxWorkers))
+        self.TargetUtilization = TargetUtilization
+        self.LowUtilization = LowUtilization
+        self.TargetDelay = TargetDelay
+        self.UpCooldown = UpCooldown
+        self.DownCooldown = DownCooldown
+        self.Clock = Clock or network.limiter.Clock()
+
+        self.Decisions = collections.deque(maxlen = History)
+        self.ProcessingTime = None
+        self._LastSample = None
+        self._LastChange = self.Clock.Now()
+        self._IdleSince = None
+
+    def Sample(self, Workers, Depth, BusySeconds, Messages):
+        """
+        This method takes a sample of the load and returns the Decision
+        on it.
+
+        Variables:
+            Workers                       ``integer``
+                the amount of running workers
+
+            Depth                         ``integer``
+                the amount of messages waiting in the input queue
+
+            BusySeconds                   ``float``
+                the seconds all the workers spent on messages since the
+                start (see WorkerStatistics.Get)
+
+            Messages                      ``integer``
+                the messages all the workers processed since the start
+        """
+        Now = self.Clock.Now()
+        Utilization = 0.0
+        if self._LastSample is not None:
+            LastTime, LastBusy, LastMessages = self._LastSample
+            Elapsed = Now - LastTime
+            if Elapsed > 0 and Workers > 0:
+                Utilization = min(1.0, (BusySeconds - LastBusy) /
+                                       (Elapsed * Workers))
+            if Messages > LastMessages:
+                # a moving average, so a single slow message doesn't
+                # double the pool
+                Current = (BusySeconds - LastBusy) / (Messages - LastMessages)
+                if self.ProcessingTime is None:
+                    self.ProcessingTime = Current
+                else:
+                    self.ProcessingTime = (0.7 * self.ProcessingTime +
+                                           0.3 * Current)
+        self._LastSample = (Now, BusySeconds, Messages)
+
+        Target, Reason = self._Decide_(Now, Workers, Depth, Utilization)
+        if Target != Workers:
+            self._LastChange = Now
+            self._IdleSince = None
+        Result = Decision(Now, Workers, Target, Reason, Depth,
+                          self.ProcessingTime, Utilization)
+        self.Decisions.append(Result)
+        return Result
+
+    def _Decide_(self, Now, Workers, Depth, Utilization):
+        """
+        This method returns the amount of workers needed and the reason
+        for it.
+        """
+        if Workers < self.MinWorkers:
+            return self.MinWorkers, "below the minimum"
+        if Workers > self.MaxWorkers:
+            return self.MaxWorkers, "above the maximum"
+
+        # the workers needed to keep the utilization at its target
+        Needed = math.ceil(Workers * Utilization / self.TargetUtilization)
+        Reason = "utilization {:.0%}".format(Utilization)
+        # the workers needed to process the queue in the target delay
+        if Depth and self.ProcessingTime:
+            ForQueue = math.ceil(Depth * self.ProcessingTime /
+                                 self.TargetDelay)
+            if ForQueue > Needed:
+                Needed = ForQueue
+                Reason = "{} queued messages of {:.3f}s".format(
+                                                Depth, self.ProcessingTime)
+        elif Depth and Utilization == 0:
+            # nothing has been processed since the last sample, but
+            # there is work waiting
+            Needed = Workers + 1
+            Reason = "{} queued messages, none processed".format(Depth)
+
+        if Needed > Workers:
+            if Now - self._LastChange < self.UpCooldown:
+                return Workers, "{}, cooling down".format(Reason)
+            return min(Needed, self.MaxWorkers), Reason
+
+        if Depth == 0 and Utilization < self.LowUtilization:
+            if self._IdleSince is None:
+                self._IdleSince = Now
+            if (Workers > self.MinWorkers and
+                    Now - self._IdleSince >= self.DownCooldown and
+                    Now - self._LastChange >= self.DownCooldown):
+                # one at a time, the next one after another cooldown
+                return Workers - 1, "idle for {:.0f}s, {}".format(
+                                                Now - self._IdleSince, Reason)
+            return Workers, "{}, idle".format(Reason)
+
+        self._IdleSince = None
+        return Workers, Reason
+
+    def GetMetrics(self):
+        """
+        This method returns the last decision as dictionary, so that it
+        can be logged.
+
+        Variables:
+            \-
+        """
+        if not self.Decisions:
+            return {}
+        return self.Decisions[-1]._asdict()
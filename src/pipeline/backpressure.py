@@ -0,0 +1,128 @@
+#!/usr/bin/env python3.4
+# -*- coding: utf-8 -*-
+
+"""
+This module defines when the input process stops taking new updates.
+
+All the queues between the processes are bounded. The MainWorker
+samples how full they are, if one of them passes the high water mark
+the input process pauses (no getUpdates requests, the webhook answers
+with 503), the telegram servers keep the updates meanwhile. It resumes
+only after every queue is below the low water mark again, so that it
+doesn't flap around a single mark.
+"""
+
+import network.limiter
+
+
+def GetFill(Queue, MaxSize = None):
+    """
+    This function returns how full a queue is, between 0 and 1.
+
+    Variables:
+        Queue                             ``queue``
+            a pipeline.ring.RingQueue or a queue with a maxsize
+
+        MaxSize                           ``None or integer``
+            the maxsize of the queue, if it can't be read from it (like
+            from a manager proxy), None or 0 means unbounded
+    """
+    if hasattr(Queue, "GetUsage"):
+        return Queue.GetUsage() / Queue.Capacity
+    MaxSize = MaxSize or getattr(Queue, "maxsize", 0)
+    if not MaxSize:
+        return 0.0
+    return min(1.0, Queue.qsize() / MaxSize)
+
+class BackpressureGate(object):
+    """
+    This class switches between open and paused with two water marks.
+
+    .. code-block:: python\n
+        Gate = BackpressureGate(0.8, 0.5)
+        if Gate.Sample({"Input": GetFill(InputQueue)}):
+            PressureEvent.set()
+        else:
+            PressureEvent.clear()
+    """
+
+    def __init__(self, HighWater = 0.8, LowWater = 0.5, Clock = None):
+        """
+        Variables:
+            HighWater                     ``float``
+                the fill of a queue that pauses the input
+
+            LowWater                      ``float``
+                the fill all the queues have to be below, before the
+                input resumes
+
+            Clock                         ``None or network.limiter.Clock``
+                the time source, None uses the real time
+        """
+        self.HighWater = float(HighWater)
+        self.LowWater = min(float(LowWater), self.HighWater)
+        self.Clock = Clock or network.limiter.Clock()
+
+        self.Paused = False
+        self.PausedSince = None
+        self.Pauses = 0
+        self.PausedSeconds = 0.0
+        self.Fills = {}
+        self.Fullest = None
+        self.MaximalFill = 0.0
+
+    def Sample(self, Fills):
+        """
+        This method takes the fills of the queues and returns True if
+        the input has to be paused.
+
+        Variables:
+            Fills                         ``dictionary``
+                the name and the fill (see GetFill) of every queue
+        """
+        self.Fills = dict(Fills)
+        if self.Fills:
+            self.Fullest = max(self.Fills, key = self.Fills.get)
+            Fill = self.Fills[self.Fullest]
+        else:
+            self.Fullest, Fill = None, 0.0
+        self.MaximalFill = max(self.MaximalFill, Fill)
+
+        Now = self.Clock.Now()
+        if not self.Paused and Fill >= self.HighWater:
+            self.Paused = True
+            self.PausedSince = Now
+            self.Pauses += 1
+        elif self.Paused and Fill <= self.LowWater:
+            self.Paused = False
+            self.PausedSeconds += Now - self.PausedSince
+            self.PausedSince = None
+        return self.Paused
+
+    def GetPausedSeconds(self):
+        """
+        This method returns the seconds the input has been paused since
+        the start, including the current pause.
+
+        Variables:
+            \-
+        """
+        if self.PausedSince is None:
+            return self.PausedSeconds
+        return self.PausedSeconds + self.Clock.Now() - self.PausedSince
+
+    def GetMetrics(self):
+        """
+        This method returns the state of the gate as dictionary, so that
+        it can be logged.
+
+        Variables:
+            \-
+        """
+        return {"Paused": self.Paused,
+                "Pauses": self.Pauses,
+                "PausedSeconds": round(self.GetPausedSeconds(), 3),
+                "Fullest": self.Fullest,
+                "Fills": {Name: round(Fill, 3)
+                          for Name, Fill in self.Fills.items()},
+                "MaximalFill": round(self.MaximalFill, 3)}
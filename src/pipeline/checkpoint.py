@@ -0,0 +1,114 @@
+#!/usr/bin/env python3.4
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the checkpointing of the getUpdates offset.
+
+The offset is written to a temporary file that is synced and then
+renamed over the checkpoint. The rename is atomic, so the checkpoint is
+always either the old or the new offset, never a half written file.
+"""
+
+# python standard library
+import os
+import json
+import time
+
+
+class OffsetCheckpoint(object):
+    """
+    This class saves and loads the offset of the telegram updates.
+
+    The offset is only written if it has changed and the last write is
+    at least ``Interval`` seconds ago, a Save that is skipped because of
+    the interval is written by the next call of Save or Flush.
+
+    .. code-block:: python\n
+        Checkpoint = OffsetCheckpoint("SavedWorkload/ApiOffset.json")
+        Offset = Checkpoint.Load()
+        ...
+        Checkpoint.Save(Offset)
+        ...
+        Checkpoint.Flush()
+    """
+
+    def __init__(self, Path, Interval = 0.0):
+        """
+        Variables:
+            Path                          ``string``
+                the file of the checkpoint
+
+            Interval                      ``float``
+                the minimal seconds between two writes, 0 writes every
+                changed offset
+        """
+        self.Path = Path
+        self.Interval = Interval
+        # the offset on the disk and the one waiting to be written
+        self.SavedOffset = None
+        self.Offset = None
+        self.LastWrite = 0.0
+
+    def Load(self):
+        """
+        This method returns the saved offset or None if there is no
+        valid checkpoint.
+
+        Variables:
+            \-
+        """
+        try:
+            with open(self.Path, "r") as InputFile:
+                Offset = json.load(InputFile)["ApiOffset"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        self.SavedOffset = self.Offset = Offset
+        return Offset
+
+    def Save(self, Offset):
+        """
+        This method checkpoints the offset, if the interval allows it.
+
+        Variables:
+            Offset                        ``integer or None``
+                the offset of the next update to get
+        """
+        if Offset is not None:
+            self.Offset = Offset
+        if time.monotonic() - self.LastWrite >= self.Interval:
+            self.Flush()
+
+    def Flush(self):
+        """
+        This method writes the last offset if it hasn't been written
+        yet.
+
+        Variables:
+            \-
+        """
+        if self.Offset is None or self.Offset == self.SavedOffset:
+            return
+
+        Directory = os.path.dirname(os.path.abspath(self.Path))
+        if not os.path.isdir(Directory):
+            os.makedirs(Directory)
+
+        TemporaryPath = self.Path + ".tmp"
+        with open(TemporaryPath, "w") as OutputFile:
+            json.dump({"ApiOffset": self.Offset}, OutputFile)
+            OutputFile.flush()
+            os.fsync(OutputFile.fileno())
+        os.replace(TemporaryPath, self.Path)
+
+        # The rename itself is only durable after the directory has
+        # been synced, that is not possible on windows.
+        if hasattr(os, "O_DIRECTORY"):
+            DirectoryDescriptor = os.open(Directory, os.O_RDONLY |
+                                          os.O_DIRECTORY)
+            try:
+                os.fsync(DirectoryDescriptor)
+            finally:
+                os.close(DirectoryDescriptor)
+
+        self.SavedOffset = self.Offset
+        self.LastWrite = time.monotonic()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3.4
+# -*- coding: utf-8 -*-
+
+"""
+This module defines how the updates and the messages are turned into
+bytes on their way between the processes.
+
+Pickle writes the name of the class and of every attribute into the
+record of a ``messages.message.MessageToBeSend``, and every key of the
+nested dictionaries of an update as a string. The records of this
+codec start with a tag byte:
+
+    * ``M`` a message, its fields in a fixed order (a schema), so that
+      neither the class nor the attribute names are written
+    * ``V`` an update (or any other value of dictionaries, lists,
+      tuples and plain types), the well known keys of the bot API are
+      written as small integers
+    * ``P`` everything else, pickled
+
+The body of the first two is written by ``marshal``, which is as fast
+as pickle for these types. The key table is only used by the records of
+the queues, which don't outlive the processes, so it may change between
+the versions. Nothing on the disk may be written with it.
+
+Run ``python3 tests/benchmark_codec.py`` to compare it with pickle.
+"""
+
+# python standard library
+import pickle
+import marshal
+
+import messages.message
+
+KEYS = (
+        # Update
+        "update_id", "message", "edited_message", "channel_post",
+        "edited_channel_post", "inline_query", "chosen_inline_result",
+        "callback_query",
+        # Message
+        "message_id", "from", "date", "chat", "forward_from",
+        "forward_from_chat", "forward_date", "reply_to_message",
+        "edit_date", "text", "entities", "caption", "new_chat_member",
+        "left_chat_member", "new_chat_title", "pinned_message",
+        # User and Chat
+        "id", "is_bot", "first_name", "last_name", "username",
+        "language_code", "type", "title", "all_members_are_administrators",
+        # MessageEntity
+        "offset", "length", "url", "user",
+        # CallbackQuery and InlineQuery
+        "inline_message_id", "chat_instance", "data", "query",
+        # ReplyMarkup
+        "keyboard", "resize_keyboard", "one_time_keyboard", "selective",
+        "hide_keyboard", "force_reply", "inline_keyboard", "callback_data",
+        "switch_inline_query", "switch_inline_query_current_chat",
+        )
+"""
+The keys written as their index.
+"""
+
+_INDEX = {Key: Index for Index, Key in enumerate(KEYS)}
+
+_MESSAGE = b"M"
+_VALUE = b"V"
+_PICKLE = b"P"
+
+# the attributes of a new messages.message.MessageToBeSend
+_MESSAGE_FIELDS = 8
+
+
+class _Unsupported(Exception):
+    """
+    A value that has to be pickled.
+    """
+
+def _Pack_(Value, Index = _INDEX):
+    """
+    This function replaces the known keys of the dictionaries by their
+    index. The lists and tuples are walked as well.
+    """
+    Type = type(Value)
+    if Type is dict:
+        Packed = {}
+        for Key, Item in Value.items():
+            if type(Key) is not str:
+                # it couldn't be told apart from an index
+                raise _Unsupported()
+            Type = type(Item)
+            if Type is dict or Type is list or Type is tuple:
+                Item = _Pack_(Item)
+            Packed[Index.get(Key, Key)] = Item
+        return Packed
+    elif Type is list:
+        return [_Pack_(Item) for Item in Value]
+    elif Type is tuple:
+        return tuple(_Pack_(Item) for Item in Value)
+    return Value
+
+def _Unpack_(Value, Keys = KEYS):
+    """
+    This function is the reverse of _Pack_.
+    """
+    Type = type(Value)
+    if Type is dict:
+        Unpacked = {}
+        for Key, Item in Value.items():
+            Type = type(Item)
+            if Type is dict or Type is list or Type is tuple:
+                Item = _Unpack_(Item)
+            Unpacked[Keys[Key] if type(Key) is int else Key] = Item
+        return Unpacked
+    elif Type is list:
+        return [_Unpack_(Item) for Item in Value]
+    elif Type is tuple:
+        return tuple(_Unpack_(Item) for Item in Value)
+    return Value
+
+def Dumps(Item):
+    """
+    This function turns an item into bytes, it's the Dumps of a
+    ``pipeline.ring.RingQueue``.
+
+    Variables:
+        Item                              ``object``
+            an update, a message or any item pickle can handle
+    """
+    try:
+        # a message with additional attributes is pickled
+        if (type(Item) is messages.message.MessageToBeSend and
+                len(Item.__dict__) == _MESSAGE_FIELDS):
+            return _MESSAGE + marshal.dumps((Item.ToChatId,
+                                             Item.Text,
+                                             Item.ParseMode,
+                                             Item.DisableWebPagePreview,
+                                             Item.DisableNotification,
+                                             Item.ReplyToMessageId,
+                                             _Pack_(Item.ReplyMarkup),
+                                             Item.Lane))
+        return _VALUE + marshal.dumps(_Pack_(Item))
+    except (_Unsupported, ValueError):
+        # marshal raises a ValueError for the types it doesn't know
+        return _PICKLE + pickle.dumps(Item, pickle.HIGHEST_PROTOCOL)
+
+def Loads(Data):
+    """
+    This function turns the bytes of Dumps back into the item, it's the
+    Loads of a ``pipeline.ring.RingQueue``.
+
+    Variables:
+        Data                              ``bytes``
+            a record written by Dumps
+    """
+    # the body isn't copied
+    Tag, Body = Data[:1], memoryview(Data)[1:]
+    if Tag == _VALUE:
+        return _Unpack_(marshal.loads(Body))
+    elif Tag == _MESSAGE:
+        Fields = marshal.loads(Body)
+        Message = messages.message.MessageToBeSend(*Fields[:6],
+                                                   Lane = Fields[7])
+        Message.ReplyMarkup = _Unpack_(Fields[6])
+        return Message
+    elif Tag == _PICKLE:
+        return pickle.loads(Body)
+    raise ValueError("unknown record {!r}".format(Tag))
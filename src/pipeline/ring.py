@@ -0,0 +1,314 @@
+#!/usr/bin/env python3.4
+# -*- coding: utf-8 -*-
+
+"""
+This module defines a queue between processes on top of a ring buffer
+in shared memory.
+
+The queues of a ``multiprocessing.managers.SyncManager`` are proxies,
+every put and get is a round trip to the manager process. The records
+of a RingQueue are written directly into memory shared by all the
+processes, each one is a length prefix followed by the pickled item.
+The pickling is done outside of the lock, the lock itself (a futex on
+linux) is only held to copy the bytes and move the positions.
+
+A process killed while it holds the lock would block all the others
+forever. The lock is therefore only waited for LockTimeout seconds,
+after that the ring is marked as broken in shared memory and every
+further call raises a RingBrokenError at once.
+"""
+
+# python standard library
+import time
+import queue
+import pickle
+import struct
+import ctypes
+import contextlib
+import multiprocessing
+
+
+def _Dumps(Item):
+    return pickle.dumps(Item, pickle.HIGHEST_PROTOCOL)
+
+class RingBrokenError(RuntimeError):
+    """
+    This error is raised if the lock of a ring couldn't be taken in
+    time, a process has most likely died while holding it.
+    """
+
+class RingQueue(object):
+    """
+    This class is a multi producer, multi consumer queue between
+    processes, it has the interface of ``queue.Queue``.
+
+    It has to be created before the processes using it are started and
+    handed to them as an argument.
+
+    .. code-block:: python\n
+        Queue = RingQueue(1 << 22)
+        Worker = multiprocessing.Process(target = Work, args = (Queue,))
+        Worker.start()
+        Queue.put(Update)
+    """
+
+    LENGTH = struct.Struct("<I")
+    """
+    The length prefix of every record.
+    """
+
+    # the indices of the positions in the shared header, the amount of
+    # the waiting processes and the broken flag
+    _HEAD = 0
+    _TAIL = 1
+    _COUNT = 2
+    _GETTERS = 3
+    _PUTTERS = 4
+    _BROKEN = 5
+
+    def __init__(self,
+                 Capacity = 1 << 22,
+                 Dumps = None,
+                 Loads = None,
+                 LockTimeout = 5.0):
+        """
+        Variables:
+            Capacity                      ``integer``
+                the size of the ring buffer in bytes, a single item
+                can't be bigger
+
+            Dumps                         ``None or function``
+                turns an item into bytes, None uses pickle
+
+            Loads                         ``None or function``
+                turns the bytes back into the item, None uses pickle
+
+            LockTimeout                   ``float``
+                the maximal seconds to wait for the lock, before the
+                ring is considered broken
+        """
+        self.Capacity = int(Capacity)
+        self.Dumps = Dumps or _Dumps
+        self.Loads = Loads or pickle.loads
+
+        # the bytes read and written since the start, the position in
+        # the buffer is the modulo of them
+        self.LockTimeout = float(LockTimeout)
+        self._Header = multiprocessing.RawArray(ctypes.c_uint64, 6)
+        self._Buffer = multiprocessing.RawArray(ctypes.c_ubyte, self.Capacity)
+        self._Lock = multiprocessing.Lock()
+        # the waiting processes are woken up by these, unlike the
+        # conditions of multiprocessing they never take the lock back
+        # without a timeout
+        self._NotEmpty = multiprocessing.Semaphore(0)
+        self._NotFull = multiprocessing.Semaphore(0)
+        self._View = None
+
+    def __getstate__(self):
+        State = self.__dict__.copy()
+        # a memoryview can't be pickled, every process makes its own
+        State["_View"] = None
+        return State
+
+    def _GetView_(self):
+        if self._View is None:
+            self._View = memoryview(self._Buffer).cast("B")
+        return self._View
+
+    def _Write_(self, Position, Data):
+        """
+        This method copies the data into the buffer, wrapping around at
+        its end.
+        """
+        View = self._GetView_()
+        Start = Position % self.Capacity
+        First = min(len(Data), self.Capacity - Start)
+        View[Start:Start + First] = Data[:First]
+        if First < len(Data):
+            View[:len(Data) - First] = Data[First:]
+
+    def _Read_(self, Position, Length):
+        """
+        This method copies Length bytes out of the buffer, wrapping
+        around at its end.
+        """
+        View = self._GetView_()
+        Start = Position % self.Capacity
+        First = min(Length, self.Capacity - Start)
+        if First == Length:
+            return View[Start:Start + Length].tobytes()
+        return View[Start:].tobytes() + View[:Length - First].tobytes()
+
+    def IsBroken(self):
+        """
+        This method returns True if a process couldn't take the lock in
+        time.
+
+        Variables:
+            \-
+        """
+        return self._Header[self._BROKEN] != 0
+
+    def _Acquire_(self):
+        """
+        This method takes the lock, it raises a RingBrokenError if that
+        isn't possible within LockTimeout seconds.
+        """
+        if self._Header[self._BROKEN]:
+            raise RingBrokenError("The ring buffer is broken.")
+        if not self._Lock.acquire(timeout = self.LockTimeout):
+            self._Header[self._BROKEN] = 1
+            raise RingBrokenError("The lock of the ring buffer hasn't been "
+                                  "released for {} seconds.".format(
+                                                        self.LockTimeout))
+
+    @contextlib.contextmanager
+    def _Locked_(self):
+        """
+        This method holds the lock for the with block.
+        """
+        self._Acquire_()
+        try:
+            yield
+        except RingBrokenError:
+            # the lock couldn't be taken back after a wait
+            raise
+        except BaseException:
+            self._Lock.release()
+            raise
+        else:
+            self._Lock.release()
+
+    def _Wait_(self, Semaphore, Waiters, Predicate, Block, Timeout, Error):
+        """
+        This method waits with the lock held until Predicate returns
+        True, like ``queue.Queue`` it raises Error if it doesn't. The
+        lock is released while waiting.
+        """
+        if Predicate():
+            return
+        if not Block:
+            raise Error
+        if Timeout is not None and Timeout < 0:
+            raise ValueError("'timeout' must be a non-negative number")
+        Deadline = None if Timeout is None else time.monotonic() + Timeout
+        Header = self._Header
+        while not Predicate():
+            Remaining = self.LockTimeout
+            if Deadline is not None:
+                Remaining = min(Remaining, Deadline - time.monotonic())
+                if Remaining <= 0:
+                    raise Error
+            Header[Waiters] += 1
+            self._Lock.release()
+            try:
+                # a left over wake up only leads to another check
+                Semaphore.acquire(timeout = Remaining)
+            finally:
+                self._Acquire_()
+                Header[Waiters] -= 1
+
+    def _Notify_(self, Semaphore, Waiters, All):
+        """
+        This method wakes up one or all the processes waiting, it has to
+        be called with the lock held.
+        """
+        for Number in range(self._Header[Waiters] if All else
+                            min(1, self._Header[Waiters])):
+            Semaphore.release()
+
+    def put(self, item, block = True, timeout = None):
+        """
+        This method adds an item at the end of the queue.
+
+        Variables:
+            item                          ``object``
+                the item, it has to be serializable by Dumps
+
+            block                         ``boolean``
+                if the method waits for free space
+
+            timeout                       ``None or float``
+                the maximal seconds to wait, None waits forever
+        """
+        Data = self.Dumps(item)
+        Record = self.LENGTH.pack(len(Data)) + Data
+        if len(Record) > self.Capacity:
+            raise ValueError("The item needs {} bytes, the ring buffer has "
+                             "only {}".format(len(Record), self.Capacity))
+        Header = self._Header
+        with self._Locked_():
+            self._Wait_(self._NotFull, self._PUTTERS,
+                        lambda: (self.Capacity - Header[self._TAIL] +
+                                 Header[self._HEAD]) >= len(Record),
+                        block, timeout, queue.Full)
+            self._Write_(Header[self._TAIL], Record)
+            Header[self._TAIL] += len(Record)
+            Header[self._COUNT] += 1
+            self._Notify_(self._NotEmpty, self._GETTERS, False)
+
+    def get(self, block = True, timeout = None):
+        """
+        This method removes and returns the first item of the queue.
+
+        Variables:
+            block                         ``boolean``
+                if the method waits for an item
+
+            timeout                       ``None or float``
+                the maximal seconds to wait, None waits forever
+        """
+        Header = self._Header
+        with self._Locked_():
+            self._Wait_(self._NotEmpty, self._GETTERS,
+                        lambda: Header[self._COUNT] > 0,
+                        block, timeout, queue.Empty)
+            Head = Header[self._HEAD]
+            Length, = self.LENGTH.unpack(self._Read_(Head, self.LENGTH.size))
+            Data = self._Read_(Head + self.LENGTH.size, Length)
+            Header[self._HEAD] = Head + self.LENGTH.size + Length
+            Header[self._COUNT] -= 1
+            # several small items could fit into the freed space
+            self._Notify_(self._NotFull, self._PUTTERS, True)
+        return self.Loads(Data)
+
+    def put_nowait(self, item):
+        return self.put(item, False)
+
+    def get_nowait(self):
+        return self.get(False)
+
+    def qsize(self):
+        """
+        This method returns the amount of items in the queue.
+
+        Variables:
+            \-
+        """
+        return self._Header[self._COUNT]
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def full(self):
+        """
+        This method returns True if not even an empty item fits into
+        the queue anymore.
+
+        Variables:
+            \-
+        """
+        return (self.Capacity - self._Header[self._TAIL] +
+                self._Header[self._HEAD]) <= self.LENGTH.size
+
+    def GetUsage(self):
+        """
+        This method returns the amount of bytes used in the ring buffer.
+        It's read without the lock like qsize, so that a broken ring
+        can still be sampled.
+
+        Variables:
+            \-
+        """
+        Head = self._Header[self._HEAD]
+        return max(0, self._Header[self._TAIL] - Head)
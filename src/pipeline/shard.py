@@ -0,0 +1,474 @@
+#!/usr/bin/env python3.4
+# -*- coding: utf-8 -*-
+
+"""
+This module defines how the updates are spread over the SubWorkers.
+
+Every worker has its own queue. The updates of a chat always go to the
+same worker, chosen by a consistent hash of the chat id, so the updates
+of a chat are processed one after the other and in order, while the
+chats are processed in parallel.
+
+If the pool changes, the consistent hash moves only the chats of the
+added or removed worker. A moved chat with updates still waiting at its
+old worker is parked, its next updates are held back until the old
+worker has finished the earlier ones, so that the order of the chat is
+kept across the move without any lock on the database.
+
+The dispatcher only holds its lock to choose the worker of an update,
+the update is put into the queue of the worker after that. A full queue
+of a slow worker holds back the dispatcher, but not the main loop that
+samples the depths and adds or removes workers.
+"""
+
+# python standard library
+import time
+import queue
+import bisect
+import hashlib
+import threading
+import collections
+
+from . import ring
+
+
+class HashRing(object):
+    """
+    This class is a consistent hash ring.
+
+    Every node is placed on the ring several times (the replicas), a
+    key belongs to the first node after its hash.
+    """
+
+    def __init__(self, Replicas = 64):
+        """
+        Variables:
+            Replicas                      ``integer``
+                the amount of points of every node on the ring
+        """
+        self.Replicas = Replicas
+        self._Points = []
+        self._Nodes = {}
+
+    @staticmethod
+    def _Hash_(Key):
+        return int.from_bytes(
+                    hashlib.md5(str(Key).encode("utf-8")).digest()[:8], "big")
+
+    def __len__(self):
+        return len(set(self._Nodes.values()))
+
+    def __contains__(self, Node):
+        return Node in self._Nodes.values()
+
+    def Add(self, Node):
+        """
+        This method adds a node to the ring.
+
+        Variables:
+            Node                          ``string``
+                the name of the node
+        """
+        for Replica in range(self.Replicas):
+            Point = self._Hash_("{}#{}".format(Node, Replica))
+            if Point not in self._Nodes:
+                bisect.insort(self._Points, Point)
+            self._Nodes[Point] = Node
+
+    def Remove(self, Node):
+        """
+        This method removes a node from the ring.
+
+        Variables:
+            Node                          ``string``
+                the name of the node
+        """
+        for Replica in range(self.Replicas):
+            Point = self._Hash_("{}#{}".format(Node, Replica))
+            if self._Nodes.get(Point) == Node:
+                del self._Nodes[Point]
+                self._Points.pop(bisect.bisect_left(self._Points, Point))
+
+    def Get(self, Key):
+        """
+        This method returns the node of the key, None if the ring is
+        empty.
+
+        Variables:
+            Key                           ``object``
+                the key, its string is hashed
+        """
+        if not self._Points:
+            return None
+        Index = bisect.bisect(self._Points, self._Hash_(Key))
+        return self._Nodes[self._Points[Index % len(self._Points)]]
+
+def GetChatId(Update):
+    """
+    This function returns the id of the chat of an update, whatever kind
+    of update it is. An update without a chat (an inline query) has the
+    id of its sender, an update without either one its update id.
+
+    Variables:
+        Update                            ``dictionary``
+            the update from the telegram servers
+    """
+    if not isinstance(Update, dict):
+        return None
+    for Kind, Value in Update.items():
+        if not isinstance(Value, dict):
+            continue
+        # the answer to a button belongs to the chat of its message
+        Message = Value.get("message")
+        for Item in (Value, Message if isinstance(Message, dict) else {}):
+            Chat = Item.get("chat")
+            if isinstance(Chat, dict) and "id" in Chat:
+                return Chat["id"]
+        Sender = Value.get("from")
+        if isinstance(Sender, dict) and "id" in Sender:
+            return Sender["id"]
+    return Update.get("update_id")
+
+class ShardDispatcher(object):
+    """
+    This class moves the updates from the input queue to the queues of
+    the workers.
+
+    Every update is put into the queue of its worker as a tuple of a
+    sequence number and the update. After a worker has processed it, it
+    sets its progress (a shared integer) to the sequence number.
+
+    .. code-block:: python\n
+        Dispatcher = ShardDispatcher(InputQueue)
+        Dispatcher.AddShard("Worker-1", WorkerQueue, Progress)
+        threading.Thread(target = Dispatcher.Run,
+                         args = (StopEvent,)).start()
+    """
+
+    MIN_OWNERS = 4096
+    """
+    The amount of owners that are kept without looking for done ones.
+    """
+
+    def __init__(self,
+                 InputQueue,
+                 GetKey = GetChatId,
+                 Replicas = 64,
+                 PollTimeout = 0.1):
+        """
+        Variables:
+            InputQueue                    ``queue``
+                the queue the updates arrive in
+
+            GetKey                        ``function``
+                returns the key of an update, the updates with the same
+                key are processed in order
+
+            Replicas                      ``integer``
+                the points of every worker on the hash ring
+
+            PollTimeout                   ``float``
+                the maximal seconds to wait for an update at once
+        """
+        self.InputQueue = InputQueue
+        self.GetKey = GetKey
+        self.PollTimeout = PollTimeout
+
+        self.Ring = HashRing(Replicas)
+        # the queue, the progress and the last sequence of every worker
+        self.Shards = {}
+        # the worker that got the last update of a key, its progress and
+        # the sequence of that update
+        self.Owners = {}
+        # the amount of owners that makes _ForgetDoneOwners_ look for
+        # the done ones
+        self._OwnersLimit = self.MIN_OWNERS
+        # the updates held back until the old worker of their key is done
+        self.Parked = collections.OrderedDict()
+        # the updates of every worker that are being put into its queue
+        # outside of the lock
+        self._Sending = collections.Counter()
+        self._Lock = threading.RLock()
+
+    def AddShard(self, Name, Queue, Progress):
+        """
+        This method adds a worker, from now on it gets the updates of
+        its part of the keys.
+
+        Variables:
+            Name                          ``string``
+                the name of the worker
+
+            Queue                         ``queue``
+                the queue of the worker
+
+            Progress                      ``multiprocessing.Value``
+                the sequence number of the last update the worker has
+                processed
+        """
+        with self._Lock:
+            self.Shards[Name] = {"Queue": Queue,
+                                 "Progress": Progress,
+                                 "Sequence": Progress.value}
+            self.Ring.Add(Name)
+
+    def RemoveShard(self, Name):
+        """
+        This method removes a worker, it doesn't get any update after
+        this method returned. The updates already in its queue have to
+        be processed by it nevertheless.
+
+        Variables:
+            Name                          ``string``
+                the name of the worker
+        """
+        with self._Lock:
+            self.Ring.Remove(Name)
+            self.Shards.pop(Name, None)
+
+    def Recover(self, Name, Queue):
+        """
+        This method takes the updates out of the queue of a removed
+        worker that has died, they are sent to the other workers in
+        their order. It returns the amount of recovered updates.
+
+        Variables:
+            Name                          ``string``
+                the name of the worker, it has to be removed already
+
+            Queue                         ``queue``
+                the queue of the worker
+        """
+        # an update being put into the queue is either in it afterwards
+        # or parked again
+        while self._Sending.get(Name):
+            time.sleep(0.01)
+        with self._Lock:
+            Leftovers = []
+            try:
+                while True:
+                    Leftovers.append(Queue.get_nowait()[1])
+            except (queue.Empty, ring.RingBrokenError):
+                pass
+            # the worker won't finish the updates it was given
+            for Key, Owner in list(self.Owners.items()):
+                if Owner[0] == Name:
+                    del self.Owners[Key]
+            # they are older than the parked updates of their key
+            for Update in reversed(Leftovers):
+                Key = self.GetKey(Update)
+                if Key not in self.Parked:
+                    self.Parked[Key] = collections.deque()
+                self.Parked[Key].appendleft(Update)
+            return len(Leftovers)
+
+    @staticmethod
+    def _IsDone_(Owner):
+        Name, Progress, Sequence = Owner
+        return Progress.value >= Sequence
+
+    def _MaySend_(self, Key, Name):
+        """
+        This method returns True if an update of the key can be sent to
+        the worker, the earlier ones are either done or at the same
+        worker. It has to be called with the lock.
+        """
+        Owner = self.Owners.get(Key)
+        return Owner is None or Owner[0] == Name or self._IsDone_(Owner)
+
+    def _Assign_(self, Key, Name):
+        """
+        This method gives the next sequence number of the worker to an
+        update of the key. It has to be called with the lock, the update
+        is put with _Put_ after the lock has been released.
+        """
+        Shard = self.Shards[Name]
+        Shard["Sequence"] += 1
+        Previous = self.Owners.get(Key)
+        self.Owners[Key] = (Name, Shard["Progress"], Shard["Sequence"])
+        self._Sending[Name] += 1
+        return Key, Name, Shard["Queue"], Shard["Sequence"], Previous
+
+    def _Put_(self, Assignment, Update):
+        """
+        This method puts the update into the queue of its worker. It
+        waits for free space as long as the worker is there, if it's
+        removed meanwhile the update is parked again and False is
+        returned.
+        """
+        Key, Name, Queue, Sequence, Previous = Assignment
+        try:
+            while True:
+                try:
+                    Queue.put((Sequence, Update), timeout = self.PollTimeout)
+                    return True
+                except queue.Full:
+                    pass
+                except ring.RingBrokenError:
+                    # the worker is dead and will be removed
+                    time.sleep(self.PollTimeout)
+                with self._Lock:
+                    Shard = self.Shards.get(Name)
+                    if Shard is not None and Shard["Queue"] is Queue:
+                        continue
+                    # the update goes back in front of its key
+                    if Previous is None:
+                        self.Owners.pop(Key, None)
+                    else:
+                        self.Owners[Key] = Previous
+                    if Key not in self.Parked:
+                        self.Parked[Key] = collections.deque()
+                    self.Parked[Key].appendleft(Update)
+                    return False
+        finally:
+            with self._Lock:
+                self._Sending[Name] -= 1
+                if not self._Sending[Name]:
+                    del self._Sending[Name]
+
+    def Dispatch(self, Update):
+        """
+        This method hands the update to the worker of its key, or parks
+        it if the earlier updates of the key are still at another
+        worker. It returns False if there is no worker at all.
+
+        Variables:
+            Update                        ``dictionary``
+                the update from the telegram servers
+        """
+        Key = self.GetKey(Update)
+        with self._Lock:
+            Name = self.Ring.Get(Key)
+            if Name is None:
+                return False
+            if Key in self.Parked:
+                self.Parked[Key].append(Update)
+                return True
+            if not self._MaySend_(Key, Name):
+                self.Parked[Key] = collections.deque([Update])
+                return True
+            Assignment = self._Assign_(Key, Name)
+        self._Put_(Assignment, Update)
+        return True
+
+    def FlushParked(self):
+        """
+        This method sends the parked updates whose old worker is done.
+
+        Variables:
+            \-
+        """
+        with self._Lock:
+            Keys = list(self.Parked.keys())
+        for Key in Keys:
+            while True:
+                with self._Lock:
+                    Parked = self.Parked.get(Key)
+                    if not Parked:
+                        break
+                    Name = self.Ring.Get(Key)
+                    if Name is None:
+                        return
+                    if not self._MaySend_(Key, Name):
+                        break
+                    Update = Parked.popleft()
+                    if not Parked:
+                        del self.Parked[Key]
+                    Assignment = self._Assign_(Key, Name)
+                if not self._Put_(Assignment, Update):
+                    break
+
+    def TakeParked(self):
+        """
+        This method removes and returns all the parked updates, in their
+        order per key. It's used at the shutdown, after the dispatcher
+        has stopped.
+
+        Variables:
+            \-
+        """
+        with self._Lock:
+            Updates = [Update for Parked in self.Parked.values()
+                       for Update in Parked]
+            self.Parked.clear()
+            return Updates
+
+    def _ForgetDoneOwners_(self):
+        """
+        This method removes the keys whose updates have all been
+        processed, so that the owners don't pile up.
+
+        The owners are only walked through when their amount has doubled
+        since the last time, so that a dispatched update costs O(1) on
+        average, even if most of the keys are still in progress.
+        """
+        if len(self.Owners) < self._OwnersLimit:
+            return
+        with self._Lock:
+            for Key, Owner in list(self.Owners.items()):
+                if Key not in self.Parked and self._IsDone_(Owner):
+                    del self.Owners[Key]
+            self._OwnersLimit = max(self.MIN_OWNERS, 2 * len(self.Owners))
+
+    def GetDepth(self):
+        """
+        This method returns the amount of updates not processed yet.
+
+        Variables:
+            \-
+        """
+        with self._Lock:
+            return (self.InputQueue.qsize() +
+                    sum(Shard["Queue"].qsize()
+                        for Shard in self.Shards.values()) +
+                    sum(len(Updates) for Updates in self.Parked.values()) +
+                    sum(self._Sending.values()))
+
+    def IsIdle(self):
+        """
+        This method returns True if every update has been handed to a
+        worker.
+
+        Variables:
+            \-
+        """
+        with self._Lock:
+            return (self.InputQueue.empty() and not self.Parked and
+                    not self._Sending)
+
+    def RunOnce(self, Timeout = None):
+        """
+        This method dispatches the next update of the input queue, if
+        one arrives in time.
+
+        Variables:
+            Timeout                       ``None or float``
+                the maximal seconds to wait, None uses the PollTimeout
+        """
+        self.FlushParked()
+        if not self.Shards:
+            # without a worker the updates stay in the input queue
+            return False
+        try:
+            Update = self.InputQueue.get(timeout = Timeout if Timeout
+                                         is not None else self.PollTimeout)
+        except queue.Empty:
+            return False
+        if not self.Dispatch(Update):
+            # the last worker was removed meanwhile
+            self.InputQueue.put(Update)
+            return False
+        self._ForgetDoneOwners_()
+        return True
+
+    def Run(self, StopEvent):
+        """
+        This method dispatches the updates until the StopEvent is set.
+
+        Variables:
+            StopEvent                     ``threading.Event``
+                stops the dispatcher
+        """
+        while not StopEvent.is_set():
+            if not self.RunOnce() and not self.Shards:
+                StopEvent.wait(self.PollTimeout)
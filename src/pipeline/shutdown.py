@@ -0,0 +1,276 @@
+#!/usr/bin/env python3.4
+# -*- coding: utf-8 -*-
+
+"""
+This module defines how the bot shuts down in a bounded time.
+
+The stages of the pipeline (input, dispatcher, workers, output) are
+drained one after the other, but all of them share a single deadline.
+The processes of a stage are told to stop at the same time and are
+waited for in parallel. What hasn't been processed at the deadline is
+spilled to the disk instead of being waited for:
+
+    * the outgoing messages are already in the spool of the output
+      process, it only stops sending them
+    * the updates still queued for the workers are written to a spool
+      per process by ``Spill`` and put back into the input queue by
+      ``Restore`` on the next start
+"""
+
+# python standard library
+import os
+import time
+import pickle
+
+import network.limiter
+from . import spool
+
+
+class ShutdownCoordinator(object):
+    """
+    This class waits for the stages of the shutdown until a common
+    deadline and reports their progress.
+
+    .. code-block:: python\n
+        Coordinator = ShutdownCoordinator(30, Report = Logging.info)
+        InputShutdownEvent.set()
+        Coordinator.WaitFor("Input", InputDoneEvent.is_set)
+        for Worker in Workers:
+            Worker.ShutdownEvent.set()
+        for Worker in Coordinator.Join("Workers", Workers):
+            Worker.terminate()
+    """
+
+    def __init__(self,
+                 Timeout = 30.0,
+                 Clock = None,
+                 Report = None,
+                 ReportInterval = 1.0):
+        """
+        Variables:
+            Timeout                       ``float``
+                the seconds all the stages together may take
+
+            Clock                         ``None or network.limiter.Clock``
+                the time source, None uses the real time
+
+            Report                        ``None or function``
+                is called with a dictionary about the progress of the
+                current stage, at most every ReportInterval seconds and
+                at the end of every stage
+
+            ReportInterval                ``float``
+                the minimal seconds between two reports of a stage
+        """
+        self.Timeout = float(Timeout)
+        self.Clock = Clock or network.limiter.Clock()
+        self.Report = Report
+        self.ReportInterval = ReportInterval
+
+        self.Start = self.Clock.Now()
+        self.Deadline = self.Start + self.Timeout
+        self.Stages = []
+
+    def GetRemaining(self):
+        """
+        This method returns the seconds left until the deadline.
+
+        Variables:
+            \-
+        """
+        return max(0.0, self.Deadline - self.Clock.Now())
+
+    def GetWallDeadline(self):
+        """
+        This method returns the deadline as ``time.time`` value, so that
+        it can be shared with the other processes.
+
+        Variables:
+            \-
+        """
+        return time.time() + self.GetRemaining()
+
+    def IsOver(self):
+        """
+        This method returns True if the deadline has passed.
+
+        Variables:
+            \-
+        """
+        return self.Clock.Now() >= self.Deadline
+
+    def _Report_(self, Stage, Started, Progress, Done):
+        Result = {"Stage": Stage,
+                  "Seconds": round(self.Clock.Now() - Started, 3),
+                  "Remaining": round(self.GetRemaining(), 3),
+                  "Left": Progress,
+                  "Done": Done}
+        if self.Report is not None:
+            self.Report(Result)
+        return Result
+
+    def WaitFor(self,
+                Stage,
+                IsDone,
+                GetProgress = None,
+                Grace = 0.0,
+                Timeout = None,
+                PollInterval = 0.05):
+        """
+        This method waits until IsDone returns True or the deadline (plus
+        the grace) has passed. It returns True if the stage is done.
+
+        Variables:
+            Stage                         ``string``
+                the name of the stage, for the reports
+
+            IsDone                        ``function``
+                returns True once the stage is drained
+
+            GetProgress                   ``None or function``
+                returns what is left of the stage, for the reports
+
+            Grace                         ``float``
+                the seconds the stage may take after the deadline, for
+                example to finish a request in flight
+
+            Timeout                       ``None or float``
+                the seconds the stage may take at most, so that the
+                next stages have some time left
+
+            PollInterval                  ``float``
+                the seconds between two checks of IsDone
+        """
+        Started = self.Clock.Now()
+        LastReport = Started
+        Deadline = self.Deadline + Grace
+        if Timeout is not None:
+            Deadline = min(Deadline, Started + Timeout)
+        Done = IsDone()
+        while not Done and self.Clock.Now() < Deadline:
+            if (GetProgress is not None and
+                    self.Clock.Now() - LastReport >= self.ReportInterval):
+                LastReport = self.Clock.Now()
+                self._Report_(Stage, Started, GetProgress(), False)
+            self.Clock.Sleep(min(PollInterval,
+                                 max(0.0, Deadline - self.Clock.Now())))
+            Done = IsDone()
+        self.Stages.append(self._Report_(
+                                Stage, Started,
+                                GetProgress() if GetProgress else None, Done))
+        return Done
+
+    def Join(self,
+             Stage,
+             Processes,
+             GetProgress = None,
+             Grace = 0.0,
+             Timeout = None):
+        """
+        This method waits for all the processes at the same time and
+        returns the ones still alive at the deadline (plus the grace).
+
+        Variables:
+            Stage                         ``string``
+                the name of the stage, for the reports
+
+            Processes                     ``list``
+                the processes that have been told to stop
+
+            GetProgress                   ``None or function``
+                returns what is left of the stage, None reports the
+                amount of living processes
+
+            Grace                         ``float``
+                the seconds the processes may take after the deadline
+
+            Timeout                       ``None or float``
+                the seconds the stage may take at most
+        """
+        Processes = list(Processes)
+        if GetProgress is None:
+            GetProgress = lambda: sum(Process.is_alive()
+                                      for Process in Processes)
+        self.WaitFor(Stage,
+                     lambda: not any(Process.is_alive()
+                                     for Process in Processes),
+                     GetProgress, Grace, Timeout)
+        Alive = []
+        for Process in Processes:
+            if Process.is_alive():
+                Alive.append(Process)
+            else:
+                Process.join()
+        return Alive
+
+    def GetMetrics(self):
+        """
+        This method returns the reports of all the finished stages and
+        the time the shutdown took so far.
+
+        Variables:
+            \-
+        """
+        return {"Seconds": round(self.Clock.Now() - self.Start, 3),
+                "Timeout": self.Timeout,
+                "Stages": list(self.Stages)}
+
+def Spill(Directory, Items):
+    """
+    This function writes the items to a spool in the directory and
+    returns their amount. Only one process may use a directory.
+
+    Variables:
+        Directory                         ``string``
+            the directory of the spool
+
+        Items                             ``iterable``
+            the updates to keep until the next start
+    """
+    Spool = None
+    Amount = 0
+    try:
+        for Item in Items:
+            if Spool is None:
+                Spool = spool.Spool(Directory)
+            Spool.Append(pickle.dumps(Item, pickle.HIGHEST_PROTOCOL))
+            Amount += 1
+    finally:
+        if Spool is not None:
+            Spool.Sync()
+            Spool.Close()
+    return Amount
+
+def Restore(Directory, Put):
+    """
+    This function hands all the spilled items of the spools in the
+    directory (and its sub directories) to Put, in the order of every
+    spool, and returns their amount. An item is only removed from the
+    disk after Put returned.
+
+    Variables:
+        Directory                         ``string``
+            the directory given to Spill, or the parent of several of
+            them
+
+        Put                               ``function``
+            is called with every item, for example ``Queue.put``
+    """
+    if not os.path.isdir(Directory):
+        return 0
+    Amount = 0
+    for Root, Directories, Files in sorted(os.walk(Directory)):
+        if not any(Name.endswith(".log") for Name in Files):
+            continue
+        Spool = spool.Spool(Root)
+        try:
+            for Sequence, Payload in Spool.Replay():
+                Put(pickle.loads(Payload))
+                Spool.Ack(Sequence)
+                Amount += 1
+            Spool.Sync()
+        finally:
+            Spool.Close()
+        # the done segments are removed by opening the spool again
+        spool.Spool(Root).Close()
+    return Amount
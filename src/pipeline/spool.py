@@ -0,0 +1,353 @@
+#!/usr/bin/env python3.4
+# -*- coding: utf-8 -*-
+
+"""
+This module defines a durable spool for the outgoing messages.
+
+Every message is appended to a log on the disk, before it is sent, and
+acknowledged after it has been sent. If the process gets killed, all
+the messages that haven't been acknowledged are replayed on the next
+start up.
+
+The log is split into segments of a fixed amount of records. Each
+segment consists of two files:
+
+    * ``<first sequence>.log`` the records, each one is a header (the
+      length and the crc32 of the payload and the sequence number)
+      followed by the payload
+    * ``<first sequence>.ack`` one byte per record, memory mapped, that
+      is set to 1 as soon as the record is acknowledged
+
+A segment whose records are all acknowledged is deleted.
+"""
+
+# python standard library
+import os
+import mmap
+import time
+import zlib
+import struct
+import bisect
+import threading
+
+
+class _Segment(object):
+    """
+    This class is a single segment of the spool.
+    """
+
+    HEADER = struct.Struct("<IIQ")
+    """
+    The header of every record: the length of the payload, the crc32 of
+    the payload and the sequence number.
+    """
+
+    def __init__(self, Directory, First, Size):
+        """
+        Variables:
+            Directory                     ``string``
+                the directory of the spool
+
+            First                         ``integer``
+                the sequence number of the first record
+
+            Size                          ``integer``
+                the maximal amount of records in the segment
+        """
+        self.First = First
+        self.Size = Size
+        Name = os.path.join(Directory, "{:020d}".format(First))
+        self.LogPath = Name + ".log"
+        self.AckPath = Name + ".ack"
+
+        # An existing index keeps its size, even if the segment size of
+        # the spool has been changed since.
+        if os.path.isfile(self.AckPath):
+            self.Size = max(Size, os.path.getsize(self.AckPath))
+        with open(self.AckPath, "ab") as AckFile:
+            AckFile.write(bytes(self.Size - AckFile.tell()))
+        self.AckFile = open(self.AckPath, "r+b")
+        self.Index = mmap.mmap(self.AckFile.fileno(), self.Size)
+
+        # The amount of valid records, a torn record at the end of the
+        # log (from a crash while writing) is cut off.
+        self.Count = 0
+        ValidSize = 0
+        for Offset, _, _ in self.Scan():
+            self.Count += 1
+            ValidSize = Offset
+        self.Acked = sum(1 for Ack in self.Index[:self.Count] if Ack)
+
+        # The log is unbuffered, so that every record is in the hands of
+        # the operating system as soon as it has been written.
+        self.LogFile = open(self.LogPath, "ab", buffering = 0)
+        if self.LogFile.tell() != ValidSize:
+            self.LogFile.truncate(ValidSize)
+            self.LogFile.seek(ValidSize)
+        self.Dirty = False
+
+    def Scan(self):
+        """
+        This method yields the end offset, the sequence number and the
+        payload of every valid record in the log.
+
+        Variables:
+            \-
+        """
+        if not os.path.isfile(self.LogPath):
+            return
+        with open(self.LogPath, "rb") as LogFile:
+            Offset = 0
+            Sequence = self.First
+            while True:
+                Header = LogFile.read(self.HEADER.size)
+                if len(Header) < self.HEADER.size:
+                    return
+                Length, Checksum, RecordSequence = self.HEADER.unpack(Header)
+                Payload = LogFile.read(Length)
+                if (len(Payload) < Length or RecordSequence != Sequence or
+                        zlib.crc32(Payload) != Checksum):
+                    return
+                Offset += self.HEADER.size + Length
+                yield Offset, Sequence, Payload
+                Sequence += 1
+
+    def IsFull(self):
+        return self.Count >= self.Size
+
+    def IsDone(self):
+        return self.Acked >= self.Count
+
+    def Append(self, Payload):
+        """
+        This method writes a record and returns its sequence number.
+
+        Variables:
+            Payload                       ``bytes``
+                the content of the record
+        """
+        Sequence = self.First + self.Count
+        self.LogFile.write(self.HEADER.pack(len(Payload),
+                                            zlib.crc32(Payload),
+                                            Sequence) + Payload)
+        self.Count += 1
+        self.Dirty = True
+        return Sequence
+
+    def Ack(self, Sequence):
+        """
+        This method marks a record as acknowledged.
+
+        Variables:
+            Sequence                      ``integer``
+                the sequence number of the record
+        """
+        Position = Sequence - self.First
+        if not self.Index[Position]:
+            self.Index[Position] = 1
+            self.Acked += 1
+            self.Dirty = True
+
+    def Sync(self):
+        """
+        This method forces the log and the index to the disk.
+
+        Variables:
+            \-
+        """
+        if self.Dirty:
+            os.fsync(self.LogFile.fileno())
+            self.Index.flush()
+            self.Dirty = False
+
+    def Close(self):
+        self.Sync()
+        self.Index.close()
+        self.AckFile.close()
+        self.LogFile.close()
+
+    def Remove(self):
+        self.Index.close()
+        self.AckFile.close()
+        self.LogFile.close()
+        os.remove(self.LogPath)
+        os.remove(self.AckPath)
+
+class Spool(object):
+    """
+    This class is an append only, segmented log of payloads waiting to
+    be acknowledged.
+
+    The spool is thread safe, but only one process may use a directory
+    at the same time.
+
+    .. code-block:: python\n
+        Spool = Spool("SavedWorkload/Spool")
+        for Sequence, Payload in Spool.Replay():
+            ...
+        Sequence = Spool.Append(Payload)
+        Spool.Sync()
+        ...
+        Spool.Ack(Sequence)
+    """
+
+    def __init__(self, Directory, SegmentSize = 4096, SyncInterval = 0.0):
+        """
+        Variables:
+            Directory                     ``string``
+                the directory holding the segments
+
+            SegmentSize                   ``integer``
+                the amount of records per segment
+
+            SyncInterval                  ``float``
+                the minimal seconds between two fsyncs done by
+                SyncIfDue, the appends in between are synced together
+        """
+        self.Directory = Directory
+        self.SegmentSize = SegmentSize
+        self.SyncInterval = SyncInterval
+        self._Lock = threading.RLock()
+        self._LastSync = 0.0
+
+        if not os.path.isdir(self.Directory):
+            os.makedirs(self.Directory)
+
+        # the segments and their first sequence numbers in order
+        self.Segments = []
+        self.Firsts = []
+        Firsts = sorted(int(Name[:-4]) for Name in os.listdir(self.Directory)
+                        if Name.endswith(".log") and Name[:-4].isdigit())
+        self.NextSequence = 0
+        for First in Firsts:
+            Segment = _Segment(self.Directory, First, self.SegmentSize)
+            self.NextSequence = max(self.NextSequence,
+                                    Segment.First + Segment.Count)
+            if Segment.IsDone():
+                Segment.Remove()
+            else:
+                self.Segments.append(Segment)
+                self.Firsts.append(First)
+
+    def __len__(self):
+        """
+        This method returns the amount of records that aren't
+        acknowledged.
+        """
+        with self._Lock:
+            return sum(Segment.Count - Segment.Acked
+                       for Segment in self.Segments)
+
+    def _GetSegment_(self, Sequence):
+        Position = bisect.bisect_right(self.Firsts, Sequence) - 1
+        if Position < 0:
+            return None
+        Segment = self.Segments[Position]
+        if Sequence >= Segment.First + Segment.Count:
+            return None
+        return Segment
+
+    def Replay(self):
+        """
+        This method returns the sequence numbers and the payloads of
+        all the records that aren't acknowledged, in the order they have
+        been appended.
+
+        Variables:
+            \-
+        """
+        Records = []
+        with self._Lock:
+            for Segment in self.Segments:
+                for _, Sequence, Payload in Segment.Scan():
+                    if not Segment.Index[Sequence - Segment.First]:
+                        Records.append((Sequence, Payload))
+        return Records
+
+    def Append(self, Payload):
+        """
+        This method appends a record and returns its sequence number.
+
+        The record survives the death of the process as soon as this
+        method returns, to survive a crash of the system Sync has to be
+        called.
+
+        Variables:
+            Payload                       ``bytes``
+                the content of the record
+        """
+        with self._Lock:
+            if not self.Segments or self.Segments[-1].IsFull():
+                if self.Segments:
+                    self.Segments[-1].Sync()
+                    self._RemoveIfDone_(self.Segments[-1])
+                Segment = _Segment(self.Directory, self.NextSequence,
+                                   self.SegmentSize)
+                self.Segments.append(Segment)
+                self.Firsts.append(Segment.First)
+            Sequence = self.Segments[-1].Append(Payload)
+            self.NextSequence = Sequence + 1
+            return Sequence
+
+    def Ack(self, Sequence):
+        """
+        This method acknowledges a record, it will not be replayed
+        anymore.
+
+        Variables:
+            Sequence                      ``integer``
+                the sequence number returned by Append
+        """
+        with self._Lock:
+            Segment = self._GetSegment_(Sequence)
+            if Segment is None:
+                return
+            Segment.Ack(Sequence)
+            # the segment written to is kept, even if it's done
+            if Segment is not self.Segments[-1] or Segment.IsFull():
+                self._RemoveIfDone_(Segment)
+
+    def _RemoveIfDone_(self, Segment):
+        if Segment.IsDone():
+            Position = self.Segments.index(Segment)
+            del self.Segments[Position]
+            del self.Firsts[Position]
+            Segment.Remove()
+
+    def Sync(self):
+        """
+        This method forces all the records and acknowledgements to the
+        disk.
+
+        Variables:
+            \-
+        """
+        with self._Lock:
+            for Segment in self.Segments:
+                Segment.Sync()
+            self._LastSync = time.monotonic()
+
+    def SyncIfDue(self):
+        """
+        This method syncs the spool, if the last sync is longer ago
+        than the SyncInterval. This way a burst of appends costs only
+        one fsync.
+
+        Variables:
+            \-
+        """
+        if time.monotonic() - self._LastSync >= self.SyncInterval:
+            self.Sync()
+
+    def Close(self):
+        """
+        This method syncs and closes the spool.
+
+        Variables:
+            \-
+        """
+        with self._Lock:
+            for Segment in self.Segments:
+                Segment.Close()
+            self.Segments = []
+            self.Firsts = []
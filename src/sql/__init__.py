@@ -73,6 +73,10 @@ class Api(object):
         self.LoggingObject = LoggingObject
 
 
+        # While a batch is running the commits are deferred to its end.
+        self.Batching = False
+        self.CommitPending = False
+
         # Create the connection to the database.
         self.DatabaseConnection = None
         self.DatabaseConnection = self._CreateConnection_()
@@ -285,6 +289,18 @@ class Api(object):
         """
         return Cursor.lastrowid
 
+    def GetRowCount(self, Cursor):
+        """
+        This method returns the amount of rows changed by the last 
+        statement of the cursor. For an INSERT with ON DUPLICATE KEY
+        UPDATE it's 1 if the row has been inserted.
+        
+        Variables:
+            Cursor                ``object``
+                cursor object.
+        """
+        return Cursor.rowcount
+
     def DestroyCursor(self, Cursor):
         """
         This method closes the cursor.
@@ -883,14 +899,45 @@ class Api(object):
 
             return False
 
-    def Commit(self, ):
+    def BeginBatch(self):
         """
-        This method will commit the changes to the database.
+        This method starts a batch, all the commits until EndBatch are
+        done as a single commit at its end.
         
         Variables:
-            Cursor                ``object``
-                contains the cursor object 
+            \-
         """
+        self.Batching = True
+        self.CommitPending = False
+
+    def EndBatch(self):
+        """
+        This method ends the batch and commits its changes, if any of 
+        them has asked for a commit.
+        
+        Variables:
+            \-
+        """
+        self.Batching = False
+        if self.CommitPending is True:
+            self.CommitPending = False
+            self.Commit()
+
+    def Commit(self, Force = False):
+        """
+        This method will commit the changes to the database and returns
+        False if the commit failed.
+        
+        Inside of a batch the commit is deferred to the end of the 
+        batch, unless Force is True.
+        
+        Variables:
+            Force                 ``boolean``
+                commits at once, even inside of a batch
+        """
+        if self.Batching is True and Force is False:
+            self.CommitPending = True
+            return True
         try:
             self.DatabaseConnection.commit()
         except mysql.connector.Error as Error:
@@ -898,6 +945,8 @@ class Api(object):
                 self._("The database connector returned following error:"
                        " {Error}").format(Error=Error))
             self.DatabaseConnection.rollback()
+            return False
+        return True
 
     def Rollback(self,):
         """
@@ -5,12 +5,18 @@
 import os
 import ssl
 import json
-import gzip
 import zlib
+import hmac
 import time
 import queue
 import pickle
+import hashlib
 import platform
+import threading
+import signal
+import http.client
+import http.server
+import socketserver
 import urllib.parse
 import urllib.request
 import multiprocessing
@@ -18,6 +24,15 @@ import multiprocessing
 import gobjects  # the global variables
 import language  # imports the _() function! (the translation feature)
 import clogging
+import messages.message
+import network.pool
+import network.stream
+import network.sender
+import network.limiter
+import network.resilience
+import pipeline.ring
+import pipeline.spool
+import pipeline.checkpoint
 
 
 class TelegramApi(object):
@@ -74,11 +89,22 @@ class TelegramApi(object):
     """
     The main url for the telegram API.
     """
+    TIMEOUT_MARGIN = 10
+    """
+    The seconds the socket waits longer for an answer then the long 
+    polling timeout given to the server.
+    """
     def __init__(self,
                  ApiToken,
                  RequestTimer,
                  LoggingObject,
                  LanguageObject,
+                 PoolSize = 1,
+                 BaseUrl = None,
+                 ConnectionEvent = None,
+                 BackoffMaximum = 60,
+                 BreakerThreshold = 5,
+                 BreakerResetTimeout = 30,
                  ):
         """
         The init method...
@@ -113,11 +139,35 @@ class TelegramApi(object):
                         
             LoggingObject         ``object``
                 contains the logging object needed to log
+
+            PoolSize              ``integer``
+                the amount of keep-alive connections this object may
+                hold open to the telegram servers at the same time
+
+            BaseUrl               ``string or None``
+                the url the token and the method names are appended to,
+                None uses the telegram servers (BASE_URL)
+
+            ConnectionEvent       ``None or multiprocessing.Event``
+                is set while a circuit breaker is open, so that the 
+                other processes know that telegram can't be reached
+
+            BackoffMaximum        ``integer or float``
+                the maximal seconds to wait before a retry
+
+            BreakerThreshold      ``integer``
+                the failed requests in a row that open the circuit
+                breaker of a method
+
+            BreakerResetTimeout   ``integer or float``
+                the seconds an open circuit breaker waits until it
+                lets a trial request through
                         
         """
         
         self.ApiToken = ApiToken
-        self.BotApiUrl = "{}{}".format(TelegramApi.BASE_URL,
+        self.BaseUrl = BaseUrl or TelegramApi.BASE_URL
+        self.BotApiUrl = "{}{}".format(self.BaseUrl,
                                        self.ApiToken
                                        )
         
@@ -127,23 +177,43 @@ class TelegramApi(object):
         self._ = self.LanguageObject.gettext
         self.LoggingObject = LoggingObject
 
-        # Test if the content can be compressed or not
-        self.Compressed = True
+        # The fields of the last answer read by StreamRequest, besides
+        # the result.
+        self.LastAnswerFields = {}
         
         # This variables are in normal situations not used.
         # They are only used when the connection to telegram is being 
         # tested (at the start of the program).
         self.Connection = True
         
-        # This timer is needed to see if there is a problem with the
-        # telegram server. If so the interval should be bigger (1 min 
-        # instead given time 1 sec)
+        # This timer is the first delay (in ms) before a failed request
+        # is tried again, every further failure doubles it up to 
+        # BackoffMaximum.
         self.RequestTimer = RequestTimer
-        self.GivenRequestTimer = RequestTimer
+        self.Backoff = network.resilience.Backoff(
+                                              float(RequestTimer) / 1000,
+                                              BackoffMaximum
+                                              )
+
+        # A circuit breaker for every method of the API, so that a 
+        # failing method doesn't get hammered with requests.
+        self.ConnectionEvent = ConnectionEvent
+        self.BreakerThreshold = BreakerThreshold
+        self.BreakerResetTimeout = BreakerResetTimeout
+        self.CircuitBreakers = {}
+        self._BreakerLock = threading.Lock()
         
         # ssl encryption protocol
         self.SSLEncryption = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2) 
 
+        # The keep-alive connections to the telegram servers, so that
+        # not every request has to do a new tcp and tls handshake.
+        self.ConnectionPool = network.pool.ConnectionPool(
+                                                  self.BaseUrl,
+                                                  self.SSLEncryption,
+                                                  PoolSize
+                                                  )
+
 #         this looks like this:
 #         {
 #         'Content-Type':
@@ -187,7 +257,89 @@ class TelegramApi(object):
         """
         return self.BotName
 
-    def SendRequest(self, Request):
+    def GetPoolStatistics(self):
+        """
+        This method returns the hit and miss counters of the connection
+        pool.
+        
+        Variables:
+            \-
+        """
+        return self.ConnectionPool.GetStatistics()
+
+    def GetCircuitBreaker(self, Request):
+        """
+        This method returns the circuit breaker of the method the
+        request is calling.
+        
+        Variables:
+            Request                       ``urllib.request.Request``
+                the request to the telegram bot API
+        """
+        Method = urllib.parse.urlsplit(Request.full_url).path
+        Method = Method.rsplit("/", 1)[-1]
+        with self._BreakerLock:
+            if Method not in self.CircuitBreakers:
+                self.CircuitBreakers[Method] = (
+                    network.resilience.CircuitBreaker(
+                                      Method,
+                                      self.BreakerThreshold,
+                                      self.BreakerResetTimeout,
+                                      OnChange = self._CircuitChanged_
+                                      ))
+            return self.CircuitBreakers[Method]
+
+    def _CircuitChanged_(self, Breaker):
+        """
+        This method logs the state changes of the circuit breakers and
+        sets the ConnectionEvent while one of them is open.
+        
+        Variables:
+            Breaker                       ``network.resilience.CircuitBreaker``
+                the circuit breaker that changed its state
+        """
+        if Breaker.State == network.resilience.CircuitBreaker.OPEN:
+            self.LoggingObject.warning(
+                self._("The telegram servers failed {Failures} times in a "
+                       "row on {Method}, no more requests for {Seconds} "
+                       "seconds.").format(Failures = Breaker.Failures,
+                                          Method = Breaker.Name,
+                                          Seconds = Breaker.ResetTimeout),
+                extra = {"Info": self.LoggingObject.getEffectiveLevel()})
+        else:
+            self.LoggingObject.info(
+                self._("The telegram servers answer {Method} again.").format(
+                                                    Method = Breaker.Name),
+                extra = {"Info": self.LoggingObject.getEffectiveLevel()})
+
+        if self.ConnectionEvent is not None:
+            with self._BreakerLock:
+                Open = any(Item.State != network.resilience.CircuitBreaker.CLOSED
+                           for Item in self.CircuitBreakers.values())
+            if Open:
+                self.ConnectionEvent.set()
+            else:
+                self.ConnectionEvent.clear()
+
+    def _RecordError_(self, Breaker, Error):
+        """
+        This method counts the error as a failure of the method if it
+        shows a problem of the telegram servers, an error in the 
+        request itself proves that the servers are working.
+        
+        Variables:
+            Breaker                       ``network.resilience.CircuitBreaker``
+                the circuit breaker of the method
+
+            Error                         ``Exception``
+                the error raised by the request
+        """
+        if network.resilience.IsTransient(Error):
+            Breaker.RecordFailure()
+        else:
+            Breaker.RecordSuccess()
+
+    def SendRequest(self, Request, Timeout = None):
         """
         This method will send the request to the telegram server.
         
@@ -198,118 +350,179 @@ class TelegramApi(object):
                 this variable is generated before the request is being
                 send to the telegram bot API
 
-        """
+            Timeout                       ``None, integer or float``
+                the socket timeout in seconds, None uses the default 
+                timeout of the connection pool
 
-        # Reset the request timer if needed.
-        if self.RequestTimer != self.GivenRequestTimer:
-            self.RequestTimer = self.GivenRequestTimer
+        """
+        Breaker = self.GetCircuitBreaker(Request)
+        Breaker.Guard()
         try:
-            with urllib.request.urlopen(
-                                        Request,
-                                        context=self.SSLEncryption
-                                        ) as Request:
-                # setting the compression rate of the system
-                if self.Compressed is True:
-                    RequestEncoding = Request.info().get("Accept-Encoding")
-                    if RequestEncoding == "gzip":
-                        self.Headers["Accept-Encoding"] = "gzip"
-                        TheResponse = gzip.decompress(Request.read())
-                    elif RequestEncoding == "deflate":
-                        self.Headers["Accept-Encoding"] = "deflate"
-                        Decompress = zlib.decompressobj(-zlib.MAX_WBITS)
-                        TheResponse = Decompress.decompress(Request.read())
-                        TheResponse += Decompress.flush()
-                    else:
-                        # setting the compression to false
-                        self.Compressed = False
-                        # deleting the Accept-Encoding header since neither of the encodings where accepted
-                        del self.Headers["Accept-Encoding"]
-                        TheResponse = Request.read()
-                else:
-                    TheResponse = Request.read()
-            return json.loads(TheResponse.decode("utf-8"))
+            with self.ConnectionPool.Open(Request, Timeout) as Response:
+                TheResponse = b"".join(network.stream.IterateBody(Response))
+            Answer = json.loads(TheResponse.decode("utf-8"))
+        except urllib.error.HTTPError as Error:
+            self._RecordError_(Breaker, Error)
+            self._LogHttpError_(Error)
+            raise
+        except OSError as Error:
+            self._RecordError_(Breaker, Error)
+            raise
+        except BaseException:
+            # a broken answer, the trial request mustn't stay unfinished
+            Breaker.RecordFailure()
+            raise
+        Breaker.RecordSuccess()
+        return Answer
 
+    def StreamRequest(self, Request, Timeout = None):
+        """
+        This method will send the request to the telegram server and 
+        yield the elements of the result of the answer one at a time, 
+        while the answer is still being received.
+        
+        The other fields of the answer are stored in 
+        ``self.LastAnswerFields``, as soon as all the elements have been
+        yielded.
+        
+        Variables:
+            Request                       ``object``
+                this variable is generated before the request is being
+                send to the telegram bot API
+
+            Timeout                       ``None, integer or float``
+                the socket timeout in seconds, None uses the default 
+                timeout of the connection pool
+        """
+        Breaker = self.GetCircuitBreaker(Request)
+        Breaker.Guard()
+        try:
+            with self.ConnectionPool.Open(Request, Timeout) as Response:
+                Stream = network.stream.ResultStream(
+                                        network.stream.IterateBody(Response))
+                for Element in Stream:
+                    yield Element
+                self.LastAnswerFields = Stream.Fields
         except urllib.error.HTTPError as Error:
-            if Error.code == 400:
-                self.LoggingObject.error(
-                    self._("The web server returned the HTTPError \"{Error}\"."
-                           ).format(Error=(str(Error.code) + " " + Error.reason
-                                           )
-                                    ) + " " + 
-                    self._("The server cannot or will not process the request "
-                           "due to something that is perceived to be a client "
-                           "error (e.g., malformed request syntax, invalid "
-                           "request message framing, or deceptive request "
-                           "routing)."
-                           ),
-                )
-            elif Error.code == 401:
-                self.LoggingObject.critical(
-                    self._("The web server returned the HTTPError \"{Error}\"."
-                           ).format(Error=(str(Error.code) + " " + Error.reason
-                                           )) + " " + 
-                    self._("The ApiToken you are using has not been found in "
-                           "the system. Try later or check the ApiToken for "
-                           "spelling errors."),
-                )
-            elif Error.code == 403:
-                self.LoggingObject.error(
-                    self._("The web server returned the HTTPError \"{Error}\"."
-                           ).format(Error="{} {}".format(Error.code, Error.reason)
-                                           ) + " " + 
-                    self._("The address is forbidden to access, please try "
-                           "later."),
-                )
-            elif Error.code == 404:
-                self.LoggingObject.error(
-                    self._("The web server returned the HTTPError \"{Error}\"."
-                           ).format(Error=" {} {} ".format(Error.code, Error.reason)
-                                           ) + 
-                    self._("The requested resource was not found. This status "
-                           "code can also be used to reject a request without "
-                           "closer reason. Links, which refer to those error "
-                           "pages, also referred to as dead links."),
-                )
-            elif Error.code == 429:
-                self.LoggingObject.error(
-                    self._("The web server returned the HTTPError \"{Error}\".") + 
-                    "{} {}".format(Error.code, Error.reason) +
-                    self._("My bot is hitting limits, how do I avoid this?\n"
-                    "When sending messages inside a particular chat, "
-                    "avoid sending more than one message per second. "
-                    "We may allow short bursts that go over this limit,"
-                    " but eventually you'll begin receiving 429 errors.\n"
-                    "If you're sending bulk notifications to multiple"
-                    " users, the API will not allow more than 30"
-                    " messages per second or so. Consider spreading out"
-                    " notifications over large intervals of 8—12 hours"
-                    " for best results.\nAlso note that your bot will"
-                    " not be able to send more than 20 messages per"
-                    " minute to the same group."
-                                           )
-                                         )
-            elif Error.code == 502:
-                self.LoggingObject.error(
-                    self._("The web server returned the HTTPError \"{Error}\"."
-                           ).format(Error=(str(Error.code) + " " + Error.reason
-                                           )) + " " + 
-                    self._("The server could not fulfill its function as a "
-                           "gateway or proxy, because it has itself obtained "
-                           "an invalid response. Please try later."),
-                )
-            elif Error.code == 504:
-                self.LoggingObject.error(
-                    self._("The web server returned the HTTPError \"{Error}\"."
-                           ).format(Error=(str(Error.code) + " " + Error.reason
-                                           )) + " " + 
-                    self._("The server could not fulfill its function as a "
-                           "gateway or proxy, because it has not received a "
-                           "reply from it's servers or services within a "
-                           "specified period of time.")
-                )
+            self._RecordError_(Breaker, Error)
+            self._LogHttpError_(Error)
             raise
-        except:
+        except OSError as Error:
+            self._RecordError_(Breaker, Error)
+            raise
+        except BaseException:
+            # a broken answer or a generator dropped before its end, the
+            # trial request mustn't stay unfinished
+            Breaker.RecordFailure()
             raise
+        Breaker.RecordSuccess()
+
+    def _LogHttpError_(self, Error):
+        """
+        This method logs a http error returned by the telegram server.
+        
+        Variables:
+            Error                         ``urllib.error.HTTPError``
+                the error to log
+        """
+        if Error.code == 400:
+            self.LoggingObject.error(
+                self._("The web server returned the HTTPError \"{Error}\"."
+                       ).format(Error=(str(Error.code) + " " + Error.reason
+                                       )
+                                ) + " " + 
+                self._("The server cannot or will not process the request "
+                       "due to something that is perceived to be a client "
+                       "error (e.g., malformed request syntax, invalid "
+                       "request message framing, or deceptive request "
+                       "routing)."
+                       ),
+            )
+        elif Error.code == 401:
+            self.LoggingObject.critical(
+                self._("The web server returned the HTTPError \"{Error}\"."
+                       ).format(Error=(str(Error.code) + " " + Error.reason
+                                       )) + " " + 
+                self._("The ApiToken you are using has not been found in "
+                       "the system. Try later or check the ApiToken for "
+                       "spelling errors."),
+            )
+        elif Error.code == 403:
+            self.LoggingObject.error(
+                self._("The web server returned the HTTPError \"{Error}\"."
+                       ).format(Error="{} {}".format(Error.code, Error.reason)
+                                       ) + " " + 
+                self._("The address is forbidden to access, please try "
+                       "later."),
+            )
+        elif Error.code == 404:
+            self.LoggingObject.error(
+                self._("The web server returned the HTTPError \"{Error}\"."
+                       ).format(Error=" {} {} ".format(Error.code, Error.reason)
+                                       ) + 
+                self._("The requested resource was not found. This status "
+                       "code can also be used to reject a request without "
+                       "closer reason. Links, which refer to those error "
+                       "pages, also referred to as dead links."),
+            )
+        elif Error.code == 429:
+            Error.RetryAfter = self.GetRetryAfter(Error)
+            self.LoggingObject.warning(
+                self._("The web server returned the HTTPError \"{Error}\"."
+                       ).format(Error="{} {}".format(Error.code, Error.reason)
+                                ) + " " +
+                self._("My bot is hitting limits, how do I avoid this?\n"
+                "When sending messages inside a particular chat, "
+                "avoid sending more than one message per second. "
+                "We may allow short bursts that go over this limit,"
+                " but eventually you'll begin receiving 429 errors.\n"
+                "If you're sending bulk notifications to multiple"
+                " users, the API will not allow more than 30"
+                " messages per second or so. Consider spreading out"
+                " notifications over large intervals of 8—12 hours"
+                " for best results.\nAlso note that your bot will"
+                " not be able to send more than 20 messages per"
+                " minute to the same group."
+                                       )
+                                     )
+        elif Error.code == 502:
+            self.LoggingObject.error(
+                self._("The web server returned the HTTPError \"{Error}\"."
+                       ).format(Error=(str(Error.code) + " " + Error.reason
+                                       )) + " " + 
+                self._("The server could not fulfill its function as a "
+                       "gateway or proxy, because it has itself obtained "
+                       "an invalid response. Please try later."),
+            )
+        elif Error.code == 504:
+            self.LoggingObject.error(
+                self._("The web server returned the HTTPError \"{Error}\"."
+                       ).format(Error=(str(Error.code) + " " + Error.reason
+                                       )) + " " + 
+                self._("The server could not fulfill its function as a "
+                       "gateway or proxy, because it has not received a "
+                       "reply from it's servers or services within a "
+                       "specified period of time.")
+            )
+        
+    @staticmethod
+    def GetRetryAfter(Error, Default = 1):
+        """
+        This method returns the seconds to wait, that the telegram 
+        server sends in the body of a 429 answer.
+        
+        Variables:
+            Error                         ``urllib.error.HTTPError``
+                the 429 error raised by the request
+                
+            Default                       ``integer``
+                the seconds to wait if the body doesn't contain them
+        """
+        try:
+            Body = json.loads(Error.read().decode("utf-8"))
+            return Body["parameters"]["retry_after"]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return Default
         
     def GetMe(self):
         """
@@ -328,7 +541,7 @@ class TelegramApi(object):
 
         return self.SendRequest(request)
 
-    def GetUpdates(self, CommentNumber=None):
+    def GetUpdates(self, CommentNumber=None, Timeout=0, Limit=None):
         """
         A method to get the Updates from the Telegram API.
         
@@ -339,18 +552,31 @@ class TelegramApi(object):
         1. This method will not work if an outgoing web hook is set up.
         2. In order to avoid getting duplicate updates, recalculate offset
            after each server response.
+        3. With a timeout bigger than 0 the telegram server holds the 
+           request open (long polling) until an update arrives or the
+           timeout is over, so this method blocks up to Timeout seconds.
         
         Variables:
             CommentNumber                 ``None or integer``
                 this variable set's the completed request id
                 
+            Timeout                       ``integer``
+                the long polling timeout in seconds, 0 means short 
+                polling
+                
+            Limit                         ``None or integer``
+                the maximal amount of updates (1-100) to receive, None
+                uses the default of the server (100)
+                
         """
 
         DataToBeSend = {
-                        # "limit": 1,
-                        "timeout": 0
+                        "timeout": Timeout
                         }
 
+        if Limit is not None:
+            DataToBeSend["limit"] = Limit
+
         if CommentNumber:
             DataToBeSend["offset"] = CommentNumber
         # data have to be bytes
@@ -360,8 +586,10 @@ class TelegramApi(object):
                                               data=MessageData,
                                               headers=self.Headers)
 
-        # send Request and get JSONData    
-        JSONData = self.SendRequest(Request,)
+        # send Request and get JSONData, the socket has to wait longer
+        # then the server holds the request open.
+        JSONData = self.SendRequest(Request, 
+                                    Timeout + TelegramApi.TIMEOUT_MARGIN)
 
         if JSONData is not None:
             if JSONData["ok"]:
@@ -369,6 +597,45 @@ class TelegramApi(object):
 
         return None
 
+    def IterateUpdates(self, CommentNumber=None, Timeout=0, Limit=None):
+        """
+        A method to get the Updates from the Telegram API one at a time.
+        
+        It works like GetUpdates, but the updates are yielded as soon 
+        as they have been received and decoded, instead of decoding the
+        whole answer first.
+        
+        Variables:
+            CommentNumber                 ``None or integer``
+                this variable set's the completed request id
+                
+            Timeout                       ``integer``
+                the long polling timeout in seconds, 0 means short 
+                polling
+                
+            Limit                         ``None or integer``
+                the maximal amount of updates (1-100) to receive, None
+                uses the default of the server (100)
+        """
+        DataToBeSend = {
+                        "timeout": Timeout
+                        }
+
+        if Limit is not None:
+            DataToBeSend["limit"] = Limit
+
+        if CommentNumber:
+            DataToBeSend["offset"] = CommentNumber
+        # data have to be bytes
+        MessageData = urllib.parse.urlencode(DataToBeSend).encode('utf-8')
+
+        Request = urllib.request.Request("{}/getUpdates".format(self.BotApiUrl),
+                                              data=MessageData,
+                                              headers=self.Headers)
+
+        return self.StreamRequest(Request, 
+                                  Timeout + TelegramApi.TIMEOUT_MARGIN)
+
     def SendMessage(self, MessageObject):
         """
         A method to send messages to the TelegramApi
@@ -390,6 +657,47 @@ class TelegramApi(object):
 
         return self.SendRequest(Request,)
 
+    def SetWebhook(self, Url, MaxConnections=None):
+        """
+        A method to tell the telegram servers to send all the updates
+        to the given url, instead of holding them for getUpdates.
+        
+        Variables:
+            Url                           ``string``
+                the https url the updates will be send to
+                
+            MaxConnections                ``None or integer``
+                the maximal amount of simultaneous connections (1-100)
+                the telegram servers will use to deliver the updates
+        """
+        DataToBeSend = {"url": Url}
+        
+        if MaxConnections is not None:
+            DataToBeSend["max_connections"] = MaxConnections
+            
+        MessageData = urllib.parse.urlencode(DataToBeSend).encode('utf-8')
+        
+        Request = urllib.request.Request("{}/setWebhook".format(self.BotApiUrl),
+                                         data=MessageData,
+                                         headers=self.Headers
+                                         )
+        
+        return self.SendRequest(Request,)
+    
+    def DeleteWebhook(self):
+        """
+        A method to remove the webhook, so that the updates can be 
+        received with getUpdates again.
+        
+        Variables:
+            \-
+        """
+        Request = urllib.request.Request("{}/deleteWebhook".format(self.BotApiUrl),
+                                         headers=self.Headers
+                                         )
+        
+        return self.SendRequest(Request,)
+
     def ForwardMessage(self, 
                        ChatId, FromChatId, 
                        MessageId, DisableNotification=False):
@@ -418,7 +726,8 @@ class _TelegramApiServer(multiprocessing.Process):
                  SendMessagesQueue,
                  ConnectionEvent,
                  WorkloadDoneEvent,
-                 ShutDownEvent,):
+                 ShutDownEvent,
+                 Configuration = None,):
                  
         super().__init__(name=Name)
         self.Name = Name
@@ -429,6 +738,8 @@ class _TelegramApiServer(multiprocessing.Process):
         self.Timeout = RequestTimer
         self.WorkloadDoneEvent = WorkloadDoneEvent
         self.SendMessagesQueue = SendMessagesQueue
+        self.Configuration = Configuration
+        self.LoggingObject = LoggingObject
         self.Data = {
                      "ApiToken": ApiToken,
                      "RequestTimer":RequestTimer,
@@ -436,10 +747,41 @@ class _TelegramApiServer(multiprocessing.Process):
                      "LanguageObject": LanguageObject,
                      }
         
+        # The amount of keep-alive connections the process may use,
+        # it will be overwritten by the children.
+        self.PoolSize = 1
+        
         self.Run = True
         self.WorkloadFileDirectory = os.path.abspath("SavedWorkload")
         self.TelegramApi = None
     
+    def _GetOption_(self, Option, Default, Section = "Telegram"):
+        """
+        This method returns an option from the configuration converted 
+        to the type of the default value. If the option (or the whole 
+        configuration) doesn't exist the default will be returned.
+        
+        Variables:
+            Option                        ``string``
+                the name of the option
+                
+            Default                       ``object``
+                the value to use if the option doesn't exist
+                
+            Section                       ``string``
+                the section of the configuration
+        """
+        if self.Configuration is None:
+            return Default
+        try:
+            Value = self.Configuration[Section][Option]
+        except KeyError:
+            return Default
+        
+        if isinstance(Default, bool):
+            return Value.strip().lower() in ("1", "yes", "true", "on")
+        return type(Default)(Value)
+    
     def _SaveMessages_(self, Message):
         """
         This method will send the finished message to the orgniser 
@@ -454,7 +796,9 @@ class _TelegramApiServer(multiprocessing.Process):
             self.SendMessagesQueue.put(item = Message, 
                                        block = True, 
                                        timeout = 0.5)
-        except queue.Empty:
+        except (queue.Empty, queue.Full):
+            # the queue is bounded, the message isn't logged rather 
+            # than stopping the process
             return False
         return True
 
@@ -467,9 +811,41 @@ class _TelegramApiServer(multiprocessing.Process):
                  RequestTimer = self.Data["RequestTimer"],
                  LoggingObject = self.Data["LoggingObject"],
                  LanguageObject = self.Data["LanguageObject"],
-
+                 PoolSize = self.PoolSize,
+                 BaseUrl = self._GetOption_("BaseUrl", TelegramApi.BASE_URL),
+                 ConnectionEvent = self.ConnectionEvent,
+                 BackoffMaximum = self._GetOption_("BackoffMaximum", 60.0),
+                 BreakerThreshold = self._GetOption_("BreakerThreshold", 5),
+                 BreakerResetTimeout = self._GetOption_("BreakerResetTimeout",
+                                                        30.0),
         )
     
+    def _StopOnTerminate_(self):
+        """
+        This method lets a SIGTERM end the process like a normal 
+        shutdown, the finally blocks still run. The MainWorker uses it
+        if the process doesn't stop in time, for example while it waits
+        for a long polling request.
+        """
+        def Stop(Signal, Frame):
+            # the ShutDownEvent is already set, it's a proxy of the 
+            # manager that can't be used inside of a signal handler
+            raise SystemExit(0)
+        signal.signal(signal.SIGTERM, Stop)
+    
+    def _LogPoolStatistics_(self):
+        """
+        This method writes the hit and miss counters of the connection
+        pool into the log.
+        """
+        if self.TelegramApi is not None:
+            self.LoggingObject.debug(
+                self.TelegramApi._("The connection pool statistics are: "
+                                   "{Statistics}").format(
+                    Statistics = self.TelegramApi.GetPoolStatistics()
+                                                        )
+                                     )
+    
     def _CheckDirectory_(self):
         """
         This method will check if the workload directory exsits or not.
@@ -565,7 +941,9 @@ class InputTelegramApiServer(_TelegramApiServer):
                  SendMessagesQueue,
                  ConnectionEvent,
                  WorkloadDoneEvent,
-                 ShutDownEvent,):
+                 ShutDownEvent,
+                 Configuration = None,
+                 PressureEvent = None,):
         """
         Just initialising the subserver.
         """  
@@ -580,13 +958,32 @@ class InputTelegramApiServer(_TelegramApiServer):
                  SendMessagesQueue,
                  ConnectionEvent,
                  WorkloadDoneEvent,
-                 ShutDownEvent,)
+                 ShutDownEvent,
+                 Configuration,)
         
         self.ApiOffset = None
+        # Set by the MainWorker while the queues are too full, no
+        # updates are taken meanwhile (backpressure).
+        self.PressureEvent = PressureEvent
+        
+        # Only the getUpdates requests are send by this process.
+        self.PoolSize = self._GetOption_("InputConnections", 1)
+        
+        # The seconds the telegram server holds the getUpdates request
+        # open, 0 means short polling.
+        self.LongPollingTimeout = self._GetOption_("LongPollingTimeout", 30)
+        # The maximal amount of updates per request (1-100).
+        self.UpdateLimit = self._GetOption_("UpdateLimit", 100)
             
         self.WorkloadSaveFile = "ApiWorkload.psi"    
         self.WorkloadSaveFileFull = os.path.join(self.WorkloadFileDirectory,
                                                  self.WorkloadSaveFile)  
+        # The offset is checkpointed after every batch of updates, at 
+        # most every OffsetCheckpointInterval seconds.
+        self.OffsetCheckpoint = pipeline.checkpoint.OffsetCheckpoint(
+                    os.path.join(self.WorkloadFileDirectory, "ApiOffset.json"),
+                    self._GetOption_("OffsetCheckpointInterval", 1.0)
+                    )
     
     def _SaveMessages_(self, Message):
         """
@@ -605,6 +1002,13 @@ class InputTelegramApiServer(_TelegramApiServer):
         """
         self.WorkloadQueue.put(ElementToAdd)
         
+    def _IsPressured_(self):
+        """
+        This method returns True if the queues behind this process are
+        too full to take new updates.
+        """
+        return self.PressureEvent is not None and self.PressureEvent.is_set()
+    
     def GetBotName(self):
         """
         This methode gets the bot name from the Api
@@ -618,14 +1022,14 @@ class InputTelegramApiServer(_TelegramApiServer):
         if "Order" in Command:
             Order = Command["Order"]
             
-        if ConnectionObject in Command:
+        if "ConnectionObject" in Command:
             ConnectionObject = Command["ConnectionObject"]
         
         if Order == "GetBotName":
             BotName = self.GetBotName()
             self._SendOverConnection_(ConnectionObject, BotName)
         elif Order == "SendApiOffset":
-            ApiOffset = self.APIOffset
+            ApiOffset = self.ApiOffset
             self._SendOverConnection_(ConnectionObject, ApiOffset)
         elif Order == "GetApiOffset":
             self.ApiOffset = self._GetOverConnection_(ConnectionObject)
@@ -641,69 +1045,89 @@ class InputTelegramApiServer(_TelegramApiServer):
         """
         This class will get the ApiOffset from the filesystem.
         
+        An offset saved by an older version as pickle is used, if there
+        is no checkpoint yet.
+        
         Variables:
             \-
         """
-        APIOffset = None
-        if os.path.isdir(self.WorkloadSaveFileFull):
-            Inputdata = None
-            with open(self.WorkloadSaveFileFull, "r") as InputFile:
-                Inputdata = InputFile.read()
+        APIOffset = self.OffsetCheckpoint.Load()
+        if os.path.isfile(self.WorkloadSaveFileFull):
+            if APIOffset is None:
+                try:
+                    with open(self.WorkloadSaveFileFull, "rb") as InputFile:
+                        APIOffset = pickle.load(InputFile).get("ApiOffset")
+                except (OSError, pickle.UnpicklingError, EOFError, 
+                        AttributeError):
+                    APIOffset = None
             os.remove(self.WorkloadSaveFileFull)
-            if isinstance(Inputdata, dir) is True:
-                if "ApiOffset" in Inputdata:
-                    APIOffset = APIOffset["ApiOffset"]
-                return APIOffset
         return APIOffset
     
-    def _SaveApiOffset_(self,):
+    def _SaveApiOffset_(self, Force = True):
         """
         Saves the telegram offest to the filesystem, so that the next 
         time the system starts it can directly restart getting the next 
         workload.
         
         Variables:
-            \-
+            Force                         ``boolean``
+                if the offset has to be written right now, else it's 
+                only written if the checkpoint interval is over
         """
+        if self.ApiOffset is None:
+            return
         
         self._CheckDirectory_()
         
-        DataToDump = {
-                      "ApiOffset": self.ApiOffset
-                      }
-        
-        with open(self.WorkloadSaveFileFull, "wb") as OutputFile:
-            pickle.dump(DataToDump, OutputFile)
-    
-    def _GetCommentNumber_(self, MessageObject):
-        """
-        This method is responsable for getting the heighest update_id
-        from the system.
-        """
-        
-        CommentList = []
-        for Message in MessageObject["result"]:
-            CommentList.append(Message["update_id"])
-
-        return (max(CommentList) + 1)
+        if Force is True:
+            self.OffsetCheckpoint.Save(self.ApiOffset)
+            self.OffsetCheckpoint.Flush()
+        else:
+            self.OffsetCheckpoint.Save(self.ApiOffset)
     
     def _GetUpdates_(self, CommentNumber):
         """
         This method will run the get update method from the API.
-        it will return whatever the API gets.
+        It yields the updates one at a time, while the answer of the 
+        API is still being read, so that the workers can start before
+        the whole batch has been received.
+        
+        If the request fails nothing more is yielded, the updates 
+        yielded so far are valid nevertheless. The next request waits
+        the delay of the backoff, which grows with every failure in a 
+        row.
         
         Variables:
             CommentNumber                 ``integer``
                 is the number of the telegram user.
         """
-        Update = None
-        while Update is None:
-            try:
-                Update = self.TelegramApi.GetUpdates(CommentNumber)
-            except urllib.error.HTTPError:
-                Update = None
-            time.sleep(0.5)
-        return Update
+        Received = 0
+        try:
+            # with long polling this blocks on the socket until there 
+            # is an update or the timeout is over
+            for Update in self.TelegramApi.IterateUpdates(
+                                            CommentNumber,
+                                            Timeout = self.LongPollingTimeout,
+                                            Limit = self.UpdateLimit
+                                            ):
+                Received += 1
+                yield Update
+        except (urllib.error.HTTPError, OSError, ValueError,
+                http.client.HTTPException) as Error:
+            # a broken answer (IncompleteRead, BadStatusLine) waits like
+            # a failed request
+            Delay = self.TelegramApi.Backoff.Next()
+            if isinstance(Error, network.resilience.CircuitOpenError):
+                Delay = max(Delay, Error.WaitTime)
+            # a shutdown doesn't have to wait for the end of the delay
+            self.ShutDownEvent.wait(Delay)
+            return
+        self.TelegramApi.Backoff.Reset()
+        
+        if Received == 0 and self.LongPollingTimeout == 0:
+            # short polling, wait the request timer (in ms) so that the
+            # server isn't flooded with requests
+            time.sleep(float(self.Timeout) / 1000)
     
     def run(self):
         """
@@ -715,51 +1139,264 @@ class InputTelegramApiServer(_TelegramApiServer):
   
         # Start the telegram API.
         self.TelegramApi = self._StartApi_()
-        # Times the system  will retry to build a connection to the
-        # telegram server.
-        TryAgain = 3
-        Save = False
         # Try to get the telegram offset from the filesystem.
         self.ApiOffset = self._LoadApiOffset_()
+        self._StopOnTerminate_()
         
-        while not self.ShutDownEvent.is_set():
-            # check the input queue for orders
-            
-            Input = self._GetCommand_()
-            
-            if Input is not None:
-                self._InterpretCommand_(Input)
+        try:
+            while not self.ShutDownEvent.is_set():
+                # check the input queue for orders
+                
+                Input = self._GetCommand_()
+                
+                if Input is not None:
+                    self._InterpretCommand_(Input)
+                
+                if self.Run is True and self._IsPressured_():
+                    # the updates stay on the telegram servers until the 
+                    # workers have caught up
+                    self.ShutDownEvent.wait(0.1)
+                # only run if it's allowed 
+                elif self.Run is True:
+                    for Update in self._GetUpdates_(self.ApiOffset):
+                        self._AddToWorkQueue_(Update)
+                        # the next request confirms this update, only
+                        # after it's in the work queue
+                        self.ApiOffset = max(self.ApiOffset or 0,
+                                             Update["update_id"] + 1)
+                        self._SaveMessages_(Update)
+                    # The batch is in the work queue, so the offset can 
+                    # be checkpointed.
+                    self._SaveApiOffset_(Force = False)
+        finally:
+            self.WorkloadDoneEvent.set()             
+            self._SaveApiOffset_()    
+            self._LogPoolStatistics_()
+
+class WebhookRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    This class handles the update POST requests send from the telegram
+    servers to the webhook.
+    
+    Only requests to the secret path of the server are accepted, all the
+    other requests are answered with a 404, so that nobody without the
+    secret can inject updates.
+    """
+    # keep the connections open, telegram reuses them for the next 
+    # updates
+    protocol_version = "HTTP/1.1"
+    
+    def _Answer_(self, Code, Body = b""):
+        """
+        This method sends the answer to the telegram servers.
+        
+        Variables:
+            Code                          ``integer``
+                the http status code
+                
+            Body                          ``bytes``
+                the content of the answer
+        """
+        self.send_response(Code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(Body)))
+        self.end_headers()
+        self.wfile.write(Body)
+    
+    def do_POST(self):
+        """
+        This method is called by the http server for each POST request.
+        
+        Variables:
+            \-
+        """
+        Length = int(self.headers.get("Content-Length", 0))
+        Content = self.rfile.read(Length)
+        
+        if not hmac.compare_digest(self.path, self.server.SecretPath):
+            self._Answer_(404)
+            return
+        
+        if self.server.Accepting is False:
+            # telegram retries the update later
+            self._Answer_(503)
+            return
+        
+        try:
+            Updates = json.loads(Content.decode("utf-8"))
+        except ValueError:
+            self._Answer_(400)
+            return
+        
+        # a recorded getUpdates answer or a list of updates can be
+        # posted as well, that helps with local testing
+        if isinstance(Updates, dict) and "result" in Updates:
+            Updates = Updates["result"]
+        elif isinstance(Updates, dict):
+            Updates = [Updates]
+        
+        for Update in Updates:
+            self.server.UpdateCallback(Update)
             
-            # only run if it's allowed 
-            if self.Run is True:
-                MessageObject = self._GetUpdates_(self.ApiOffset)
+        self._Answer_(200, b"{}")
+    
+    def log_message(self, format, *args):
+        """
+        This method overrides the parent method, so that every request
+        isn't printed to the console.
+        """
+        pass
 
-                if MessageObject is not None:
-                    if not isinstance(MessageObject, int):
-                        # if the messageObject is no error message or
-                        # empty.
-                        
-                        
-                        if "result" in MessageObject:
-                            if MessageObject["result"]:
-                                self.ApiOffset = self._GetCommentNumber_(MessageObject)
-                                for Result in MessageObject["result"]:
-                                    self._AddToWorkQueue_(Result)
-                                    self._SaveMessages_(Result)
-                        if self.ConnectionEvent.is_set() and TryAgain == 0:
-                            self.ConnectionEvent.clear()
-                            TryAgain = 3
-                            Save = False
-                            
-                    elif isinstance(MessageObject, int):
-                        if TryAgain > 0:
-                            TryAgain -= 1
-                        elif TryAgain == 0 and Save is False:
-                            Save = True
-                            self.ConnectionEvent.set()
-                            
-        self.WorkloadDoneEvent.set()             
-        self._SaveApiOffset_()    
+class WebhookServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+    This class is a threaded http server that receives the updates 
+    from the telegram servers.
+    """
+    daemon_threads = True
+    
+    def __init__(self, Address, SecretPath, UpdateCallback):
+        """
+        Variables:
+            Address                       ``tuple``
+                the host and the port the server listens to
+                
+            SecretPath                    ``string``
+                the path (with the leading slash) the updates have to
+                be posted to
+                
+            UpdateCallback                ``function``
+                will be called with every received update
+        """
+        self.SecretPath = SecretPath
+        self.UpdateCallback = UpdateCallback
+        self.Accepting = True
+        super().__init__(Address, WebhookRequestHandler)
+
+class WebhookTelegramApiServer(InputTelegramApiServer):
+    """
+    This class is an alternative to the InputTelegramApiServer, instead
+    of asking the telegram servers for the updates, the updates are
+    pushed by the telegram servers to a built in http server.
+    
+    The received updates end up in the same queues as the ones from the
+    getUpdates loop.
+    """
+    def __init__(self,
+                 Name,
+                 ApiToken,
+                 RequestTimer,
+                 LoggingObject,
+                 LanguageObject,
+                 ControllerQueue,
+                 WorkloadQueue,
+                 SendMessagesQueue,
+                 ConnectionEvent,
+                 WorkloadDoneEvent,
+                 ShutDownEvent,
+                 Configuration = None,
+                 PressureEvent = None,):
+        """
+        Just initialising the subserver.
+        """  
+        super().__init__(
+                 Name,
+                 ApiToken,
+                 RequestTimer,
+                 LoggingObject,
+                 LanguageObject,
+                 ControllerQueue,
+                 WorkloadQueue,
+                 SendMessagesQueue,
+                 ConnectionEvent,
+                 WorkloadDoneEvent,
+                 ShutDownEvent,
+                 Configuration,
+                 PressureEvent,)
+        
+        self.Host = self._GetOption_("Host", "0.0.0.0", "Webhook")
+        self.Port = self._GetOption_("Port", 8443, "Webhook")
+        # The public url of the webhook (without the secret), if it's
+        # empty the webhook has to be set by hand, for example when the
+        # server runs behind a reverse proxy.
+        self.WebhookUrl = self._GetOption_("Url", "", "Webhook")
+        self.MaxConnections = self._GetOption_("MaxConnections", 40, "Webhook")
+        
+        SecretToken = self._GetOption_("SecretToken", "", "Webhook")
+        if not SecretToken:
+            # derive a secret from the api token, so that it doesn't
+            # change between the restarts
+            SecretToken = hashlib.sha256(
+                                ApiToken.encode("utf-8")).hexdigest()[:32]
+        self.SecretPath = "/{}".format(SecretToken)
+        
+        self.HttpServer = None
+    
+    def _ReceiveUpdate_(self, Update):
+        """
+        This method is called by the http server threads with each 
+        received update.
+        
+        Variables:
+            Update                        ``dictionary``
+                the update from the telegram servers
+        """
+        self._AddToWorkQueue_(Update)
+        self._SaveMessages_(Update)
+    
+    def _InterpretCommand_(self, Command):
+        """
+        This method extends the parent method, so that the http server
+        stops accepting updates while the process is stopped.
+        """
+        super()._InterpretCommand_(Command)
+        if self.HttpServer is not None:
+            self.HttpServer.Accepting = self.Run and not self._IsPressured_()
+    
+    def run(self):
+        """
+        The method where the action happens
+        
+        Variables:
+            \-
+        """
+        # Start the telegram API.
+        self.TelegramApi = self._StartApi_()
+        
+        if self.WebhookUrl:
+            self.TelegramApi.SetWebhook(
+                            "{}{}".format(self.WebhookUrl.rstrip("/"),
+                                          self.SecretPath),
+                            self.MaxConnections
+                                        )
+        
+        self.HttpServer = WebhookServer((self.Host, self.Port), 
+                                        self.SecretPath, 
+                                        self._ReceiveUpdate_)
+        self._StopOnTerminate_()
+        ServerThread = threading.Thread(target = self.HttpServer.serve_forever,
+                                        name = "WebhookServer",
+                                        daemon = True)
+        ServerThread.start()
+        
+        try:
+            while not self.ShutDownEvent.is_set():
+                # check the input queue for orders
+                Input = self._GetCommand_()
+                if Input is not None:
+                    self._InterpretCommand_(Input)
+                # while the queues are too full the telegram servers 
+                # get a 503 and retry the updates later
+                self.HttpServer.Accepting = (self.Run and 
+                                             not self._IsPressured_())
+                
+                self.ShutDownEvent.wait(0.1)
+        finally:
+            self.HttpServer.shutdown()
+            self.HttpServer.server_close()
+            ServerThread.join()
+        
+            self.WorkloadDoneEvent.set()
+            self._LogPoolStatistics_()
 
 class OutputTelegramApiServer(_TelegramApiServer):
     
@@ -774,7 +1411,10 @@ class OutputTelegramApiServer(_TelegramApiServer):
                  SendMessagesQueue,
                  ConnectionEvent,
                  WorkloadDoneEvent,
-                 ShutDownEvent,):
+                 ShutDownEvent,
+                 Configuration = None,
+                 ShutdownDeadline = None,
+                 SchedulerDepth = None,):
         """
         Just initialising the subserver.
         ""        """        
@@ -790,13 +1430,57 @@ class OutputTelegramApiServer(_TelegramApiServer):
                  ConnectionEvent,
                  WorkloadDoneEvent,
                  ShutDownEvent,
+                 Configuration,
                  )
         
         self.Timeout = 1/28
+        self.PoolSize = self._GetOption_("OutputConnections", 4)
+        # The scheduler that keeps the sending in the telegram limits.
+        self.Scheduler = network.limiter.MessageScheduler(
+            GlobalRate = self._GetOption_("GlobalRateLimit", 30.0),
+            ChatRate = self._GetOption_("ChatRateLimit", 1.0),
+            GroupRatePerMinute = self._GetOption_("GroupRateLimit", 20.0),
+            ChatBurst = self._GetOption_("ChatBurst", 1),
+            Lanes = (
+                (messages.message.MessageToBeSend.INTERACTIVE,
+                 self._GetOption_("InteractiveWeight", 8.0)),
+                (messages.message.MessageToBeSend.ADMIN,
+                 self._GetOption_("AdminWeight", 4.0)),
+                (messages.message.MessageToBeSend.BULK,
+                 self._GetOption_("BulkWeight", 1.0)),
+                ),
+            BulkReserve = self._GetOption_("BulkReserve", 5.0),
+            GetLane = OutputTelegramApiServer._GetLane_,
+            )
+        # The messages are only taken from the queue while the 
+        # scheduler holds less than SchedulerLimit of them, its depth is
+        # shared with the MainWorker for the backpressure.
+        self.SchedulerLimit = max(1, int(self._GetOption_("SchedulerLimit", 
+                                                          10000)))
+        self.SchedulerDepth = SchedulerDepth
         self.WorkloadSaveFile = "Workload.psi"
         self.WorkloadSaveFileFull = os.path.join(self.WorkloadFileDirectory,
                                                  self.WorkloadSaveFile)
+        # The spool holds every message until it has been sent, it's 
+        # opened in the process itself.
+        self.Spool = None
+        self.SpoolDirectory = os.path.join(self.WorkloadFileDirectory, 
+                                           "Spool")
+        self.SpoolSyncInterval = self._GetOption_("SpoolSyncInterval", 0.05)
         self.WorkloadDoneEvent = WorkloadDoneEvent         
+        # The time (as time.time) the draining has to stop at, shared
+        # with the MainWorker, 0 until the shutdown has started.
+        self.ShutdownDeadline = ShutdownDeadline
+    
+    @staticmethod
+    def _GetLane_(Entry):
+        """
+        This method returns the lane of an entry of the sender, a
+        message of an older version without a lane is interactive.
+        """
+        ChatId, (Sequence, Work) = Entry
+        return getattr(Work, "Lane",
+                       messages.message.MessageToBeSend.INTERACTIVE)
     
     def _SaveMessages_(self, Message):
         """
@@ -811,72 +1495,110 @@ class OutputTelegramApiServer(_TelegramApiServer):
     def _GetWorkload_(self, TimeOut = 0.1):
         """
         This method will get an element from the input queue.
+        
+        Variables:
+            TimeOut                       ``float``
+                the seconds to wait for an element, 0 doesn't wait
         """
         ElementFromQueue = None
         try:
-            if TimeOut < 0:
+            if TimeOut > 0:
                 ElementFromQueue = self.WorkloadQueue.get(block = True,
-                                                       timeout = TimeOut)
+                                                          timeout = TimeOut)
             else:
-                ElementFromQueue = self.WorkloadQueue.get()                
+                ElementFromQueue = self.WorkloadQueue.get_nowait()
         except queue.Empty:
             pass
+        except pipeline.ring.RingBrokenError as Error:
+            # a worker died while it wrote to the queue, the messages 
+            # in it are lost, but the spool can still be sent
+            if not getattr(self, "_QueueBroken", False):
+                self._QueueBroken = True
+                self.LoggingObject.error(
+                    self.TelegramApi._("The queue of the messages is "
+                                       "broken: {Error}").format(
+                                                        Error = Error))
+            time.sleep(TimeOut)
         except:
             raise
         
         return ElementFromQueue  
+    
+    def _ReceiveWorkload_(self, TimeOut, Bounded = True):
+        """
+        This method returns the elements of the input queue together 
+        with their chat ids. It waits at most TimeOut seconds for the 
+        first element, all the others are taken without waiting.
+        
+        It's called by the sender in its own thread, so the commands to
+        the server are handled here as well.
+        
+        Variables:
+            TimeOut                       ``float``
+                the seconds to wait for the first element
+                
+            Bounded                       ``boolean``
+                if True, only as many elements are taken as the 
+                scheduler has room for (see SchedulerLimit)
+        """
+        Command = self._GetCommand_()
+        if Command is not None:
+            if isinstance(Command, dict):
+                self._InterpretCommand_(Command)
+        
+        Room = self.SchedulerLimit - len(self.Scheduler)
+        if self.SchedulerDepth is not None:
+            self.SchedulerDepth.value = len(self.Scheduler)
+        Workload = []
+        if Bounded and Room <= 0:
+            # the messages wait in the queue, until the scheduler has 
+            # sent some of its own
+            time.sleep(TimeOut)
+            return Workload
+        Work = self._GetWorkload_(TimeOut)
+        while Work is not None:
+            # The message is written to the spool, before it's sent.
+            Sequence = self.Spool.Append(pickle.dumps(Work))
+            Workload.append((Work.ToChatId, (Sequence, Work)))
+            if Bounded and len(Workload) >= Room:
+                break
+            Work = self._GetWorkload_(0)
+        # All the messages appended since the last time are synced 
+        # together.
+        self.Spool.SyncIfDue()
+        return Workload
       
     def _SaveWorkload_(self, PreviousWorkload = None):
         """
         Save the remaning workload to the filesystem to send them later.
         
+        All the received messages are already in the spool, so only the
+        given ones are added to it before it's synced.
+        
         Variables:
-            PreviousWorkload              
+            PreviousWorkload              ``list``
+                messages that aren't in the spool yet
         """
-        Workload = []
-        # if there was some waiting work to do
-        if PreviousWorkload:
-            Workload = PreviousWorkload
-        
-        # wait for the worker process finished  its workload.   
-        self.WorkloadDoneEvent.wait()
-
-        # check if workload exists
-        while self.InputQueue.qsize() > 0:
-            Element = None
-            try:
-                Element = self.GetElementsFromQueue(0.5)
-            except queue.Empty:
-                pass
-            except:
-                raise
-            
-            if Element is not None:
-                Workload.append(Element)
-        
-        if Workload:
-            # check if exists or else...
-            if not os.path.isdir(self.WorkloadFileDirectory):
-                os.mkdir(self.WorkloadFileDirectory)
-            
-            with open(self.WorkloadSaveFileFull, "wb") as OutputFile:
-                pickle.dump(Workload, OutputFile)
+        for Element in PreviousWorkload or []:
+            self.Spool.Append(pickle.dumps(Element))
+        self.Spool.Sync()
+        return True
     
     def _ReadWorkload_(self):
         """
-        Check if the worload file exist and return the content, if it 
-        does. Else return an empty list.
+        This method returns the messages of the spool that haven't been
+        sent, together with their sequence numbers.
+        
+        A workload file saved by an older version is moved into the 
+        spool first.
         """
-        Workload = []
-        if os.path.isdir(self.WorkloadFileDirectory):
-            if os.path.isfile(self.WorkloadSaveFileFull):
-                with open(self.WorkloadSaveFileFull, "rb") as InputFile:
-                    Workload = pickle.load(self.WorkloadSaveFileFull, 
-                                           InputFile)
-                os.remove(self.WorkloadSaveFileFull)
-            return Workload
-        else:
-            return Workload
+        if os.path.isfile(self.WorkloadSaveFileFull):
+            with open(self.WorkloadSaveFileFull, "rb") as InputFile:
+                self._SaveWorkload_(pickle.load(InputFile))
+            os.remove(self.WorkloadSaveFileFull)
+        
+        return [(Sequence, pickle.loads(Payload)) 
+                for Sequence, Payload in self.Spool.Replay()]
         
     def _InterpretCommand_(self, Command):
         """
@@ -888,51 +1610,146 @@ class OutputTelegramApiServer(_TelegramApiServer):
                 contains the command and the possible addidtional 
                 options.
         """
-        raise NotImplemented
+        Order = Command.get("Order")
+        ConnectionObject = Command.get("ConnectionObject")
+        
+        if Order == "SaveWorkload":
+            self._SendOverConnection_(ConnectionObject, 
+                                      self._SaveWorkload_())
 
     def _SendToTelegram_(self, MessageObject):
-        returnMessage = None
-        attempts = 0
-        while returnMessage is None and attempts < 3:
-            try:
-                returnMessage = self.TelegramApi.SendMessage(MessageObject)
-            except urllib.error.HTTPError:
-                returnMessage = None
-                attempts += 1
-        return returnMessage            
+        """
+        This method sends a message to the telegram servers.
+        
+        A 429 answer is raised again, so that the sender can block the 
+        chat of the message for the time the server asked for, all the
+        other chats are not affected by it. A failure of the server 
+        (5xx, a timeout or an open circuit breaker) is raised again 
+        too, the sender retries it after a delay. A message the server
+        refused (any other 4xx) is given up, it would fail again.
+        
+        Variables:
+            MessageObject                 ``object``
+                the message to send
+        """
+        try:
+            return self.TelegramApi.SendMessage(MessageObject)
+        except urllib.error.HTTPError as Error:
+            if Error.code == 429 or network.resilience.IsTransient(Error):
+                raise
+        return None
+    
+    def _SendSpooled_(self, Entry):
+        """
+        This method sends a message of the spool.
+        
+        Variables:
+            Entry                         ``tuple``
+                the sequence number in the spool and the message
+        """
+        return self._SendToTelegram_(Entry[1])
+    
+    def _MessageSent_(self, Entry, ReturnMessage):
+        """
+        This method acknowledges a sent message in the spool and logs 
+        the answer of it.
+        
+        Variables:
+            Entry                         ``tuple``
+                the sequence number in the spool and the message
+                
+            ReturnMessage                 ``dictionary or None``
+                the answer of the telegram server
+        """
+        self.Spool.Ack(Entry[0])
+        if ReturnMessage is not None:
+            self._SaveMessages_({"message":ReturnMessage["result"]})
+    
+    def _MessageFailed_(self, Entry, Error):
+        """
+        This method logs a message that has been given up and removes
+        it from the spool.
+        
+        Variables:
+            Entry                         ``tuple``
+                the sequence number in the spool and the message
+                
+            Error                         ``Exception``
+                the last error of the message
+        """
+        self.Spool.Ack(Entry[0])
+        self.LoggingObject.error(
+            self.TelegramApi._("The message to {ChatId} couldn't be sent "
+                               "and has been dropped: {Error}").format(
+                                            ChatId = Entry[1].ToChatId,
+                                            Error = repr(Error)))
+    
+    def _IsRunning_(self):
+        """
+        This method returns False as soon as no new work can arrive, 
+        that is if the server is shut down and the workers are done.
+        
+        Variables:
+            \-
+        """
+        return not (self.ShutDownEvent.is_set() and 
+                    self.WorkloadDoneEvent.is_set())
+    
+    def _IsOverdue_(self):
+        """
+        This method returns True if the deadline of the shutdown has 
+        passed, the messages not sent yet stay in the spool.
+        
+        Variables:
+            \-
+        """
+        return (self.ShutdownDeadline is not None and 
+                self.ShutdownDeadline.value > 0 and
+                time.time() >= self.ShutdownDeadline.value)
                 
     def run(self):
         # Start the telegram API.
         self.TelegramApi = self._StartApi_()
+        self._CheckDirectory_()
+        self.Spool = pipeline.spool.Spool(self.SpoolDirectory, 
+                                          SyncInterval = 
+                                              self.SpoolSyncInterval)
+        
+        # The sender keeps up to PoolSize requests in flight, one per 
+        # chat, so that the order inside of a chat is kept.
+        Sender = network.sender.AsyncSender(self.Scheduler,
+                                            self._ReceiveWorkload_,
+                                            self._SendSpooled_,
+                                            self._MessageSent_,
+                                            self.PoolSize,
+                                            self.Timeout * 10,
+                                            self.TelegramApi.Backoff,
+                                            self._MessageFailed_,
+                                            )
         # Check if there was any work from last start up.
-        #Workload = self._ReadWorkload_()
-        Run = True
-        while not self.ShutDownEvent.is_set():
-            while self.WorkloadQueue.qsize() > 0 and Run is True:
-                """if not self.ConnectionEvent.is_set():
-                    self._SaveWorkload_(Workload)
-                    self.ConnectionEvent.wait()
-                    Workload = self._ReadWorkload_()"""
-                    
-                
-                Command = self._GetCommand_()
-                
-                if Command is not None:
-                    if isinstance(Command, dir):
-                        self._InterpretCommand_(Command)
-                
-                Work = self._GetWorkload_(self.Timeout)
-                if Work is not None:
-                    
-                    ReturnMessage = self._SendToTelegram_(Work)
-                    self._SaveMessages_({"message":ReturnMessage["result"]})
-
-      
-        while not self.WorkloadDoneEvent.is_set():
-            Work = self._GetWorkload_(self.Timeout)
-            if Work is not None:
-                ReturnMessage = self._SendToTelegram_(Work)
-                self._SaveMessages_(ReturnMessage)
+        for Sequence, Work in self._ReadWorkload_():
+            Sender.Push(Work.ToChatId, (Sequence, Work))
+        
+        try:
+            Sender.Run(self._IsRunning_, self._IsOverdue_)
+        finally:
+            # the requests in flight are finished and acked before the
+            # spool is closed
+            Sender.Close()
+            # the messages still in the queue are moved to the spool, 
+            # they are sent after the next start
+            while self._ReceiveWorkload_(0, Bounded = False):
+                pass
+            self.Spool.Sync()
+            if len(self.Spool):
+                self.LoggingObject.warning(
+                    self.TelegramApi._("The shutdown deadline has passed, "
+                                       "{Amount} messages are kept in the "
+                                       "spool.").format(
+                                                Amount = len(self.Spool)))
+            self.Spool.Close()
+        
+        self._LogPoolStatistics_()
         
 class _TelegramApiServerComunicator(object):
     """
@@ -951,6 +1768,7 @@ class _TelegramApiServerComunicator(object):
                  ConnectionEvent,
                  WorkloadDoneEvent,
                  ShutDownEvent,
+                 Configuration = None,
                  ):
                 
         self.ControllerQueue = ControllerQueue
@@ -972,6 +1790,7 @@ class _TelegramApiServerComunicator(object):
         self.ConnectionEvent = ConnectionEvent
         self.WorkloadDoneEvent = WorkloadDoneEvent
         self.ShutdownEvent = ShutDownEvent
+        self.Configuration = Configuration
     
     def join(self):
         self.TelegramApiServer.join()
@@ -1008,6 +1827,20 @@ class _TelegramApiServerComunicator(object):
         """
         return self.TelegramApiServer
     
+    def is_alive(self):
+        return self.TelegramApiServer.is_alive()
+    
+    def Abort(self):
+        """
+        This method sends a SIGTERM to the server process, so that it
+        stops even if it's blocked in a request.
+        
+        Variables:
+            \-
+        """
+        if self.TelegramApiServer.is_alive():
+            self.TelegramApiServer.terminate()
+    
     def _SendCommandToServer_(self, Object,):
         """
         This method will send the send a command to the server.
@@ -1045,7 +1878,9 @@ class InputTelegramAPI(_TelegramApiServerComunicator):
                  SendMessagesQueue,
                  ConnectionEvent,
                  WorkloadDoneEvent,
-                 ShutDownEvent,):
+                 ShutDownEvent,
+                 Configuration = None,
+                 PressureEvent = None,):
         
         super().__init__(
                  Name="InputTelegramApiServer",
@@ -1059,7 +1894,9 @@ class InputTelegramAPI(_TelegramApiServerComunicator):
                  ConnectionEvent = ConnectionEvent,
                  WorkloadDoneEvent = WorkloadDoneEvent,
                  ShutDownEvent = ShutDownEvent,
+                 Configuration = Configuration,
         ) 
+        self.PressureEvent = PressureEvent
 
         self._InitTelegramServer_()
         
@@ -1081,6 +1918,8 @@ class InputTelegramAPI(_TelegramApiServerComunicator):
             ConnectionEvent = self.ConnectionEvent,
             WorkloadDoneEvent = self.WorkloadDoneEvent,
             ShutDownEvent = self.ShutdownEvent,
+            Configuration = self.Configuration,
+            PressureEvent = self.PressureEvent,
         )  
         
         self.TelegramApiServer.start()
@@ -1133,6 +1972,38 @@ class InputTelegramAPI(_TelegramApiServerComunicator):
         that the process may run.
         """
         self._SendCommandToServer_(self._PrepareServerCommand_("Run"))
+
+class WebhookTelegramAPI(InputTelegramAPI):
+    """
+    The child object that will either override or extend the parent 
+    class. 
+    It initialise the process that will recive the bot messages over
+    the webhook, instead of the getUpdates loop. As well as to
+    communicate with that process.
+    """ 
+    def _InitTelegramServer_(self):
+        """
+        This method is an override of the parent method.
+        
+        It simply starts the serverprocess.
+        """
+        self.TelegramApiServer = WebhookTelegramApiServer(
+            Name=self.Name,
+            ApiToken=self.ApiToken,
+            RequestTimer=self.RequestTimer,
+            LoggingObject = self.LoggingObject,
+            LanguageObject = self.LanguageObject,
+            ControllerQueue = self.ControllerQueue,
+            WorkloadQueue = self.WorkloadQueue,
+            SendMessagesQueue = self.SendMessagesQueue,
+            ConnectionEvent = self.ConnectionEvent,
+            WorkloadDoneEvent = self.WorkloadDoneEvent,
+            ShutDownEvent = self.ShutdownEvent,
+            Configuration = self.Configuration,
+            PressureEvent = self.PressureEvent,
+        )  
+        
+        self.TelegramApiServer.start()
             
 class OutputTelegramAPI(_TelegramApiServerComunicator):
     """
@@ -1151,7 +2022,10 @@ class OutputTelegramAPI(_TelegramApiServerComunicator):
                  SendMessagesQueue,
                  ConnectionEvent,
                  WorkloadDoneEvent,
-                 ShutDownEvent,):
+                 ShutDownEvent,
+                 Configuration = None,
+                 ShutdownDeadline = None,
+                 SchedulerDepth = None,):
         
         super().__init__(
                  Name="OutputTelegramApiServer",
@@ -1165,9 +2039,11 @@ class OutputTelegramAPI(_TelegramApiServerComunicator):
                  ConnectionEvent = ConnectionEvent,
                  WorkloadDoneEvent = WorkloadDoneEvent,
                  ShutDownEvent = ShutDownEvent,
+                 Configuration = Configuration,
                          )
         
-        
+        self.ShutdownDeadline = ShutdownDeadline
+        self.SchedulerDepth = SchedulerDepth
         
         self._InitTelegramServer_()
     
@@ -1191,7 +2067,10 @@ class OutputTelegramAPI(_TelegramApiServerComunicator):
             SendMessagesQueue = self.SendMessagesQueue,
             ConnectionEvent = self.ConnectionEvent,
             WorkloadDoneEvent = self.WorkloadDoneEvent,
-            ShutDownEvent = self.ShutdownEvent
+            ShutDownEvent = self.ShutdownEvent,
+            Configuration = self.Configuration,
+            ShutdownDeadline = self.ShutdownDeadline,
+            SchedulerDepth = self.SchedulerDepth,
         )
         
         self.TelegramApiServer.start()
@@ -1206,10 +2085,10 @@ class OutputTelegramAPI(_TelegramApiServerComunicator):
             \-
         """
         InputPipe, OutputPipe = multiprocessing.Pipe(False)
-        self._SendToServer_(self._PrepareServerCommand_("SaveWorkload", 
-                                                        OutputPipe
-                                                        )
-                            )
+        self._SendCommandToServer_(self._PrepareServerCommand_("SaveWorkload", 
+                                                               OutputPipe
+                                                               )
+                                   )
         self.ConnectionEvent.clear()
         Answser = InputPipe.recv()
         if Answser is True:
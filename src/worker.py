@@ -1,15 +1,30 @@
 #!/usr/bin/env python3.4
 # -*- coding: utf-8 -*-
+import os
+import gc
 import time
 import queue
+import ctypes
+import threading
+import traceback
 import multiprocessing
+import concurrent.futures
 import multiprocessing.managers
 
 import sql
 import gobjects
 import telegram
 import messages.save_sql
+import messages.batch
+import messages.user_cache
+import messages.session
 import messages.msg_processor
+import pipeline.ring
+import pipeline.codec
+import pipeline.autoscaler
+import pipeline.shard
+import pipeline.backpressure
+import pipeline.shutdown
 
 class MainWorker(multiprocessing.Process):
     '''
@@ -70,79 +85,272 @@ class MainWorker(multiprocessing.Process):
         self.WorkloadDoneEvent = None
         self.SqlDistributor = None
         
+        # the username of the bot, the commands addressed to other bots
+        # of a group are ignored
         if BotName is not None:
             self.BotName = BotName
         else:
-            self.BotName = gobjects.__AppName__
+            self.BotName = (self.Configuration["Telegram"].get("BotName") or
+                            gobjects.__AppName__)
         
+        # the number of the next worker, it's part of its name
         self.WorkerCount = 1
-        self.MaxWorkerCount = self.Configuration["Telegram"]["MaxWorker"]
+        self.MaxWorkerCount = int(MaxWorker)
         self.WorkerList = {}
         """
         ...code-block::python\n
             WorkerList = {
                 WorkerName: {
                     "WorkerName": WorkerName,
+                    "WorkerNumber": WorkerNumber,
                     "WorkerShutDownEvent": EventObject,
+                    "WorkerActivateEvent": EventObject,
+                    "WorkerQueue": RingQueue,
+                    "WorkerProgress": ValueObject,
                     "WorkerObject": ProcessObject,
-                    "WorkloadEvent": WorkloadEvent,
                 }
             }
         """
+        # the workers that finish their current message and stop
+        self.DrainingWorkers = []
+        # the started workers waiting to be activated, they have their
+        # database connection and catalogs ready
+        self.WarmWorkers = []
+        self.WarmPoolSize = int(self.Configuration["Telegram"].get(
+                                                        "WarmWorkers", 1))
+        
+        # the busy time of the workers, shared with them
+        self.WorkerStatistics = pipeline.autoscaler.WorkerStatistics()
+        self.Autoscaler = None
+        
+        # spreads the updates over the queues of the workers by chat
+        self.Dispatcher = None
+        self.DispatcherThread = None
+        self.DispatcherStopEvent = threading.Event()
+        
+        # pauses the input while the queues are too full
+        self.PressureEvent = None
+        self.Backpressure = pipeline.backpressure.BackpressureGate(
+            float(self.Configuration["Telegram"].get("HighWater", 0.8)),
+            float(self.Configuration["Telegram"].get("LowWater", 0.5)))
+        self.MessageQueueSize = int(self.Configuration["Telegram"].get(
+                                                "MessageQueueSize", 10000))
+        self.SchedulerLimit = max(1, int(self.Configuration["Telegram"].get(
+                                                "SchedulerLimit", 10000)))
+        
+        # the seconds the whole shutdown may take and the seconds a
+        # process may take after that, to finish what it's doing
+        self.ShutdownTimeout = float(self.Configuration["Telegram"].get(
+                                                "ShutdownTimeout", 30))
+        self.ShutdownGrace = float(self.Configuration["Telegram"].get(
+                                                "ShutdownGrace", 5))
+        # the time (as time.time) the draining stops, shared with the
+        # workers and the output process
+        self.ShutdownDeadline = None
+        # the updates that couldn't be processed before the deadline
+        self.SpillDirectory = os.path.abspath(os.path.join("SavedWorkload", 
+                                                           "Updates"))
 
     
-    def _ShutdownWorker_(self, Worker):
+    def _ShutdownWorker_(self, Worker, Wait = True):
         """
         This method will shutdown a worker and end the process.
         
+        The worker doesn't get any new update, but it finishes the
+        updates already in its queue, so that no chat loses an update.
+        
         Variables:
             Worker                        ``directory``
                 it's a part of the objects workerlist, it will be 
                 shutdown overtime.
+                
+            Wait                          ``boolean``
+                if the method waits for the end of the process, else
+                the process is joined by _ReapWorkers_
         """
+        self.Dispatcher.RemoveShard(Worker["WorkerName"])
         Worker["WorkerShutDownEvent"].set()
-        Worker["WorkerObject"].join()
         del self.WorkerList[Worker["WorkerName"]]
-        self.WorkerCount -= 1
+        if Wait is True:
+            Worker["WorkerObject"].join()
+        else:
+            self.DrainingWorkers.append(Worker)
+    
+    def _ReapWorkers_(self):
+        """
+        This method joins the drained workers that have stopped and 
+        replaces the active workers that have died. The updates left in
+        the queue of a dead worker are sent to the other workers.
+        """
+        for Worker in list(self.DrainingWorkers):
+            if not Worker["WorkerObject"].is_alive():
+                Worker["WorkerObject"].join()
+                self.DrainingWorkers.remove(Worker)
+                if Worker["WorkerObject"].exitcode:
+                    self._RecoverWorker_(Worker)
+        for Worker in list(self.WorkerList.values()):
+            if Worker["WorkerObject"].is_alive():
+                continue
+            self.Logging.error(
+                self._("{Name} has died with the exit code {Code}, it's "
+                       "replaced.").format(
+                                Name = Worker["WorkerName"],
+                                Code = Worker["WorkerObject"].exitcode))
+            self.Dispatcher.RemoveShard(Worker["WorkerName"])
+            del self.WorkerList[Worker["WorkerName"]]
+            Worker["WorkerObject"].join()
+            self._RecoverWorker_(Worker)
+            self._StartWorker_()
+    
+    def _RecoverWorker_(self, Worker):
+        """
+        This method hands the updates left in the queue of a dead worker
+        to the dispatcher again.
+        """
+        Amount = self.Dispatcher.Recover(Worker["WorkerName"], 
+                                         Worker["WorkerQueue"])
+        if Amount:
+            self.Logging.warning(
+                self._("{Amount} updates of {Name} are sent to the other "
+                       "workers.").format(Amount = Amount,
+                                          Name = Worker["WorkerName"]))
+    
+    def _GetYoungestWorker_(self):
+        """
+        This method returns the worker that was started last.
+        """
+        return max(self.WorkerList.values(), 
+                   key = lambda Worker: Worker["WorkerNumber"])
         
+    def _ReportDrain_(self, Report):
+        """
+        This method logs the progress of a stage of the shutdown.
+        """
+        self.Logging.info(
+            self._("Shutting down {Stage}: {Left} left, {Remaining}s until "
+                   "the deadline").format(**Report))
+    
+    def _SpillInput_(self):
+        """
+        This method writes the updates that haven't been handed to a 
+        worker to the disk, they are processed after the next start.
+        """
+        def Leftovers():
+            for Update in self.Dispatcher.TakeParked():
+                yield Update
+            while True:
+                try:
+                    yield self.InputAPI["WorkerQueue"].get_nowait()
+                except queue.Empty:
+                    return
+        Amount = pipeline.shutdown.Spill(
+                    os.path.join(self.SpillDirectory, self.name), Leftovers())
+        if Amount:
+            self.Logging.warning(
+                self._("{Amount} updates have been saved for the next "
+                       "start.").format(Amount = Amount))
+    
     def _ShutdownAll_(self):
         """
         This method will shutdown all the processes.
+        
+        The stages are drained one after the other until the 
+        ShutdownTimeout is over, the workers all at the same time. 
+        What's left at the deadline is saved to the disk.
         """
+        Coordinator = pipeline.shutdown.ShutdownCoordinator(
+                                            self.ShutdownTimeout,
+                                            Report = self._ReportDrain_)
         # tell all the process to shutdown
         self.InputAPI["ShutdownEvent"].set()
-        # wait until the input process finished it's work
-        self.InputAPI["WorkloadEvent"].wait()
+        # a long polling request can take longer than the shutdown, the 
+        # updates of an aborted request are fetched again after the 
+        # next start
+        Coordinator.WaitFor("Input", 
+                            lambda: not self.InputAPI["Object"].is_alive(),
+                            Timeout = self.ShutdownTimeout / 3)
+        if self.InputAPI["Object"].is_alive():
+            self.InputAPI["Object"].Abort()
         self.InputAPI["Object"].join()
 
-        while not self.InputAPI["WorkerQueue"].empty():
-            time.sleep(0.1)
-        # signal all the worker that the system is shutting down.            
-        for Worker in list(self.WorkerList.keys()):
-            self._ShutdownWorker_(self.WorkerList[Worker])
+        # every update should be in the queue of a worker, before the
+        # workers drain them, but the workers need some time too
+        Coordinator.WaitFor("Dispatcher", self.Dispatcher.IsIdle, 
+                            self.Dispatcher.GetDepth,
+                            Timeout = Coordinator.GetRemaining() / 2)
+        self.DispatcherStopEvent.set()
+        self.DispatcherThread.join()
+        self._SpillInput_()
+        
+        # signal all the worker that the system is shutting down, they
+        # process their queues until the deadline and save the rest
+        self.ShutdownDeadline.value = Coordinator.GetWallDeadline()
+        Workers = (list(self.WorkerList.values()) + self.WarmWorkers + 
+                   self.DrainingWorkers)
+        for Worker in list(self.WorkerList.values()):
+            self._ShutdownWorker_(Worker, Wait = False)
+        for Worker in self.WarmWorkers:
+            Worker["WorkerShutDownEvent"].set()
+        Alive = Coordinator.Join("Workers", 
+                                 [Worker["WorkerObject"] for Worker in Workers],
+                                 lambda: sum(Worker["WorkerQueue"].qsize() 
+                                             for Worker in Workers),
+                                 Grace = self.ShutdownGrace)
+        for Process in Alive:
+            self.Logging.error(
+                self._("{Name} didn't stop in time and is killed.").format(
+                                                        Name = Process.name))
+            Process.terminate()
+            Process.join()
+        self.DrainingWorkers = []
+        self.WarmWorkers = []
         
-        # shutdown the output process
+        # shutdown the output process, the messages it can't send until 
+        # the deadline stay in its spool
         
         self.OutputAPI["ShutdownEvent"].set()
         self.OutputAPI["WorkloadEvent"].set()
+        Coordinator.Join("Output", [self.OutputAPI["Object"]],
+                         self.OutputAPI["WorkerQueue"].qsize,
+                         Grace = self.ShutdownGrace)
+        if self.OutputAPI["Object"].is_alive():
+            self.OutputAPI["Object"].Abort()
         self.OutputAPI["Object"].join()
         
         #shutdown the message server process
 
         self.MessageLogger["ShutdownEvent"].set()
         self.MessageLogger["WorkloadEvent"].set()
+        Coordinator.Join("Messages", [self.MessageLogger["Object"]],
+                         Grace = self.ShutdownGrace)
+        if self.MessageLogger["Object"].is_alive():
+            self.MessageLogger["Object"].terminate()
         self.MessageLogger["Object"].join()
         
+        self.Logging.info(
+            self._("The shutdown took {Seconds}s: {Stages}").format(
+                                                **Coordinator.GetMetrics()))
         # shuting down the manager 
         self.ManagerObject.shutdown()
            
-    def _StartWorker_(self,):
-        
+    def _CreateWorker_(self):
+        """
+        This method starts a new worker process, it waits for its 
+        WorkerActivateEvent before it takes any work.
+        """
         WorkerName = "{}{}".format(MainWorker.DEFAULT_WORKER_NAME, 
                                    self.WorkerCount
                                    )
         ProcessShutdownEvent = multiprocessing.Event()
-        #ProcessShutdownEvent.set()
+        ActivateEvent = multiprocessing.Event()
+        # every worker has its own queue, the dispatcher puts the updates
+        # of a chat always into the same one
+        WorkerQueue = pipeline.ring.RingQueue(self.RingBufferSize,
+                                              pipeline.codec.Dumps,
+                                              pipeline.codec.Loads)
+        # the sequence number of the last processed update, it's only
+        # written by the worker
+        Progress = multiprocessing.RawValue(ctypes.c_uint64, 0)
         Worker = SubWorker(
                            # Whatever
                         BotName = self.BotName,
@@ -152,18 +360,56 @@ class MainWorker(multiprocessing.Process):
                         Logging = self.Logging.GetProcessenderW(),
                         LanguageObject = self.LanguageObject,
                         SqlObject = self.SqlDistributor,
-                        InputQueue = self.InputAPI["WorkerQueue"],
+                        InputQueue = WorkerQueue,
                         OutputQueue = self.OutputAPI["WorkerQueue"],
+                        Statistics = self.WorkerStatistics,
+                        ActivateEvent = ActivateEvent,
+                        Progress = Progress,
+                        ShutdownDeadline = self.ShutdownDeadline,
+                        SpillDirectory = os.path.join(self.SpillDirectory,
+                                                      WorkerName),
+                        UserInvalidations = self.UserInvalidations,
+                        SessionVersions = self.SessionVersions,
                         )       
         
         Worker.start()
-        
-        self.WorkerList[WorkerName] = {
-                            "WorkerName": WorkerName,
-                            "WorkerShutDownEvent":ProcessShutdownEvent,
-                            "WorkerObject":Worker            
-                                         }
         self.WorkerCount += 1
+        
+        return {
+                "WorkerName": WorkerName,
+                "WorkerNumber": self.WorkerCount - 1,
+                "WorkerShutDownEvent":ProcessShutdownEvent,
+                "WorkerActivateEvent":ActivateEvent,
+                "WorkerQueue":WorkerQueue,
+                "WorkerProgress":Progress,
+                "WorkerObject":Worker            
+                }
+    
+    def _FillWarmPool_(self):
+        """
+        This method starts warm workers until there are WarmPoolSize 
+        of them, but not more than could still be activated.
+        """
+        while (len(self.WarmWorkers) < self.WarmPoolSize and 
+               len(self.WarmWorkers) + len(self.WorkerList) < 
+                   self.MaxWorkerCount):
+            self.WarmWorkers.append(self._CreateWorker_())
+    
+    def _StartWorker_(self,):
+        """
+        This method activates a warm worker, if there is one, else a
+        new worker is started. The warm pool is refilled afterwards.
+        """
+        if self.WarmWorkers:
+            Worker = self.WarmWorkers.pop(0)
+        else:
+            Worker = self._CreateWorker_()
+        Worker["WorkerActivateEvent"].set()
+        self.WorkerList[Worker["WorkerName"]] = Worker
+        self.Dispatcher.AddShard(Worker["WorkerName"], 
+                                 Worker["WorkerQueue"],
+                                 Worker["WorkerProgress"])
+        self._FillWarmPool_()
                 
     def _InitialiseAPI_(self):
         """
@@ -176,7 +422,8 @@ class MainWorker(multiprocessing.Process):
         self.ManagerObject.start()
         # This is the message saving queue that will be used from the 
         # beginning
-        self.MessageLogger["WorkerQueue"] = self.ManagerObject.Queue()        
+        self.MessageLogger["WorkerQueue"] = self.ManagerObject.Queue(
+                                                    self.MessageQueueSize)
         
         self.SqlDistributor = sql.DistributorApi(
                     User = self.Configuration["Security"]["DatabaseUser"],
@@ -190,30 +437,38 @@ class MainWorker(multiprocessing.Process):
                     )
         
         self.ConnectionEvent = self.ManagerObject.Event()
+        self.PressureEvent = self.ManagerObject.Event()
+        self.ShutdownDeadline = multiprocessing.RawValue(ctypes.c_double, 0)
+        # the users changed by a worker are forgotten by the caches of
+        # the other ones
+        self.UserInvalidations = messages.user_cache.InvalidationLog()
+        # the changes of the sessions that haven't been written back yet
+        self.SessionVersions = messages.session.SessionVersions()
         
         # starting the messages reciver 
         self.InputAPI["WorkloadEvent"] = self.ManagerObject.Event()
         self.InputAPI["ShutdownEvent"] = self.ManagerObject.Event()
-        self.InputAPI["WorkerQueue"] = self.ManagerObject.Queue()
+        # The updates and the answers go through shared memory, not
+        # through the manager process, written by the compact codec.
+        self.RingBufferSize = int(self.Configuration["Telegram"].get(
+                                                    "RingBufferSize", 1 << 22))
+        self.InputAPI["WorkerQueue"] = pipeline.ring.RingQueue(
+                                                    self.RingBufferSize,
+                                                    pipeline.codec.Dumps,
+                                                    pipeline.codec.Loads)
         self.InputAPI["ControlQueue"] = self.ManagerObject.Queue()
         
-        self.InputAPI["Object"] = telegram.InputTelegramAPI(
-                 ApiToken = self.Configuration["Security"]["TelegramToken"],
-                 RequestTimer = self.Configuration["Telegram"]["RequestTimer"],
-                 LoggingObject = self.Logging,
-                 LanguageObject = self.LanguageObject,
-                 ControllerQueue = self.InputAPI["ControlQueue"],
-                 WorkloadQueue = self.InputAPI["WorkerQueue"],
-                 SendMessagesQueue = self.MessageLogger["WorkerQueue"],
-                 ConnectionEvent = self.ConnectionEvent,
-                 WorkloadDoneEvent = self.InputAPI["WorkloadEvent"],
-                 ShutDownEvent = self.InputAPI["ShutdownEvent"],
-                 )
         # starting the message sender
         self.OutputAPI["WorkloadEvent"] = self.ManagerObject.Event()
         self.OutputAPI["ShutdownEvent"] = self.ManagerObject.Event()
-        self.OutputAPI["WorkerQueue"] = self.ManagerObject.Queue()
+        self.OutputAPI["WorkerQueue"] = pipeline.ring.RingQueue(
+                                                    self.RingBufferSize,
+                                                    pipeline.codec.Dumps,
+                                                    pipeline.codec.Loads)
         self.OutputAPI["ControlQueue"] = self.ManagerObject.Queue()
+        # the messages waiting in the scheduler of the output process
+        self.OutputAPI["SchedulerDepth"] = multiprocessing.RawValue(
+                                                        ctypes.c_uint64, 0)
         
         self.OutputAPI["Object"] = telegram.OutputTelegramAPI(
                  ApiToken = self.Configuration["Security"]["TelegramToken"],
@@ -226,10 +481,59 @@ class MainWorker(multiprocessing.Process):
                  ConnectionEvent = self.ConnectionEvent,
                  WorkloadDoneEvent = self.OutputAPI["WorkloadEvent"],
                  ShutDownEvent = self.OutputAPI["ShutdownEvent"],
+                 Configuration = self.Configuration,
+                 ShutdownDeadline = self.ShutdownDeadline,
+                 SchedulerDepth = self.OutputAPI["SchedulerDepth"],
                  )
         
+        # The objects created so far are never freed, the garbage 
+        # collector of the forked workers doesn't have to touch (and
+        # copy) their memory pages.
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+        
         # starting the main message analysier process
+        self.Dispatcher = pipeline.shard.ShardDispatcher(
+                                                self.InputAPI["WorkerQueue"])
         self._StartWorker_()
+        self.DispatcherThread = threading.Thread(
+                                    target = self.Dispatcher.Run,
+                                    args = (self.DispatcherStopEvent,),
+                                    name = "Dispatcher",
+                                    daemon = True)
+        self.DispatcherThread.start()
+        
+        # the updates saved at the last shutdown are older than the ones
+        # the input process is going to get
+        Amount = pipeline.shutdown.Restore(self.SpillDirectory,
+                                           self.InputAPI["WorkerQueue"].put)
+        if Amount:
+            self.Logging.info(
+                self._("{Amount} updates saved at the last shutdown have "
+                       "been restored.").format(Amount = Amount))
+        
+        # the updates are either polled from the telegram servers or
+        # pushed by them to the webhook 
+        if (self.Configuration["Telegram"].get("UpdateMode", "polling"
+                                               ).lower() == "webhook"):
+            InputApiClass = telegram.WebhookTelegramAPI
+        else:
+            InputApiClass = telegram.InputTelegramAPI
+        
+        self.InputAPI["Object"] = InputApiClass(
+                 ApiToken = self.Configuration["Security"]["TelegramToken"],
+                 RequestTimer = self.Configuration["Telegram"]["RequestTimer"],
+                 LoggingObject = self.Logging,
+                 LanguageObject = self.LanguageObject,
+                 ControllerQueue = self.InputAPI["ControlQueue"],
+                 WorkloadQueue = self.InputAPI["WorkerQueue"],
+                 SendMessagesQueue = self.MessageLogger["WorkerQueue"],
+                 ConnectionEvent = self.ConnectionEvent,
+                 WorkloadDoneEvent = self.InputAPI["WorkloadEvent"],
+                 ShutDownEvent = self.InputAPI["ShutdownEvent"],
+                 Configuration = self.Configuration,
+                 PressureEvent = self.PressureEvent,
+                 )
                 
         # starting the message saver        
         self.MessageLogger["ShutdownEvent"] = self.ManagerObject.Event() 
@@ -243,29 +547,94 @@ class MainWorker(multiprocessing.Process):
                                     )  
         self.MessageLogger["Object"].start()
 
+    def _CreateAutoscaler_(self):
+        """
+        This method creates the autoscaler from the configuration.
+        """
+        Telegram = self.Configuration["Telegram"]
+        return pipeline.autoscaler.Autoscaler(
+            MinWorkers = int(Telegram.get("MinWorker", 1)),
+            MaxWorkers = self.MaxWorkerCount,
+            TargetUtilization = float(Telegram.get("TargetUtilization", 
+                                                   0.7)),
+            LowUtilization = float(Telegram.get("LowUtilization", 0.3)),
+            TargetDelay = float(Telegram.get("TargetDelay", 1.0)),
+            UpCooldown = float(Telegram.get("ScaleUpCooldown", 5.0)),
+            DownCooldown = float(Telegram.get("ScaleDownCooldown", 60.0)),
+            )
+    
+    def _CheckPressure_(self):
+        """
+        This method pauses the input if one of the queues is above the
+        high water mark and resumes it once all are below the low water
+        mark.
+        """
+        Fills = {
+            "Input": pipeline.backpressure.GetFill(self.InputAPI["WorkerQueue"]),
+            "Output": pipeline.backpressure.GetFill(
+                                                self.OutputAPI["WorkerQueue"]),
+            "Messages": pipeline.backpressure.GetFill(
+                                                self.MessageLogger["WorkerQueue"],
+                                                self.MessageQueueSize),
+            "Scheduler": min(1.0, self.OutputAPI["SchedulerDepth"].value / 
+                                  self.SchedulerLimit),
+            }
+        for Worker in self.WorkerList.values():
+            Fills[Worker["WorkerName"]] = pipeline.backpressure.GetFill(
+                                                        Worker["WorkerQueue"])
+        
+        WasPaused = self.Backpressure.Paused
+        if self.Backpressure.Sample(Fills) == WasPaused:
+            return
+        if self.Backpressure.Paused:
+            self.PressureEvent.set()
+            self.Logging.warning(
+                self._("The queues are full, the input is paused: {Metrics}"
+                       ).format(Metrics = self.Backpressure.GetMetrics()))
+        else:
+            self.PressureEvent.clear()
+            self.Logging.info(
+                self._("The queues have been drained, the input is resumed: "
+                       "{Metrics}").format(
+                                    Metrics = self.Backpressure.GetMetrics()))
+    
+    def _Scale_(self):
+        """
+        This method samples the load and starts or stops workers if the
+        autoscaler wants to.
+        """
+        self._ReapWorkers_()
+        self._FillWarmPool_()
+        Decision = self.Autoscaler.Sample(len(self.WorkerList),
+                                          self.Dispatcher.GetDepth(),
+                                          *self.WorkerStatistics.Get())
+        if Decision.Target == Decision.Workers:
+            return Decision
+        
+        self.Logging.info(
+            self._("Scaling the workers from {Workers} to {Target}: "
+                   "{Reason} {Metrics}").format(Workers = Decision.Workers,
+                                 Target = Decision.Target,
+                                 Reason = Decision.Reason,
+                                 Metrics = self.Autoscaler.GetMetrics()))
+        for Number in range(Decision.Workers, Decision.Target):
+            self._StartWorker_()
+        for Number in range(Decision.Target, Decision.Workers):
+            # the youngest worker drains, the others go on
+            self._ShutdownWorker_(self._GetYoungestWorker_(), Wait = False)
+        return Decision
+    
     def run(self):
+        self._ = self.LanguageObject.CreateTranslationObject().gettext
         self._InitialiseAPI_()
-        LastLoad = None
+        self.Autoscaler = self._CreateAutoscaler_()
+        Interval = float(self.Configuration["Telegram"].get("ScaleInterval",
+                                                            0.5))
         try:
             while not self.ShutdownEvent.is_set():
-                WorkloadAmount = self.InputAPI["WorkerQueue"].qsize()
-                Workload = (WorkloadAmount / 30)
-                LastLoad = Workload
-                
-                WorkerAmmount = self.WorkerCount
-                
-                if Workload > WorkerAmmount:
-                    # creat a new worker.
-                    if self.MaxWorker >= WorkerAmmount:
-                        self.StartWorker()
-                elif Workload < WorkerAmmount:
-                    # shutdown the yongest worker if needed
-                    if Workload > 1:
-                        self._ShutdownWorker_(sorted(self.WorkerList.keys(),
-                                                      reverse=True)
-                                              )
-                
-                time.sleep(0.5)    
+                self._Scale_()
+                self._CheckPressure_()
+                time.sleep(Interval)    
         # shutting down all the subprocesses.
         finally:
             self._ShutdownAll_()
@@ -282,6 +651,13 @@ class SubWorker(multiprocessing.Process):
                  SqlObject,
                  InputQueue,
                  OutputQueue,
+                 Statistics = None,
+                 ActivateEvent = None,
+                 Progress = None,
+                 ShutdownDeadline = None,
+                 SpillDirectory = None,
+                 UserInvalidations = None,
+                 SessionVersions = None,
                  ):
         '''
         Constructor
@@ -297,6 +673,37 @@ class SubWorker(multiprocessing.Process):
         self.SqlObject = SqlObject
         self.InputQueue = InputQueue
         self.OutputQueue = OutputQueue
+        # the time spent on the messages, for the autoscaler
+        self.Statistics = Statistics
+        # a warm worker waits for this event before it takes any work,
+        # None starts at once
+        self.ActivateEvent = ActivateEvent
+        # if set, the queue holds the updates of the chats of this worker
+        # as (sequence number, update), after an update has been 
+        # processed its number is stored in it
+        self.Progress = Progress
+        # the time (as time.time) the draining of the queue stops, the
+        # rest is saved to the SpillDirectory
+        self.ShutdownDeadline = ShutdownDeadline
+        self.SpillDirectory = SpillDirectory
+        # the maximal amount of updates processed together
+        self.BatchSize = max(1, int(self.Configuration["Telegram"].get(
+                                                        "BatchSize", 32)))
+        # the threads processing the updates, every thread has its own
+        # database connection, 1 processes them in the worker itself
+        self.ThreadCount = max(1, int(self.Configuration["Telegram"].get(
+                                                        "WorkerThreads", 1)))
+        self.ThreadPool = None
+        self.ThreadSqlObjects = []
+        # the recently seen users, the cache is created in the process
+        self.UserInvalidations = UserInvalidations
+        self.UserCache = None
+        # the sessions of the users, written back to the database in 
+        # batches, the store is created in the process
+        self.SessionVersions = SessionVersions
+        self.Sessions = None
+        self._ThreadData = None
+        self._ThreadLock = None
     
     def _GetWorkFromQueue_(self, Timeout = 0.05):
         Work = None
@@ -312,38 +719,247 @@ class SubWorker(multiprocessing.Process):
         
         return Work        
     
+    def _GetBatchFromQueue_(self, Timeout = 0.05):
+        """
+        This method waits up to Timeout seconds for an update and takes
+        the updates waiting behind it, up to BatchSize of them.
+        """
+        Work = self._GetWorkFromQueue_(Timeout)
+        if Work is None:
+            return []
+        Batch = [Work]
+        while len(Batch) < self.BatchSize:
+            try:
+                Batch.append(self.InputQueue.get_nowait())
+            except queue.Empty:
+                break
+        return Batch
+    
+    def _ProcessBatch_(self, Updates, SqlObject = None):
+        """
+        This method processes the updates with a single cursor, the
+        users and their sessions are loaded once for all of them and 
+        the changes are committed once at the end.
+        """
+        if SqlObject is None:
+            SqlObject = self.SqlObject
+        Cursor = SqlObject.CreateCursor()
+        SqlObject.BeginBatch()
+        try:
+            Batch = messages.batch.Batch.Load(SqlObject, Cursor, Updates,
+                                              self.UserCache, self.Sessions)
+            for Work in Updates:
+                # a broken update doesn't take the worker and the rest
+                # of the batch with it
+                try:
+                    MessageProcessor = messages.msg_processor.MessageProcessor(
+                                Work,
+                                OutputQueue = self.OutputQueue, 
+                                LanguageObject = self.LanguageObject,
+                                SqlObject = SqlObject,
+                                Cursor = Cursor,
+                                LoggingObject = self.Logging,
+                                ConfigurationObject = self.Configuration,
+                                Batch = Batch,
+                                UserCache = self.UserCache,
+                                Sessions = self.Sessions,
+                                BotName = self.BotName,
+                                )
+                    MessageProcessor.InterpretMessage()
+                except Exception:
+                    self.Logging.error(
+                        self._("The update {Id} couldn't be processed:\n"
+                               "{Error}").format(
+                                    Id = Work.get("update_id"),
+                                    Error = traceback.format_exc()))
+            # the sessions are committed on their own, the other workers
+            # wait for them
+            if self.Sessions is not None:
+                self.Sessions.FlushIfDue(SqlObject, Cursor)
+        finally:
+            SqlObject.EndBatch()
+            SqlObject.DestroyCursor(Cursor)
+    
+    def _FlushSessions_(self, Force = False):
+        """
+        This method writes the changed sessions back, at once if Force
+        is True, when they are due otherwise.
+        """
+        if self.Sessions is None:
+            return
+        Cursor = self.SqlObject.CreateCursor()
+        try:
+            if Force:
+                self.Sessions.Flush(self.SqlObject, Cursor)
+            else:
+                self.Sessions.FlushIfDue(self.SqlObject, Cursor)
+        finally:
+            self.SqlObject.DestroyCursor(Cursor)
+    
+    def _StartThreadPool_(self, SqlDistributor):
+        """
+        This method starts the threads of the worker, if it has more
+        than one.
+        """
+        if self.ThreadCount < 2:
+            return
+        self._SqlDistributor = SqlDistributor
+        self._ThreadData = threading.local()
+        self._ThreadLock = threading.Lock()
+        self.ThreadPool = concurrent.futures.ThreadPoolExecutor(
+                                                    self.ThreadCount)
+    
+    def _GetThreadSqlObject_(self):
+        """
+        This method returns the database connection of the current 
+        thread, it's opened on its first use.
+        """
+        SqlObject = getattr(self._ThreadData, "SqlObject", None)
+        if SqlObject is None:
+            SqlObject = self._SqlDistributor.New()
+            self._ThreadData.SqlObject = SqlObject
+            with self._ThreadLock:
+                self.ThreadSqlObjects.append(SqlObject)
+        return SqlObject
+    
+    def _ProcessGroup_(self, Updates):
+        self._ProcessBatch_(Updates, self._GetThreadSqlObject_())
+    
+    def _ProcessConcurrently_(self, Updates):
+        """
+        This method processes the updates in the threads, so that their
+        waits for the database overlap. The updates of a chat or of a 
+        user stay in a single thread and in their order, the batch is 
+        done when this method returns.
+        """
+        Groups = messages.batch.Batch.GroupIndependent(Updates)
+        if len(Groups) == 1:
+            self._ProcessGroup_(Groups[0])
+            return
+        Futures = [self.ThreadPool.submit(self._ProcessGroup_, Group)
+                   for Group in Groups]
+        concurrent.futures.wait(Futures)
+        # an error is raised like in the worker itself, but only after
+        # the other chats of the batch are done
+        for Future in Futures:
+            Future.result()
+    
+    def _StopThreadPool_(self):
+        """
+        This method waits for the threads and closes their database
+        connections.
+        """
+        if self.ThreadPool is None:
+            return
+        self.ThreadPool.shutdown(wait = True)
+        for SqlObject in self.ThreadSqlObjects:
+            SqlObject.CloseConnection()
+        self.ThreadSqlObjects = []
+    
+    def _ProcessWork_(self, Work):
+        """
+        This method processes the work taken from the queue and returns
+        the amount of updates in it.
+        """
+        if self.Progress is None:
+            Updates = Work
+        else:
+            Updates = [Update for Sequence, Update in Work]
+        if self.ThreadPool is not None:
+            self._ProcessConcurrently_(Updates)
+        else:
+            self._ProcessBatch_(Updates)
+        if self.Progress is not None:
+            self.Progress.value = Work[-1][0]
+        return len(Work)
+    
+    def _IsOverdue_(self):
+        return (self.ShutdownDeadline is not None and 
+                self.ShutdownDeadline.value > 0 and 
+                time.time() >= self.ShutdownDeadline.value)
+    
+    def _Drain_(self):
+        """
+        This method processes the updates left in the own queue of the
+        worker, after it got the shutdown event. The updates left at the
+        deadline of the shutdown are saved for the next start.
+        """
+        if self.Progress is None:
+            return
+        Work = self._GetBatchFromQueue_(0)
+        while Work and not self._IsOverdue_():
+            self._ProcessWork_(Work)
+            Work = self._GetBatchFromQueue_(0)
+        if not Work or self.SpillDirectory is None:
+            return
+        
+        def Leftovers(Work):
+            while Work:
+                for Sequence, Update in Work:
+                    yield Update
+                Work = self._GetBatchFromQueue_(0)
+        pipeline.shutdown.Spill(self.SpillDirectory, Leftovers(Work))
+    
+    def _WaitForActivation_(self):
+        """
+        This method blocks until the worker is activated or shut down, 
+        the database connection is kept alive meanwhile.
+        """
+        LastWakeUp = time.time()
+        while not self.ShutdownEvent.is_set():
+            if self.ActivateEvent.wait(1):
+                return
+            if (time.time() - LastWakeUp) > 3600:
+                self._WakeUPMySql()
+                LastWakeUp = time.time()
+    
     def run(self):
+        # everything the first message needs is prepared before the 
+        # worker is activated
+        SqlDistributor = self.SqlObject
         self.SqlObject = self.SqlObject.New()
+        self._ = self.LanguageObject.CreateTranslationObject().gettext
+        self.UserCache = messages.user_cache.UserCache(
+                MaxSize = int(self.Configuration["Telegram"].get(
+                                                "UserCacheSize", 10000)),
+                TimeToLive = float(self.Configuration["Telegram"].get(
+                                                "UserCacheTime", 300)),
+                Invalidations = self.UserInvalidations)
+        if self.Configuration["Telegram"].get("SessionStore",
+                                              "memory") == "memory":
+            self.Sessions = messages.session.MemorySessionStore(
+                TimeToLive = float(self.Configuration["Telegram"].get(
+                                                "SessionTime", 3600)),
+                FlushInterval = float(self.Configuration["Telegram"].get(
+                                                "SessionFlushInterval", 1.0)),
+                Versions = self.SessionVersions)
+        self._StartThreadPool_(SqlDistributor)
         try:
+            if self.ActivateEvent is not None:
+                self._WaitForActivation_()
             LastMessageTime = time.time() # this is the last time a message has been sent. Defaults to the init time
             while not self.ShutdownEvent.is_set():
                 Timeout = 1
 
-                Work = self._GetWorkFromQueue_(Timeout)
-                if Work is not None:
+                Work = self._GetBatchFromQueue_(Timeout)
+                if Work:
                     #set the last time 
                     LastMessageTime = time.time()
-                    # create cursor object for the request
-                    Cursor = self.SqlObject.CreateCursor()
+                    Start = time.monotonic()
                     
-                    MessageProcessor = messages.msg_processor.MessageProcessor(
-                                    Work,
-                                    OutputQueue = self.OutputQueue, 
-                                    LanguageObject = self.LanguageObject,
-                                    SqlObject = self.SqlObject,
-                                    Cursor = Cursor,
-                                    LoggingObject = self.Logging,
-                                    ConfigurationObject = self.Configuration
-                                    )
-                    InterpretedMessage = MessageProcessor.InterpretMessage()
+                    Amount = self._ProcessWork_(Work)
                     
-
-                    # destroy it
-                    self.SqlObject.DestroyCursor(Cursor)
+                    if self.Statistics is not None:
+                        self.Statistics.Record(time.monotonic() - Start,
+                                               Amount)
                 else:
+                    self._FlushSessions_()
                     if (time.time() - LastMessageTime) > 3600:
                         self._WakeUPMySql()
+            self._Drain_()
         finally:    
+            self._StopThreadPool_()
+            self._FlushSessions_(Force = True)
             self.SqlObject.CloseConnection()
             
     def _WakeUPMySql(self):
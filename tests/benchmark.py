@@ -0,0 +1,230 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module measures the throughput and the latency of the telegram
+    processes against the fake bot API.
+
+    The updates generated by the fake API are received by the input
+    process, answered by an echo stage (instead of the SubWorkers,
+    which need the database) and sent by the output process. The time
+    from the creation of an update to the arrival of its answer is
+    measured by the fake API.
+
+    Example:
+        python3 benchmark.py --rate 200 --chats 50 --total 2000
+'''
+import os
+import sys
+import time
+import queue
+import shutil
+import gettext
+import logging
+import argparse
+import tempfile
+import threading
+import multiprocessing
+import multiprocessing.managers
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import telegram
+import messages.message
+import pipeline.ring
+import pipeline.codec
+
+from fake_telegram_api import FakeTelegramApi
+
+
+class BenchmarkLanguage(object):
+    """
+    This class replaces language.Language, there are no compiled
+    translations needed.
+    """
+    def CreateTranslationObject(self, Languages = None):
+        return gettext.NullTranslations()
+
+def Echo(InputQueue, OutputQueue, StopEvent):
+    """
+    This function answers every update with a message that contains its
+    update id, until the StopEvent is set and the input queue is empty.
+    """
+    while True:
+        try:
+            Update = InputQueue.get(timeout = 0.1)
+        except queue.Empty:
+            if StopEvent.is_set():
+                return
+            continue
+        OutputQueue.put(messages.message.MessageToBeSend(
+                            ToChatId = Update["message"]["chat"]["id"],
+                            Text = "echo {}".format(Update["update_id"])))
+
+def RunBenchmark(Rate = 100,
+                 Chats = 10,
+                 Groups = 0,
+                 Total = 1000,
+                 RateLimitProbability = 0.0,
+                 SendDelay = 0.0,
+                 Telegram = None,
+                 Timeout = 120,
+                 Queues = "ring"):
+    """
+    This function runs one benchmark and returns the statistics.
+
+    Variables:
+        Rate                              ``float``
+            the updates per second generated by the fake API
+
+        Chats                             ``integer``
+            the amount of private chats the updates are spread over
+
+        Groups                            ``integer``
+            the amount of groups the updates are spread over
+
+        Total                             ``integer``
+            the amount of updates
+
+        RateLimitProbability              ``float``
+            the probability of a 429 answer to a sendMessage
+
+        SendDelay                         ``float``
+            the seconds every sendMessage takes on the fake API
+
+        Telegram                          ``dictionary``
+            options of the Telegram section of the configuration
+
+        Timeout                           ``float``
+            the maximal seconds to wait for all the answers
+
+        Queues                            ``string``
+            "ring" for the shared memory queues of the MainWorker, 
+            "manager" for the queues of the SyncManager
+    """
+    Api = FakeTelegramApi(RateLimitProbability = RateLimitProbability,
+                          SendDelay = SendDelay)
+    Api.Start()
+
+    Configuration = {"Telegram": {"BaseUrl": Api.BaseUrl,
+                                  "LongPollingTimeout": "1",
+                                  }}
+    Configuration["Telegram"].update(Telegram or {})
+
+    # the saved workload of the processes goes to a temporary directory
+    WorkingDirectory = os.getcwd()
+    TemporaryDirectory = tempfile.mkdtemp()
+    os.chdir(TemporaryDirectory)
+
+    Manager = multiprocessing.managers.SyncManager()
+    Manager.start()
+    Logging = logging.getLogger("Benchmark")
+    Language = BenchmarkLanguage()
+    LoggingQueue = Manager.Queue()
+    ConnectionEvent = Manager.Event()
+    if Queues == "ring":
+        CreateQueue = lambda: pipeline.ring.RingQueue(
+                                    Dumps = pipeline.codec.Dumps,
+                                    Loads = pipeline.codec.Loads)
+    else:
+        CreateQueue = Manager.Queue
+    Input = {"Queue": CreateQueue(), "Shutdown": Manager.Event(),
+             "Done": Manager.Event()}
+    Output = {"Queue": CreateQueue(), "Shutdown": Manager.Event(),
+              "Done": Manager.Event()}
+
+    try:
+        InputApi = telegram.InputTelegramAPI(
+                         ApiToken = Api.Token,
+                         RequestTimer = "1000",
+                         LoggingObject = Logging,
+                         LanguageObject = Language,
+                         ControllerQueue = Manager.Queue(),
+                         WorkloadQueue = Input["Queue"],
+                         SendMessagesQueue = LoggingQueue,
+                         ConnectionEvent = ConnectionEvent,
+                         WorkloadDoneEvent = Input["Done"],
+                         ShutDownEvent = Input["Shutdown"],
+                         Configuration = Configuration,
+                         )
+        OutputApi = telegram.OutputTelegramAPI(
+                         ApiToken = Api.Token,
+                         RequestTimer = "1000",
+                         LoggingObject = Logging,
+                         LanguageObject = Language,
+                         ControllerQueue = Manager.Queue(),
+                         WorkloadQueue = Output["Queue"],
+                         SendMessagesQueue = LoggingQueue,
+                         ConnectionEvent = ConnectionEvent,
+                         WorkloadDoneEvent = Output["Done"],
+                         ShutDownEvent = Output["Shutdown"],
+                         Configuration = Configuration,
+                         )
+        EchoStop = threading.Event()
+        EchoThread = threading.Thread(target = Echo,
+                                      args = (Input["Queue"], Output["Queue"],
+                                              EchoStop))
+        EchoThread.start()
+
+        Start = time.monotonic()
+        Api.GenerateUpdates(Rate, Chats, Total, Groups)
+        Deadline = Start + Timeout
+        while (Api.GetStatistics()["Answered"] < Total and
+               time.monotonic() < Deadline):
+            time.sleep(0.05)
+        Duration = time.monotonic() - Start
+
+        # the same order as MainWorker._ShutdownAll_
+        Input["Shutdown"].set()
+        Input["Done"].wait()
+        InputApi.join()
+        EchoStop.set()
+        EchoThread.join()
+        Output["Shutdown"].set()
+        Output["Done"].set()
+        OutputApi.join()
+    finally:
+        Manager.shutdown()
+        Api.Stop()
+        os.chdir(WorkingDirectory)
+        shutil.rmtree(TemporaryDirectory)
+
+    Statistics = Api.GetStatistics()
+    Statistics["Seconds"] = round(Duration, 2)
+    Statistics["MessagesPerSecond"] = round(Statistics["Answered"] /
+                                            Duration, 1)
+    return Statistics
+
+if __name__ == "__main__":
+    Parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    Parser.add_argument("--rate", type = float, default = 100,
+                        help = "updates per second")
+    Parser.add_argument("--chats", type = int, default = 10,
+                        help = "private chats the updates are spread over")
+    Parser.add_argument("--groups", type = int, default = 0,
+                        help = "groups the updates are spread over")
+    Parser.add_argument("--total", type = int, default = 1000,
+                        help = "amount of updates")
+    Parser.add_argument("--rate-limit-probability", type = float,
+                        default = 0.0, help = "probability of a 429 answer")
+    Parser.add_argument("--send-delay", type = float, default = 0.0,
+                        help = "seconds a sendMessage takes")
+    Parser.add_argument("--queues", choices = ("ring", "manager"),
+                        default = "ring",
+                        help = "the queues between the processes")
+    Parser.add_argument("--option", action = "append", default = [],
+                        metavar = "NAME=VALUE",
+                        help = "an option of the Telegram section")
+    Arguments = Parser.parse_args()
+
+    print(RunBenchmark(Rate = Arguments.rate,
+                       Chats = Arguments.chats,
+                       Groups = Arguments.groups,
+                       Total = Arguments.total,
+                       RateLimitProbability = Arguments.rate_limit_probability,
+                       SendDelay = Arguments.send_delay,
+                       Telegram = dict(Option.split("=", 1)
+                                       for Option in Arguments.option),
+                       Queues = Arguments.queues,
+                       ))
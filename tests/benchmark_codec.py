@@ -0,0 +1,125 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module compares the size and the time of the records of the
+    compact codec with the ones of pickle.
+
+    The samples are updates as the bot API sends them and the messages
+    the SubWorkers answer with.
+
+    Example:
+        python3 benchmark_codec.py --number 100000
+'''
+import os
+import sys
+import pickle
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import messages.message
+import pipeline.codec
+
+
+def CreateUser(Id):
+    return {"id": Id, "is_bot": False, "first_name": "Max",
+            "last_name": "Mustermann", "username": "max{}".format(Id),
+            "language_code": "de"}
+
+def CreateSamples():
+    """
+    This function returns the samples by their name.
+    """
+    Group = {"id": -1001234567890, "title": "Anime Subs",
+             "type": "supergroup"}
+    Private = {"id": 11223344, "first_name": "Max",
+               "last_name": "Mustermann", "username": "max11223344",
+               "type": "private"}
+    Samples = {}
+    Samples["Private text"] = {
+        "update_id": 623451234,
+        "message": {"message_id": 4321, "from": CreateUser(11223344),
+                    "chat": Private, "date": 1476712345,
+                    "text": "Hello, is the new episode out yet?"}}
+    Samples["Group command"] = {
+        "update_id": 623451235,
+        "message": {"message_id": 98765, "from": CreateUser(55667788),
+                    "chat": Group, "date": 1476712346,
+                    "text": "/search@AnimeSubBot Naruto Shippuden",
+                    "entities": [{"type": "bot_command", "offset": 0,
+                                  "length": 20}]}}
+    Samples["Group reply"] = {
+        "update_id": 623451236,
+        "message": {"message_id": 98766, "from": CreateUser(55667789),
+                    "chat": Group, "date": 1476712347,
+                    "reply_to_message": Samples["Group command"]["message"],
+                    "text": "Thanks!"}}
+    Samples["Callback query"] = {
+        "update_id": 623451237,
+        "callback_query": {"id": "4382bfdwdsb323b2d9",
+                           "from": CreateUser(11223344),
+                           "message": Samples["Private text"]["message"],
+                           "chat_instance": "-5712384950934",
+                           "data": "subscribe:1234"}}
+    Samples["Dispatched update"] = (12345, Samples["Group command"])
+
+    Message = messages.message.MessageToBeSend(
+                            ToChatId = 11223344,
+                            Text = "The episode 500 of Naruto Shippuden "
+                                   "is online.")
+    Samples["Message"] = Message
+    Message = messages.message.MessageToBeSend(
+                            ToChatId = -1001234567890,
+                            Text = "<b>Naruto Shippuden</b>\n"
+                                   "Which episode do you want?",
+                            ParseMode = "HTML",
+                            ReplyToMessageId = 98765)
+    Message.ReplyKeyboardMarkup([["/episode 499", "/episode 500"],
+                                 ["/cancel"]],
+                                OneTimeKeyboard = True,
+                                Selective = True)
+    Samples["Message with keyboard"] = Message
+    return Samples
+
+def PickleDumps(Item):
+    return pickle.dumps(Item, pickle.HIGHEST_PROTOCOL)
+
+def Measure(Dumps, Loads, Item, Number):
+    """
+    This function returns the size of the record and the microseconds
+    to write and to read it.
+    """
+    Data = Dumps(Item)
+    DumpsTime = timeit.timeit(lambda: Dumps(Item), number = Number)
+    LoadsTime = timeit.timeit(lambda: Loads(Data), number = Number)
+    return (len(Data),
+            DumpsTime / Number * 1e6,
+            LoadsTime / Number * 1e6)
+
+if __name__ == "__main__":
+    Parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    Parser.add_argument("--number", type = int, default = 20000,
+                        help = "how often every sample is measured")
+    Arguments = Parser.parse_args()
+
+    print("{:24} {:>14} {:>14} {:>14}".format(
+                "", "bytes", "dumps (us)", "loads (us)"))
+    Total = {"pickle": [0, 0.0, 0.0], "codec": [0, 0.0, 0.0]}
+    for Name, Item in CreateSamples().items():
+        Pickled = Measure(PickleDumps, pickle.loads, Item, Arguments.number)
+        Compact = Measure(pipeline.codec.Dumps, pipeline.codec.Loads, Item,
+                          Arguments.number)
+        for Index in range(3):
+            Total["pickle"][Index] += Pickled[Index]
+            Total["codec"][Index] += Compact[Index]
+        print("{:24} {:>6} / {:<6} {:>6.2f} / {:<6.2f} {:>6.2f} / {:<6.2f}"
+              .format(Name, Pickled[0], Compact[0], Pickled[1], Compact[1],
+                      Pickled[2], Compact[2]))
+    print("{:24} {:>6} / {:<6} {:>6.2f} / {:<6.2f} {:>6.2f} / {:<6.2f}"
+          .format("Total (pickle / codec)",
+                  *[Value for Index in range(3)
+                    for Value in (Total["pickle"][Index],
+                                  Total["codec"][Index])]))
@@ -0,0 +1,331 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module is a local stand-in for the telegram bot API.
+
+    It understands getMe, getUpdates (with offset and long polling),
+    sendMessage, setWebhook and deleteWebhook. The updates are generated
+    at a given rate for a given amount of chats, every sendMessage that
+    mentions the id of an update is counted as the answer to it, so that
+    the time from the update to its answer can be measured.
+
+    .. code-block:: python\n
+        Server = FakeTelegramApi()
+        Server.Start()
+        # the bot uses Server.BaseUrl instead of TelegramApi.BASE_URL
+        Server.GenerateUpdates(Rate = 100, Chats = 10, Total = 1000)
+        ...
+        print(Server.GetStatistics())
+        Server.Stop()
+'''
+import re
+import gzip
+import json
+import time
+import random
+import threading
+import http.server
+import socketserver
+import urllib.parse
+
+
+class FakeApiRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    This class answers the requests of the bot like the bot API does.
+    """
+    protocol_version = "HTTP/1.1"
+    # the headers and the body are written separately
+    disable_nagle_algorithm = True
+
+    def _GetParameters_(self):
+        """
+        This method returns the parameters of the request, they can be
+        in the query string, url encoded or json encoded in the body.
+        """
+        Url = urllib.parse.urlsplit(self.path)
+        Parameters = dict(urllib.parse.parse_qsl(Url.query))
+        Length = int(self.headers.get("Content-Length", 0))
+        if Length:
+            Body = self.rfile.read(Length)
+            if "json" in self.headers.get("Content-Type", ""):
+                Parameters.update(json.loads(Body.decode("utf-8")))
+            else:
+                Parameters.update(urllib.parse.parse_qsl(
+                                                    Body.decode("utf-8")))
+        return Url.path, Parameters
+
+    def _Answer_(self, Code, Answer):
+        Body = json.dumps(Answer).encode("utf-8")
+        Gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        if Gzip:
+            Body = gzip.compress(Body)
+        self.send_response(Code)
+        self.send_header("Content-Type", "application/json")
+        if Gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(Body)))
+        self.end_headers()
+        self.wfile.write(Body)
+
+    def _Handle_(self):
+        Path, Parameters = self._GetParameters_()
+        Match = re.match(r"^/bot(?P<Token>[^/]+)/(?P<Method>\w+)$", Path)
+        if Match is None or Match.group("Token") != self.server.Api.Token:
+            self._Answer_(404, {"ok": False, "error_code": 404,
+                                "description": "Not Found"})
+            return
+        Code, Answer = self.server.Api.Call(Match.group("Method").lower(),
+                                            Parameters)
+        self._Answer_(Code, Answer)
+
+    do_GET = _Handle_
+    do_POST = _Handle_
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeApiServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+class FakeTelegramApi(object):
+    """
+    This class holds the state of the fake bot API.
+    """
+
+    def __init__(self,
+                 Token = "123456:FAKE",
+                 Host = "127.0.0.1",
+                 Port = 0,
+                 RateLimitProbability = 0.0,
+                 RetryAfter = 1,
+                 SendDelay = 0.0):
+        """
+        Variables:
+            Token                         ``string``
+                the api token the bot has to use
+
+            Host                          ``string``
+                the address to listen to
+
+            Port                          ``integer``
+                the port to listen to, 0 takes a free one
+
+            RateLimitProbability          ``float``
+                the probability a sendMessage is answered with 429
+
+            RetryAfter                    ``integer``
+                the retry_after of the injected 429 answers
+
+            SendDelay                     ``float``
+                the seconds every sendMessage takes, to simulate the
+                latency of the real servers
+        """
+        self.Token = Token
+        self.RateLimitProbability = RateLimitProbability
+        self.RetryAfter = RetryAfter
+        self.SendDelay = SendDelay
+        self.Random = random.Random(0)
+
+        self.Server = FakeApiServer((Host, Port), FakeApiRequestHandler)
+        self.Server.Api = self
+        self.BaseUrl = "http://{}:{}/bot".format(Host,
+                                                self.Server.server_port)
+
+        self.Condition = threading.Condition()
+        # the updates not confirmed by an offset yet
+        self.Updates = []
+        self.NextUpdateId = 1
+        # the creation time of every update
+        self.Created = {}
+        self.Latencies = []
+        self.Sent = []
+        self.RateLimited = 0
+        # the amount of 429 answers to give for the next sendMessages
+        self.FailNext = 0
+        # the amount of 502 answers to give for the next requests
+        self.ServerErrors = 0
+        self.Generator = None
+        self.Stopped = threading.Event()
+
+    def Start(self):
+        threading.Thread(target = self.Server.serve_forever,
+                         daemon = True).start()
+
+    def Stop(self):
+        self.Stopped.set()
+        with self.Condition:
+            self.Condition.notify_all()
+        self.Server.shutdown()
+        self.Server.server_close()
+
+    def InjectRateLimit(self, Amount = 1):
+        """
+        This method answers the next sendMessages with 429.
+        """
+        with self.Condition:
+            self.FailNext += Amount
+
+    def InjectServerError(self, Amount = 1):
+        """
+        This method answers the next requests (besides getMe) with 502.
+        """
+        with self.Condition:
+            self.ServerErrors += Amount
+
+    def AddUpdate(self, ChatId, Text = None):
+        """
+        This method adds an update of a text message to the chat and
+        returns its id.
+        """
+        with self.Condition:
+            UpdateId = self.NextUpdateId
+            self.NextUpdateId += 1
+            if Text is None:
+                Text = "/bench {}".format(UpdateId)
+            self.Updates.append({
+                "update_id": UpdateId,
+                "message": {
+                    "message_id": UpdateId,
+                    "date": int(time.time()),
+                    "text": Text,
+                    "from": {"id": abs(ChatId), "first_name": "Bench",
+                             "username": "bench{}".format(abs(ChatId))},
+                    "chat": ({"id": ChatId, "type": "group",
+                              "title": "Bench"} if ChatId < 0 else
+                             {"id": ChatId, "type": "private",
+                              "first_name": "Bench"}),
+                    }
+                })
+            self.Created[UpdateId] = time.monotonic()
+            self.Condition.notify_all()
+        return UpdateId
+
+    def GenerateUpdates(self, Rate, Chats, Total, Groups = 0):
+        """
+        This method starts a thread that adds Total updates with Rate
+        updates per second, spread round robin over Chats private chats
+        and Groups groups.
+        """
+        ChatIds = ([1000 + Number for Number in range(Chats)] +
+                   [-1000 - Number for Number in range(Groups)])
+
+        def Generate():
+            Start = time.monotonic()
+            for Number in range(Total):
+                if self.Stopped.is_set():
+                    return
+                Delay = Start + Number / Rate - time.monotonic()
+                if Delay > 0:
+                    time.sleep(Delay)
+                self.AddUpdate(ChatIds[Number % len(ChatIds)])
+
+        self.Generator = threading.Thread(target = Generate, daemon = True)
+        self.Generator.start()
+        return self.Generator
+
+    def Call(self, Method, Parameters):
+        """
+        This method returns the http code and the answer of a method.
+        """
+        if Method == "getme":
+            return 200, {"ok": True, "result": {"id": 123456,
+                                                "is_bot": True,
+                                                "first_name": "FakeBot",
+                                                "username": "FakeBot"}}
+        with self.Condition:
+            Failing = self.ServerErrors > 0
+            if Failing:
+                self.ServerErrors -= 1
+        if Failing:
+            return 502, {"ok": False, "error_code": 502,
+                         "description": "Bad Gateway"}
+        if Method == "getupdates":
+            return 200, {"ok": True, "result": self._GetUpdates_(Parameters)}
+        elif Method == "sendmessage":
+            return self._SendMessage_(Parameters)
+        elif Method in ("setwebhook", "deletewebhook"):
+            return 200, {"ok": True, "result": True}
+        return 404, {"ok": False, "error_code": 404,
+                     "description": "Not Found: method not found"}
+
+    def _GetUpdates_(self, Parameters):
+        Offset = int(Parameters.get("offset", 0))
+        Limit = min(100, max(1, int(Parameters.get("limit", 100))))
+        Timeout = float(Parameters.get("timeout", 0))
+        Deadline = time.monotonic() + Timeout
+        with self.Condition:
+            while True:
+                # an offset confirms all the updates before it
+                self.Updates = [Update for Update in self.Updates
+                                if Update["update_id"] >= Offset]
+                Remaining = Deadline - time.monotonic()
+                if self.Updates or Remaining <= 0 or self.Stopped.is_set():
+                    return self.Updates[:Limit]
+                self.Condition.wait(Remaining)
+
+    def _SendMessage_(self, Parameters):
+        if self.SendDelay:
+            time.sleep(self.SendDelay)
+        with self.Condition:
+            Limited = self.FailNext > 0
+            if Limited:
+                self.FailNext -= 1
+            elif self.RateLimitProbability:
+                Limited = self.Random.random() < self.RateLimitProbability
+            if Limited:
+                self.RateLimited += 1
+                return 429, {"ok": False, "error_code": 429,
+                             "description": "Too Many Requests: retry "
+                                            "after {}".format(self.RetryAfter),
+                             "parameters": {"retry_after": self.RetryAfter}}
+
+            Now = time.monotonic()
+            Text = Parameters.get("text", "")
+            self.Sent.append((Parameters.get("chat_id"), Text, Now))
+            Match = re.search(r"(\d+)", Text)
+            if Match and int(Match.group(1)) in self.Created:
+                self.Latencies.append(Now -
+                                      self.Created.pop(int(Match.group(1))))
+            MessageId = len(self.Sent)
+
+        return 200, {"ok": True, "result": {
+                        "message_id": MessageId,
+                        "date": int(time.time()),
+                        "text": Text,
+                        "chat": {"id": int(Parameters.get("chat_id", 0))},
+                        }}
+
+    def GetStatistics(self):
+        """
+        This method returns the amount of answers, the 429 answers and
+        the percentiles of the latency from update to answer in
+        milliseconds.
+        """
+        with self.Condition:
+            Latencies = sorted(self.Latencies)
+            Sent = len(self.Sent)
+        Statistics = {"Answered": len(Latencies),
+                      "Sent": Sent,
+                      "RateLimited": self.RateLimited,
+                      }
+        for Percentile in (50, 90, 99, 100):
+            if Latencies:
+                Position = min(len(Latencies) - 1,
+                               int(len(Latencies) * Percentile / 100))
+                Statistics["p{}".format(Percentile)] = round(
+                                            Latencies[Position] * 1000, 2)
+        return Statistics
+
+if __name__ == "__main__":
+    Server = FakeTelegramApi()
+    Server.Start()
+    print("Fake bot API under {}<token> with the token {}".format(
+                                                Server.BaseUrl, Server.Token))
+    Server.GenerateUpdates(Rate = 1, Chats = 1, Total = 10 ** 9)
+    try:
+        while True:
+            time.sleep(10)
+            print(Server.GetStatistics())
+    except KeyboardInterrupt:
+        Server.Stop()
@@ -0,0 +1,70 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests the decisions of the autoscaler with a fake clock.
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import network.limiter
+import pipeline.autoscaler
+
+if __name__ == "__main__":
+    print("Online")
+    Clock = network.limiter.FakeClock()
+    Scaler = pipeline.autoscaler.Autoscaler(MinWorkers = 1,
+                                            MaxWorkers = 5,
+                                            UpCooldown = 5,
+                                            DownCooldown = 60,
+                                            Clock = Clock)
+    Busy, Messages = 0.0, 0
+
+    def Sample(Workers, Depth, Seconds, Processed, Elapsed = 1):
+        global Busy, Messages
+        Clock.Advance(Elapsed)
+        Busy += Seconds
+        Messages += Processed
+        return Scaler.Sample(Workers, Depth, Busy, Messages)
+
+    # below the minimum
+    print(Scaler.Sample(0, 0, 0, 0).Target == 1)
+    # the cooldown after the start
+    Decision = Sample(1, 100, 1.0, 10)
+    print(Decision.Target == 1 and "cooling down" in Decision.Reason)
+    # 100 queued messages of 0.1s have to be done in 1 second, but the
+    # maximum is 5
+    Decision = Sample(1, 100, 5.0, 50, Elapsed = 5)
+    print(Decision.Target == 5 and abs(Decision.ProcessingTime - 0.1) < 1e-9)
+    print(Decision.Utilization == 1.0)
+    # busy at 60% with an empty queue, nothing changes
+    Decision = Sample(5, 0, 15.0, 150, Elapsed = 5)
+    print(Decision.Target == 5 and Decision.Reason == "utilization 60%")
+    # idle, but not for long enough
+    Sample(5, 0, 0.0, 0, Elapsed = 30)
+    Decision = Sample(5, 0, 0.0, 0, Elapsed = 30)
+    print(Decision.Target == 5 and "idle" in Decision.Reason)
+    # idle for a minute, one worker less
+    Decision = Sample(5, 0, 0.0, 0, Elapsed = 30)
+    print(Decision.Target == 4)
+    # the next one only after another cooldown
+    Sample(4, 0, 0.0, 0, Elapsed = 30)
+    Decision = Sample(4, 0, 0.0, 0, Elapsed = 30)
+    print(Decision.Target == 4)
+    Decision = Sample(4, 0, 0.0, 0, Elapsed = 30)
+    print(Decision.Target == 3)
+    # a busy pool grows
+    Decision = Sample(3, 0, 30.0, 300, Elapsed = 10)
+    print(Decision.Target == 5 and Decision.Reason == "utilization 100%")
+    # the metrics of the last decision
+    print(Scaler.GetMetrics()["Target"] == 5 and len(Scaler.Decisions) == 11)
+
+    # the statistics shared by the workers
+    Statistics = pipeline.autoscaler.WorkerStatistics()
+    Statistics.Record(0.5)
+    Statistics.Record(0.25, 2)
+    print(Statistics.Get() == (0.75, 3))
+    print("Offline")
@@ -0,0 +1,106 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests the water marks of the backpressure and that the
+    input process doesn't take updates while it's paused.
+'''
+import os
+import sys
+import time
+import queue
+import shutil
+import gettext
+import logging
+import tempfile
+import multiprocessing.managers
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import telegram
+import network.limiter
+import pipeline.ring
+import pipeline.backpressure
+
+from fake_telegram_api import FakeTelegramApi
+
+class Language(object):
+    def CreateTranslationObject(self, Languages = None):
+        return gettext.NullTranslations()
+
+if __name__ == "__main__":
+    print("Online")
+    GetFill = pipeline.backpressure.GetFill
+    # the fill of the different queues
+    Ring = pipeline.ring.RingQueue(1000)
+    Ring.put(b"x" * 200)
+    print(0.2 < GetFill(Ring) < 0.25)
+    Bounded = queue.Queue(10)
+    for Number in range(5):
+        Bounded.put(Number)
+    print(GetFill(Bounded) == 0.5 and GetFill(Bounded, 20) == 0.25)
+    print(GetFill(queue.Queue()) == 0.0)
+
+    # paused above the high water mark, resumed below the low one
+    Clock = network.limiter.FakeClock()
+    Gate = pipeline.backpressure.BackpressureGate(0.8, 0.5, Clock)
+    print(Gate.Sample({"Input": 0.1, "Output": 0.7}) is False)
+    print(Gate.Sample({"Input": 0.1, "Output": 0.85}) is True)
+    Clock.Advance(2)
+    # between the marks nothing changes
+    print(Gate.Sample({"Input": 0.1, "Output": 0.6}) is True)
+    Clock.Advance(1)
+    print(Gate.GetPausedSeconds() == 3)
+    print(Gate.Sample({"Input": 0.1, "Output": 0.5}) is False)
+    print(Gate.Sample({"Input": 0.1, "Output": 0.6}) is False)
+    Metrics = Gate.GetMetrics()
+    print(Metrics["Pauses"] == 1 and Metrics["PausedSeconds"] == 3)
+    print(Metrics["Fullest"] == "Output" and Metrics["MaximalFill"] == 0.85)
+
+    # the input process takes no update while the PressureEvent is set
+    Api = FakeTelegramApi()
+    Api.Start()
+    WorkingDirectory = os.getcwd()
+    TemporaryDirectory = tempfile.mkdtemp()
+    os.chdir(TemporaryDirectory)
+    Manager = multiprocessing.managers.SyncManager()
+    Manager.start()
+    try:
+        PressureEvent = Manager.Event()
+        PressureEvent.set()
+        Input = {"Queue": pipeline.ring.RingQueue(1 << 16),
+                 "Shutdown": Manager.Event(), "Done": Manager.Event()}
+        InputApi = telegram.InputTelegramAPI(
+                         ApiToken = Api.Token,
+                         RequestTimer = "1000",
+                         LoggingObject = logging.getLogger("Test"),
+                         LanguageObject = Language(),
+                         ControllerQueue = Manager.Queue(),
+                         WorkloadQueue = Input["Queue"],
+                         SendMessagesQueue = Manager.Queue(100),
+                         ConnectionEvent = Manager.Event(),
+                         WorkloadDoneEvent = Input["Done"],
+                         ShutDownEvent = Input["Shutdown"],
+                         Configuration = {"Telegram": {
+                                                "BaseUrl": Api.BaseUrl,
+                                                "LongPollingTimeout": "1"}},
+                         PressureEvent = PressureEvent,
+                         )
+        for Number in range(5):
+            Api.AddUpdate(Number)
+        time.sleep(1.5)
+        print(Input["Queue"].empty())
+        PressureEvent.clear()
+        Updates = [Input["Queue"].get(timeout = 5) for Number in range(5)]
+        print([Update["message"]["chat"]["id"] for Update in Updates] ==
+              list(range(5)))
+        Input["Shutdown"].set()
+        Input["Done"].wait()
+        InputApi.join()
+    finally:
+        Manager.shutdown()
+        Api.Stop()
+        os.chdir(WorkingDirectory)
+        shutil.rmtree(TemporaryDirectory)
+    print("Offline")
@@ -0,0 +1,79 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests that a batch loads its users and sessions with one
+    query each.
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import messages.batch
+
+class RecordingSql(object):
+    """
+    This class answers the two queries of the batch like the database
+    with two known users, one of them with a session.
+    """
+    def __init__(self):
+        self.Queries = []
+
+    def ExecuteTrueQuery(self, Cursor, Query, Data = None):
+        self.Queries.append((Query, Data))
+        if "FROM User_Table" in Query:
+            return [{"External_Id": 1, "Internal_Id": 10, "Is_Admin": 1,
+                     "User_String": "de_DE"},
+                    {"External_Id": 2, "Internal_Id": 20, "Is_Admin": 0,
+                     "User_String": "en_US"}]
+        return [{"Command_By_User": 10, "Command": "/admin",
+                 "Last_Used_Id": None, "Last_Used_Data": None}]
+
+def Update(UserId, Text):
+    return {"update_id": UserId, "message": {"text": Text,
+                                             "from": {"id": UserId},
+                                             "chat": {"id": UserId}}}
+
+if __name__ == "__main__":
+    print("Online")
+    Updates = [Update(1, "a"), Update(2, "b"), Update(1, "c"), Update(3, "d"),
+               {"update_id": 5}]
+    Groups = messages.batch.Batch.GroupByUser(Updates)
+    print(list(Groups.keys()) == [1, 2, 3, None])
+    print([Item["message"]["text"] for Item in Groups[1]] == ["a", "c"])
+    # the user 1 writes in the group chat 7 too, so the group joins his
+    # private chat, the user 2 stays alone
+    InGroup = Update(1, "e")
+    InGroup["message"]["chat"]["id"] = 7
+    OtherInGroup = Update(4, "f")
+    OtherInGroup["message"]["chat"]["id"] = 7
+    Groups = messages.batch.Batch.GroupIndependent(
+                                        [OtherInGroup, Update(2, "b")] +
+                                        Updates[:2] + [InGroup])
+    print([[Item["message"]["text"] for Item in Group] for Group in Groups]
+          == [["f", "a", "e"], ["b", "b"]])
+    print(len(messages.batch.Batch.GroupIndependent(Updates)) == 4)
+
+    Sql = RecordingSql()
+    Batch = messages.batch.Batch.Load(Sql, None, Updates)
+    # one query for the users and one for their sessions
+    print(len(Sql.Queries) == 2)
+    print(Sql.Queries[0][1] == (1, 2, 3))
+    print(Sql.Queries[0][0].count("%s") == 3)
+    print(Sql.Queries[1][1] == (10, 20))
+
+    print(Batch.GetUser(1) == {"Internal_Id": 10, "Is_Admin": True,
+                               "Language": "de_DE"})
+    print(Batch.GetUser(3) is None)
+    print(Batch.GetSession(10)["Command"] == "/admin")
+    # a known user without a session doesn't have to be queried again
+    print(Batch.HasSession(20) and Batch.GetSession(20) is None)
+
+    # the later messages of a user see the changes of the earlier ones
+    Batch.UpdateSession(20, Command = "/language")
+    print(Batch.GetSession(20)["Command"] == "/language")
+    Batch.SetUser(3, 30, False, "en_US")
+    print(Batch.GetUser(3)["Internal_Id"] == 30 and Batch.HasSession(30))
+    print("Offline")
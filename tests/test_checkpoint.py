@@ -0,0 +1,45 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests the checkpoint of the getUpdates offset.
+'''
+import os
+import sys
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import pipeline.checkpoint
+
+if __name__ == "__main__":
+    print("Online")
+    Directory = tempfile.mkdtemp()
+    try:
+        Path = os.path.join(Directory, "ApiOffset.json")
+        Checkpoint = pipeline.checkpoint.OffsetCheckpoint(Path)
+        print(Checkpoint.Load() is None)
+        Checkpoint.Save(469262058)
+        print(pipeline.checkpoint.OffsetCheckpoint(Path).Load() == 469262058)
+        # no temporary file is left over
+        print(os.listdir(Directory) == ["ApiOffset.json"])
+
+        # the interval delays the write until the next flush
+        Checkpoint = pipeline.checkpoint.OffsetCheckpoint(Path, 60)
+        Checkpoint.Load()
+        Checkpoint.Save(469262059)
+        print(pipeline.checkpoint.OffsetCheckpoint(Path).Load() == 469262059)
+        Checkpoint.Save(469262060)
+        print(pipeline.checkpoint.OffsetCheckpoint(Path).Load() == 469262059)
+        Checkpoint.Flush()
+        print(pipeline.checkpoint.OffsetCheckpoint(Path).Load() == 469262060)
+
+        # a broken checkpoint is ignored
+        with open(Path, "w") as OutputFile:
+            OutputFile.write("{\"ApiOff")
+        print(pipeline.checkpoint.OffsetCheckpoint(Path).Load() is None)
+    finally:
+        shutil.rmtree(Directory)
+    print("Offline")
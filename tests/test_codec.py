@@ -0,0 +1,75 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests that the records of the compact codec come back
+    unchanged and are smaller than the pickled ones.
+'''
+import os
+import sys
+import pickle
+import collections
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import messages.message
+import pipeline.ring
+import pipeline.codec
+
+from benchmark_codec import CreateSamples
+
+def RoundTrip(Item):
+    return pipeline.codec.Loads(pipeline.codec.Dumps(Item))
+
+def IsSameMessage(First, Second):
+    return (type(First) is type(Second) and
+            First.__dict__ == Second.__dict__ and
+            First.GetMessage() == Second.GetMessage())
+
+if __name__ == "__main__":
+    print("Online")
+    Samples = CreateSamples()
+    # the updates and the messages come back unchanged
+    for Name, Item in Samples.items():
+        if isinstance(Item, messages.message.MessageToBeSend):
+            print(IsSameMessage(RoundTrip(Item), Item))
+        else:
+            print(RoundTrip(Item) == Item)
+        print(len(pipeline.codec.Dumps(Item)) <
+              len(pickle.dumps(Item, pickle.HIGHEST_PROTOCOL)))
+    # the unknown keys stay strings
+    print(RoundTrip({"update_id": 1, "unknown": {"text": [1, {"x": None}]}})
+          == {"update_id": 1, "unknown": {"text": [1, {"x": None}]}})
+    # what marshal can't write, or can't be told apart, is pickled
+    Values = [{1: "a", "text": "b"},
+              collections.OrderedDict([("text", 1)]),
+              {"update_id": 1, "message": {
+                        "date": messages.message.MessageToBeSend(1)}},
+              ]
+    for Value in Values:
+        print(pipeline.codec.Dumps(Value)[:1] == b"P")
+    print(RoundTrip(Values[0]) == Values[0])
+    print(type(RoundTrip(Values[1])) is collections.OrderedDict)
+    Message = messages.message.MessageToBeSend(1, "text")
+    Message.Extra = 1
+    print(pipeline.codec.Dumps(Message)[:1] == b"P" and
+          RoundTrip(Message).Extra == 1)
+    try:
+        pipeline.codec.Loads(b"X")
+        print(False)
+    except ValueError:
+        print(True)
+
+    # the codec in a ring queue
+    Queue = pipeline.ring.RingQueue(1000, pipeline.codec.Dumps,
+                                    pipeline.codec.Loads)
+    for Number in range(50):
+        Queue.put((Number, Samples["Private text"]))
+        Sequence, Update = Queue.get()
+        if Sequence != Number or Update != Samples["Private text"]:
+            print(False)
+            break
+    else:
+        print(True)
+    print("Offline")
@@ -0,0 +1,88 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests that the translation objects are loaded once per
+    process and language.
+'''
+import os
+import sys
+import time
+import struct
+import pickle
+import gettext
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import language
+
+def WriteCatalog(Localedir, Language, Messages):
+    """
+    This function writes a .mo file with the messages.
+    """
+    Directory = os.path.join(Localedir, Language, "LC_MESSAGES")
+    os.makedirs(Directory)
+    Messages = dict(Messages, **{"": "Content-Type: text/plain; "
+                                     "charset=UTF-8\n"})
+    Keys = sorted(Messages)
+    Ids = b"".join(Key.encode() + b"\0" for Key in Keys)
+    Strings = b"".join(Messages[Key].encode() + b"\0" for Key in Keys)
+    Start = 7 * 4 + 16 * len(Keys)
+    Offsets = []
+    Position = 0
+    for Key in Keys:
+        Offsets += [len(Key.encode()), Start + Position]
+        Position += len(Key.encode()) + 1
+    Position = 0
+    for Key in Keys:
+        Offsets += [len(Messages[Key].encode()), Start + len(Ids) + Position]
+        Position += len(Messages[Key].encode()) + 1
+    with open(os.path.join(Directory, "Telegram.mo"), "wb") as File:
+        File.write(struct.pack("7I", 0x950412de, 0, len(Keys), 7 * 4,
+                               7 * 4 + 8 * len(Keys), 0, 0))
+        File.write(struct.pack("%dI" % len(Offsets), *Offsets))
+        File.write(Ids + Strings)
+
+if __name__ == "__main__":
+    print("Online")
+    Localedir = tempfile.mkdtemp()
+    WriteCatalog(Localedir, "en_US", {"YES": "YES"})
+    WriteCatalog(Localedir, "de_DE", {"YES": "JA"})
+    Language = language.Language()
+    Language.Localedir = Localedir
+
+    English = Language.CreateTranslationObject()
+    print(English.gettext("YES") == "YES")
+    # the same languages give the same object
+    print(Language.CreateTranslationObject() is English)
+    print(Language.CreateTranslationObject("en_US") is English)
+    German = Language.CreateTranslationObject(["de_DE"])
+    print(German.gettext("YES") == "JA" and German is not English)
+    print(Language.CreateTranslationObject(["de_DE", "en_US"]) is not German)
+    print(len(Language.Catalogs) == 3)
+    # a missing language isn't cached
+    try:
+        Language.CreateTranslationObject("fr_FR")
+        print(False)
+    except OSError:
+        print(True)
+    print(len(Language.Catalogs) == 3)
+
+    # a new process loads its own catalogs
+    Copy = pickle.loads(pickle.dumps(Language))
+    print(Copy.Catalogs == {} and Copy.Localedir == Localedir)
+    print(Copy.CreateTranslationObject("de_DE").gettext("YES") == "JA")
+
+    # a cached translation object is cheaper than a loaded one
+    Start = time.perf_counter()
+    for Number in range(2000):
+        Language.CreateTranslationObject(["de_DE"])
+    Cached = time.perf_counter() - Start
+    Start = time.perf_counter()
+    for Number in range(2000):
+        gettext.translation("Telegram", Localedir, ["de_DE"])
+    Loaded = time.perf_counter() - Start
+    print(Cached < Loaded)
+    print("Offline")
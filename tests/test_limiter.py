@@ -0,0 +1,159 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests the message scheduler with a fake clock.
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import network.limiter
+
+def Drain(Scheduler):
+    Items = []
+    Item = Scheduler.Pop()
+    while Item is not None:
+        Items.append(Item)
+        Item = Scheduler.Pop()
+    return Items
+
+if __name__ == "__main__":
+    print("Online")
+    Clock = network.limiter.FakeClock()
+    Scheduler = network.limiter.MessageScheduler(Clock = Clock)
+
+    # one message per second and chat, in order
+    for Number in range(3):
+        Scheduler.Push(1, ("A", Number))
+    Scheduler.Push(2, ("B", 0))
+    print(Drain(Scheduler) == [("A", 0), ("B", 0)])
+    print(Scheduler.GetWaitTime() == 1.0)
+    Clock.Advance(1)
+    print(Drain(Scheduler) == [("A", 1)])
+
+    # a throttled chat doesn't hold back the others
+    Scheduler.Backoff(1, 10)
+    Scheduler.Push(2, ("B", 1))
+    Clock.Advance(1)
+    print(Drain(Scheduler) == [("B", 1)])
+    print(Scheduler.GetWaitTime() == 9.0)
+    Clock.Advance(9)
+    print(Drain(Scheduler) == [("A", 2)])
+
+    # the global limit of 30 messages per second
+    Clock.Advance(1)
+    for ChatId in range(100, 140):
+        Scheduler.Push(ChatId, ChatId)
+    print(len(Drain(Scheduler)) == 30)
+    Clock.Advance(1 / 3)
+    print(len(Drain(Scheduler)) == 10)
+
+    # one message per second in a group too, 20 per minute at most
+    Clock.Advance(60)
+    for Number in range(25):
+        Scheduler.Push(-100, Number)
+    print(Drain(Scheduler) == [0])
+    Sent = []
+    for Step in range(24):
+        Clock.Advance(1)
+        Sent += Drain(Scheduler)
+    # the burst of the group is used up after 25 messages in 24 seconds
+    print(Sent == list(range(1, 25)) and len(Scheduler) == 0)
+    for Number in range(30):
+        Scheduler.Push(-100, Number)
+    Sent = []
+    for Step in range(30):
+        Clock.Advance(1)
+        Sent += Drain(Scheduler)
+    print(8 < len(Sent) < 15 and Sent == list(range(len(Sent))))
+    Clock.Advance(3)
+    Scheduler = network.limiter.MessageScheduler(Clock = Clock)
+    for ChatId in range(21, 25):
+        Scheduler.Push(ChatId, ChatId)
+    print(len(Scheduler) == 4)
+
+    # a pause holds back all the chats
+    Clock.Advance(60)
+    Scheduler.Pause(5)
+    print(Scheduler.Pop() is None and Scheduler.GetWaitTime() == 5.0)
+    Clock.Advance(5)
+    print(Drain(Scheduler) == [21, 22, 23, 24])
+
+    # the lanes share the global limit by their weights
+    Clock = network.limiter.FakeClock()
+    Scheduler = network.limiter.MessageScheduler(Clock = Clock)
+    for ChatId in range(100):
+        Scheduler.Push(ChatId, "Bulk", "Bulk")
+        Scheduler.Push(1000 + ChatId, "Interactive", "Interactive")
+    Items = Drain(Scheduler)
+    print(len(Items) == 30 and Items.count("Bulk") in (3, 4))
+    print(Scheduler.GetDepths()["Bulk"] > 95)
+    # a lane whose chats have to wait doesn't hold back the others
+    Clock.Advance(60)
+    Drain(Scheduler)
+    Clock.Advance(60)
+    Scheduler = network.limiter.MessageScheduler(Clock = Clock)
+    for Number in range(3):
+        Scheduler.Push(1, ("Interactive", Number), "Interactive")
+        Scheduler.Push(2 + Number, ("Bulk", Number), "Bulk")
+    print(Drain(Scheduler) == [("Interactive", 0), ("Bulk", 0),
+                               ("Bulk", 1), ("Bulk", 2)])
+    # the messages without a lane go to the lane of GetLane, the unknown
+    # lanes to the first one
+    Scheduler = network.limiter.MessageScheduler(
+                        Clock = Clock, GetLane = lambda Item: Item[0])
+    Scheduler.Push(1, ("Bulk", 0))
+    Scheduler.Push(2, ("Unknown", 0))
+    print(Scheduler.GetDepths() == {"Interactive": 1, "Admin": 0,
+                                    "Bulk": 1})
+
+    # the bulk lane leaves a part of the global limit to the others
+    Scheduler = network.limiter.MessageScheduler(Clock = Clock,
+                                                 BulkReserve = 5)
+    for ChatId in range(100):
+        Scheduler.Push(ChatId, ChatId, "Bulk")
+    print(len(Drain(Scheduler)) == 25)
+    Scheduler.Push(1000, "Reply")
+    print(Scheduler.Pop() == "Reply")
+
+    # a reply doesn't wait behind a broadcast
+    def MeasureReplies(Lanes):
+        Clock = network.limiter.FakeClock()
+        Scheduler = network.limiter.MessageScheduler(Clock = Clock,
+                                                     Lanes = Lanes,
+                                                     BulkReserve = 5)
+        for ChatId in range(600):
+            Scheduler.Push(ChatId, None, "Bulk")
+        Latencies = []
+        for Step in range(800):
+            if Step % 10 == 0:
+                Scheduler.Push(1000 + Step, Clock.Now(), "Interactive")
+            for Item in Drain(Scheduler):
+                if Item is not None:
+                    Latencies.append(Clock.Now() - Item)
+            Clock.Advance(0.05)
+        return max(Latencies)
+    print(MeasureReplies(None) <= 0.05)
+    print(MeasureReplies((("Interactive", 1), ("Bulk", 1))) <= 0.05)
+    print(MeasureReplies((("All", 1),)) > 10)
+
+    # the messages of a chat stay in their order across the lanes
+    Scheduler = network.limiter.MessageScheduler(Clock = Clock,
+                                                 ChatRate = 100,
+                                                 ChatBurst = 10)
+    Scheduler.Push(1, ("Bulk", 0), "Bulk")
+    Scheduler.Push(1, ("Bulk", 1), "Bulk")
+    Scheduler.Push(1, ("Interactive", 2), "Interactive")
+    Scheduler.Push(2, ("Interactive", 0), "Interactive")
+    print(Scheduler.GetDepths()["Bulk"] == 3)
+    print(Drain(Scheduler) == [("Interactive", 0), ("Bulk", 0), ("Bulk", 1),
+                               ("Interactive", 2)])
+    # an empty chat takes the lane of its next message again
+    Scheduler.Push(1, ("Interactive", 3), "Interactive")
+    Scheduler.PushFront(1, ("Bulk", 2), "Bulk")
+    print(Scheduler.GetDepths()["Interactive"] == 2 and
+          Drain(Scheduler) == [("Bulk", 2), ("Interactive", 3)])
+    print("Offline")
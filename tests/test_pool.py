@@ -0,0 +1,105 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests that the connection pool replaces the connections
+    closed by the server and never sends a POST twice.
+'''
+import os
+import sys
+import time
+import threading
+import http.client
+import http.server
+import socketserver
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import network.pool
+
+class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """
+    This class answers with keep-alive connections. /close closes the
+    connection after the answer without telling the client, /drop
+    closes it without any answer the first time per method.
+    """
+    protocol_version = "HTTP/1.1"
+    Requests = []
+
+    def _Handle_(self):
+        Length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(Length)
+        Handler.Requests.append((self.command, self.path))
+        if (self.path == "/drop" and
+                Handler.Requests.count((self.command, self.path)) == 1):
+            self.close_connection = True
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+        if self.path == "/close":
+            self.close_connection = True
+
+    do_GET = _Handle_
+    do_POST = _Handle_
+
+    def log_message(self, format, *args):
+        pass
+
+def Request(Pool, Url, Method = "GET"):
+    Data = b"data" if Method == "POST" else None
+    with Pool.Open(urllib.request.Request(Url, data = Data,
+                                          method = Method)) as Response:
+        return Response.read()
+
+if __name__ == "__main__":
+    print("Online")
+    HttpServer = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target = HttpServer.serve_forever, daemon = True).start()
+    Url = "http://127.0.0.1:{}".format(HttpServer.server_address[1])
+    Pool = network.pool.ConnectionPool(Url, Timeout = 5)
+
+    # the connection is kept and reused
+    print(Request(Pool, Url + "/") == b"ok" and
+          Request(Pool, Url + "/") == b"ok")
+    print(Pool.GetStatistics()["Hits"] == 1 and
+          Pool.GetStatistics()["Misses"] == 1)
+
+    # an idle connection closed by the server is replaced before it's
+    # used
+    print(Request(Pool, Url + "/close") == b"ok")
+    time.sleep(0.1)
+    print(Request(Pool, Url + "/") == b"ok")
+    Statistics = Pool.GetStatistics()
+    print(Statistics["Stale"] == 1 and Statistics["Misses"] == 2 and
+          Statistics["Reconnects"] == 0)
+
+    # a GET lost with the connection is sent again
+    Handler.Requests[:] = []
+    print(Request(Pool, Url + "/drop") == b"ok")
+    print(Handler.Requests == [("GET", "/drop"), ("GET", "/drop")] and
+          Pool.GetStatistics()["Reconnects"] == 1)
+
+    # a POST that has been sent isn't, it may have arrived
+    Request(Pool, Url + "/")
+    Handler.Requests[:] = []
+    try:
+        Request(Pool, Url + "/drop", "POST")
+        print(False)
+    except network.pool.ConnectionPool.RECONNECT_ERRORS:
+        print(True)
+    print(Handler.Requests == [("POST", "/drop")] and
+          Pool.GetStatistics()["Reconnects"] == 1)
+    # the pool goes on with a new connection
+    print(Request(Pool, Url + "/", "POST") == b"ok")
+
+    Pool.Close()
+    HttpServer.shutdown()
+    HttpServer.server_close()
+    print("Offline")
@@ -0,0 +1,142 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests the backoff and the circuit breakers, alone with a
+    fake clock and in the TelegramApi against the fake bot API.
+'''
+import os
+import sys
+import types
+import random
+import gettext
+import logging
+import threading
+import http.client
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import telegram
+import network.limiter
+import network.resilience
+import messages.message
+
+from fake_telegram_api import FakeTelegramApi
+
+class Language(object):
+    def CreateTranslationObject(self, Languages = None):
+        return gettext.NullTranslations()
+
+def BrokenUpdates(*Arguments, **Keywords):
+    yield {"update_id": 1}
+    raise http.client.IncompleteRead(b"")
+
+if __name__ == "__main__":
+    print("Online")
+
+    # the delays grow exponentially up to the maximum
+    Backoff = network.resilience.Backoff(1, 10, random.Random(0))
+    Delays = []
+    for Number in range(6):
+        Ceiling = Backoff.GetCeiling()
+        Delays.append(Ceiling)
+        print(0 <= Backoff.Next() <= Ceiling)
+    print(Delays == [1, 2, 4, 8, 10, 10])
+    Backoff.Reset()
+    print(Backoff.GetCeiling() == 1)
+
+    # only transient errors count as failures of the server
+    print(network.resilience.IsTransient(
+        urllib.error.HTTPError("", 502, "", {}, None)))
+    print(not network.resilience.IsTransient(
+        urllib.error.HTTPError("", 400, "", {}, None)))
+    print(network.resilience.IsTransient(TimeoutError()))
+    print(not network.resilience.IsTransient(ValueError()))
+
+    # closed -> open -> half open -> closed
+    Clock = network.limiter.FakeClock()
+    Changes = []
+    Breaker = network.resilience.CircuitBreaker(
+                    "getUpdates", 3, 30, Clock,
+                    OnChange = lambda Item: Changes.append(Item.State))
+    for Number in range(2):
+        Breaker.RecordFailure()
+    print(Breaker.Allow() and Breaker.State == Breaker.CLOSED)
+    Breaker.RecordFailure()
+    print(not Breaker.Allow() and Breaker.GetWaitTime() == 30)
+    Clock.Advance(30)
+    # a single trial request
+    print(Breaker.Allow() and not Breaker.Allow())
+    Breaker.RecordFailure()
+    print(Breaker.State == Breaker.OPEN and Breaker.GetWaitTime() == 30)
+    Clock.Advance(30)
+    print(Breaker.Allow())
+    Breaker.RecordSuccess()
+    print(Breaker.State == Breaker.CLOSED and Breaker.Allow())
+    print(Changes == [Breaker.OPEN, Breaker.OPEN, Breaker.CLOSED])
+    # a lost trial request opens the breaker again
+    for Number in range(3):
+        Breaker.RecordFailure()
+    Clock.Advance(30)
+    print(Breaker.Allow() and not Breaker.Allow() and
+          Breaker.GetWaitTime() == 60)
+    Clock.Advance(30)
+    print(not Breaker.Allow() and Breaker.State == Breaker.OPEN)
+    Clock.Advance(30)
+    print(Breaker.Allow() and Breaker.State == Breaker.HALF_OPEN)
+
+    # a broken answer of getUpdates waits like a failed request
+    Input = types.SimpleNamespace(
+                TelegramApi = types.SimpleNamespace(
+                    IterateUpdates = BrokenUpdates,
+                    Backoff = network.resilience.Backoff(0.01, 0.01)),
+                ShutDownEvent = threading.Event(),
+                LongPollingTimeout = 0, UpdateLimit = None, Timeout = 0)
+    print(list(telegram.InputTelegramApiServer._GetUpdates_(Input, 0)) ==
+          [{"update_id": 1}] and Input.TelegramApi.Backoff.Attempts == 1)
+
+    # the breaker of a method of the TelegramApi sets the ConnectionEvent
+    Server = FakeTelegramApi()
+    Server.Start()
+    ConnectionEvent = threading.Event()
+    Api = telegram.TelegramApi(Server.Token, 500, logging.getLogger(),
+                               Language(), BaseUrl = Server.BaseUrl,
+                               ConnectionEvent = ConnectionEvent,
+                               BreakerThreshold = 2,
+                               BreakerResetTimeout = 0.2)
+    Message = messages.message.MessageToBeSend(1000, "1")
+    Server.InjectServerError(2)
+    for Number in range(2):
+        try:
+            Api.SendMessage(Message)
+        except urllib.error.HTTPError as Error:
+            print(Error.code == 502)
+    print(ConnectionEvent.is_set())
+    try:
+        Api.SendMessage(Message)
+    except network.resilience.CircuitOpenError as Error:
+        print(Error.Name == "sendMessage" and Error.WaitTime <= 0.2)
+    # the other methods are not affected
+    print(Api.GetUpdates()["ok"] is True)
+    threading.Event().wait(0.2)
+    print(Api.SendMessage(Message)["ok"] is True)
+    print(not ConnectionEvent.is_set())
+    # a trial request that doesn't finish counts as failed
+    Breaker = Api.GetCircuitBreaker(urllib.request.Request(
+                                "{}/getUpdates".format(Api.BotApiUrl)))
+    for Number in range(2):
+        Breaker.RecordFailure()
+    threading.Event().wait(0.2)
+    Server.AddUpdate(1000, "a")
+    Server.AddUpdate(1000, "b")
+    Updates = Api.IterateUpdates()
+    next(Updates)
+    Updates.close()
+    print(Breaker.State == Breaker.OPEN)
+    threading.Event().wait(0.2)
+    print(Api.GetUpdates()["ok"] is True and Breaker.State == Breaker.CLOSED)
+    Server.Stop()
+    print("Offline")
@@ -0,0 +1,104 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests the shared memory queue with several producer and
+    consumer processes.
+'''
+import os
+import sys
+import time
+import queue
+import multiprocessing
+import multiprocessing.managers
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import pipeline.ring
+
+def Produce(Queue, Producer, Amount):
+    for Number in range(Amount):
+        Queue.put({"update_id": Number, "producer": Producer,
+                   "text": "x" * (Number % 100)})
+
+def Consume(Queue, Results, Amount):
+    Results.put([Queue.get(timeout = 10) for Number in range(Amount)])
+
+def DieWithLock(Queue):
+    Queue._Lock.acquire()
+    os._exit(0)
+
+def MeasureHandOff(Queue, Amount = 2000):
+    Start = time.perf_counter()
+    for Number in range(Amount):
+        Queue.put({"update_id": Number})
+        Queue.get()
+    return (time.perf_counter() - Start) / Amount
+
+if __name__ == "__main__":
+    print("Online")
+    # small enough that the records wrap around the end many times
+    Queue = pipeline.ring.RingQueue(1000)
+    Results = multiprocessing.Queue()
+    Producers = [multiprocessing.Process(target = Produce,
+                                         args = (Queue, Producer, 1500))
+                 for Producer in range(3)]
+    Consumers = [multiprocessing.Process(target = Consume,
+                                         args = (Queue, Results, 2250))
+                 for Consumer in range(2)]
+    for Process in Producers + Consumers:
+        Process.start()
+    Received = Results.get() + Results.get()
+    for Process in Producers + Consumers:
+        Process.join()
+
+    print(len(Received) == 4500)
+    # every item arrives exactly once
+    for Producer in range(3):
+        Numbers = [Item["update_id"] for Item in Received
+                   if Item["producer"] == Producer]
+        print(sorted(Numbers) == list(range(1500)))
+    print(Queue.empty() and Queue.GetUsage() == 0)
+
+    # the interface of queue.Queue
+    try:
+        Queue.get(timeout = 0.05)
+    except queue.Empty:
+        print(True)
+    Queue = pipeline.ring.RingQueue(64)
+    Queue.put_nowait(b"1" * 20)
+    try:
+        Queue.put(b"2" * 20, timeout = 0.05)
+    except queue.Full:
+        print(True)
+    print(Queue.qsize() == 1 and Queue.get_nowait() == b"1" * 20)
+    try:
+        Queue.put(b"3" * 100)
+    except ValueError:
+        print(True)
+
+    # a process that died while holding the lock breaks the ring, the
+    # others don't hang
+    Queue = pipeline.ring.RingQueue(1000, LockTimeout = 0.2)
+    Queue.put(1)
+    Process = multiprocessing.Process(target = DieWithLock, args = (Queue,))
+    Process.start()
+    Process.join()
+    Start = time.monotonic()
+    for Call in (Queue.get, lambda: Queue.put(2)):
+        try:
+            Call()
+            print(False)
+        except pipeline.ring.RingBrokenError:
+            print(True)
+    print(Queue.IsBroken() and time.monotonic() - Start < 1)
+    print(Queue.GetUsage() > 0 and Queue.qsize() == 1)
+
+    # the hand off doesn't need a round trip to the manager process
+    Manager = multiprocessing.managers.SyncManager()
+    Manager.start()
+    print(MeasureHandOff(pipeline.ring.RingQueue()) <
+          MeasureHandOff(Manager.Queue()))
+    Manager.shutdown()
+    print("Offline")
@@ -0,0 +1,141 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests that the commands and the answers of the admin
+    conversation are dispatched by the routes, in the language of the
+    user.
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import messages.router
+import messages.session
+import messages.msg_processor
+
+from test_user_registration import FakeSql, Language
+
+class Processor(object):
+    """
+    This class translates like a message processor of a german user.
+    """
+    Router = messages.router.CommandRouter()
+    Translations = {"back": "zurück", "channel": "Kanal", "YES": "JA"}
+
+    def __init__(self, LanguageName = "de_DE"):
+        self.LanguageName = LanguageName
+        self.Calls = 0
+
+    def _(self, Text):
+        self.Calls += 1
+        if self.LanguageName == "de_DE":
+            return self.Translations.get(Text, Text)
+        return Text
+
+    @Router.Route("/start")
+    def Start(self, MessageObject):
+        return "start"
+
+    @Router.Route("back", "menu", Translate = True)
+    def Back(self, MessageObject):
+        return "back"
+
+    @Router.Route("channel", "menu", Translate = True)
+    def Channel(self, MessageObject):
+        return "channel"
+
+    @Router.Route(None, "menu")
+    def Other(self, MessageObject):
+        return "other"
+
+def Process(Sql, Sessions, Text):
+    Update = {"update_id": 1,
+              "message": {"message_id": 1, "text": Text,
+                          "from": {"id": 1, "first_name": "Max"},
+                          "chat": {"id": 1}}}
+    Processor = messages.msg_processor.MessageProcessor(
+                            Update, None, Sql, None, Language(), None, {},
+                            Sessions = Sessions)
+    Session = Sessions.Get(Sql, None, Processor.InternalUserId) or {}
+    Processor.LastSendCommand = Session.get("Command")
+    Processor.LastSendData = Session.get("Last_Used_Data")
+    MessageObject = Processor.GetMessageObject()
+    if Text.startswith("/"):
+        return Processor.InterpretUserCommand(MessageObject)
+    return Processor.InterpretUserNonCommand(MessageObject)
+
+if __name__ == "__main__":
+    print("Online")
+    German = Processor()
+    Router = Processor.Router
+    print(Router.Dispatch(German, None, None, "/start") == "start")
+    # a command followed by more text
+    print(Router.Dispatch(German, None, None, "/start 123") == "start")
+    print(Router.Dispatch(German, None, "menu", "/start") == "other")
+    print(Router.Dispatch(German, "x", None, "/help") == "x")
+    # a command addressed to the bot in a group
+    print(Router.Dispatch(German, None, None, "/start@AnimeSubBot") == "start"
+          and Router.Dispatch(German, None, None, "/start@AnimeSubBot 1")
+          == "start")
+    print(Router.StripBotName("/admin@AnimeSubBot") == "/admin" and
+          Router.StripBotName("mail@example") == "mail@example" and
+          Router.StripBotName(None) is None)
+    # a command addressed to another bot of the group isn't ours
+    German.BotName = "AnimeSubBot"
+    print(Router.Dispatch(German, None, None, "/start@animesubbot") == "start"
+          and Router.Dispatch(German, "x", "menu", "/start@OtherBot") == "x")
+    print(Router.StripBotName("/cmd@OtherBot", "AnimeSubBot") is None and
+          Router.StripBotName("/cmd@AnimeSubBot 1", "@AnimeSubBot")
+          == "/cmd 1")
+    # the labels are matched in the language of the user
+    print(Router.Dispatch(German, None, "menu", "zurück") == "back")
+    print(Router.Dispatch(German, None, "menu", "Kanal Liste") == "channel")
+    print(Router.Dispatch(Processor("en_US"), None, "menu", "back")
+          == "back")
+    # and translated once per language
+    Calls = German.Calls
+    Router.Dispatch(German, None, "menu", "zurück")
+    print(German.Calls == Calls)
+    Keyboard = Router.GetKeyboard(German, (("channel",), ("YES", "NO")))
+    print(Keyboard == [["Kanal"], ["JA", "NO"]])
+    Keyboard[0].append("changed")
+    Calls = German.Calls
+    print(Router.GetKeyboard(German, (("channel",), ("YES", "NO")))
+          == [["Kanal"], ["JA", "NO"]] and German.Calls == Calls)
+    try:
+        Router.Add(Processor.Start, "/start")
+        print(False)
+    except ValueError:
+        print(True)
+
+    # the commands of the bot
+    Sql = FakeSql()
+    Sql.AddUser(1, "en_US", IsAdmin = True)
+    Sessions = messages.session.MemorySessionStore()
+    MessageObject = Process(Sql, Sessions, "/start")
+    print(MessageObject.Text.startswith("Welcome.") and
+          MessageObject.ReplyMarkup["keyboard"] == [["/help", "/admin"],
+                                                    ["/list"]])
+    print(Process(Sql, Sessions, "/unknown").Text.startswith(
+                                                        "I apologize"))
+    # the admin conversation
+    MessageObject = Process(Sql, Sessions, "/admin")
+    print(MessageObject.Text == "How can I help you?" and
+          MessageObject.Lane == MessageObject.ADMIN)
+    print(Sessions.Get(Sql, None, 100)["Command"] == "/admin")
+    MessageObject = Process(Sql, Sessions, "channel")
+    print(MessageObject.ReplyMarkup["keyboard"][0] == ["add channel"])
+    print(Sessions.Get(Sql, None, 100)["Command"] == "/admin channel")
+    MessageObject = Process(Sql, Sessions, "add channel")
+    print(MessageObject.Text.startswith("Please send the name"))
+    print(Sessions.Get(Sql, None, 100)["Command"] == "/admin channel add")
+    # back to the hub of the admin
+    Process(Sql, Sessions, "/admin")
+    Process(Sql, Sessions, "channel")
+    MessageObject = Process(Sql, Sessions, "back")
+    print(MessageObject.Text == "How can I help you?" and
+          Sessions.Get(Sql, None, 100)["Command"] == "/admin")
+    print("Offline")
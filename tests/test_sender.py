@@ -0,0 +1,110 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module sends messages over a slow fake api with the 
+    concurrent sender.
+'''
+import os
+import sys
+import time
+import queue
+import threading
+import http.client
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import network.sender
+import network.limiter
+import network.resilience
+
+Lock = threading.Lock()
+InFlight = [0, 0]
+
+def Send(Message):
+    with Lock:
+        InFlight[0] += 1
+        InFlight[1] = max(InFlight)
+    time.sleep(0.05)
+    with Lock:
+        InFlight[0] -= 1
+    return Message
+
+if __name__ == "__main__":
+    print("Online")
+    Workload = queue.Queue()
+    for Number in range(5):
+        for ChatId in range(8):
+            Workload.put((ChatId, (ChatId, Number)))
+
+    def Receive(Timeout):
+        Entries = []
+        try:
+            Entries.append(Workload.get(timeout = Timeout))
+            while True:
+                Entries.append(Workload.get_nowait())
+        except queue.Empty:
+            pass
+        return Entries
+
+    Sent = []
+    Scheduler = network.limiter.MessageScheduler(ChatRate = 100,
+                                                 ChatBurst = 100)
+    Sender = network.sender.AsyncSender(Scheduler, Receive, Send,
+                                        lambda Message, Answer:
+                                            Sent.append(Answer),
+                                        Concurrency = 4)
+    Start = time.time()
+    Sender.Run(lambda: not Workload.empty())
+    Sender.Close()
+
+    # 40 messages of 0.05 seconds with 4 in flight
+    print(len(Sent) == 40)
+    print(InFlight[1] == 4)
+    print(time.time() - Start < 1)
+    # the order inside of every chat is kept
+    print(all([Number for Chat, Number in Sent if Chat == ChatId] ==
+              list(range(5)) for ChatId in range(8)))
+
+    # a broken answer is retried, a message that keeps failing is given
+    # up, the sender keeps running
+    Errors = {1: [http.client.IncompleteRead(b"")], 2: [ValueError()] * 3}
+    def Failing(Message):
+        ChatId, Number = Message
+        if Errors.get(ChatId):
+            raise Errors[ChatId].pop(0)
+        return Message
+    Sent = []
+    Failed = []
+    Sender = network.sender.AsyncSender(
+                    network.limiter.MessageScheduler(ChatRate = 100,
+                                                     ChatBurst = 100),
+                    lambda Timeout: [], Failing,
+                    lambda Message, Answer: Sent.append(Answer),
+                    Backoff = network.resilience.Backoff(Base = 0.001,
+                                                         Maximum = 0.001),
+                    Failed = lambda Message, Error: Failed.append(Message),
+                    MaxAttempts = 3)
+    for ChatId in (1, 2):
+        Sender.Push(ChatId, (ChatId, 0))
+        Sender.Push(ChatId, (ChatId, 1))
+    Sender.Run(lambda: False)
+    Sender.Close()
+    print(sorted(Sent) == [(1, 0), (1, 1), (2, 1)])
+    print(Failed == [(2, 0)] and Errors[2] == [])
+
+    # the requests in flight at the deadline are finished by Close
+    Sent = []
+    Sender = network.sender.AsyncSender(
+                    network.limiter.MessageScheduler(ChatRate = 100,
+                                                     ChatBurst = 100),
+                    lambda Timeout: [], Send,
+                    lambda Message, Answer: Sent.append(Answer))
+    for ChatId in range(3):
+        Sender.Push(ChatId, (ChatId, 0))
+    Sender.Run(lambda: False, lambda: True)
+    print(Sent == [] and len(Sender.InFlight) == 3)
+    Sender.Close()
+    print(sorted(Sent) == [(0, 0), (1, 0), (2, 0)] and not Sender.InFlight)
+    print("Offline")
@@ -0,0 +1,172 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests that the sessions are written back in batches and
+    that a session changed by another worker is loaded again.
+'''
+import os
+import sys
+import time
+import threading
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import network.limiter
+import messages.batch
+import messages.session
+
+from test_batch import RecordingSql, Update
+
+class SessionSql(object):
+    """
+    This class keeps the Session_Table like the database and counts the
+    reads, the writes and the commits.
+    """
+    def __init__(self, Rows = None):
+        self.Rows = Rows if Rows is not None else {}
+        self.Reads = 0
+        self.Writes = 0
+        self.Commits = 0
+        self.Batching = False
+        self.Failing = False
+
+    def ExecuteTrueQuery(self, Cursor, Query, Data = None):
+        if Query.startswith("SELECT"):
+            self.Reads += 1
+            return [dict(self.Rows[Key], Command_By_User = Key)
+                    for Key in Data if Key in self.Rows]
+        self.Writes += 1
+        for Number in range(0, len(Data), 4):
+            self.Rows[Data[Number]] = dict(zip(
+                        messages.session.MemorySessionStore.COLUMNS,
+                        Data[Number + 1:Number + 4]))
+        return []
+
+    def Commit(self, Force = False):
+        if self.Batching and not Force:
+            return True
+        if self.Failing:
+            return False
+        self.Commits += 1
+        return True
+
+class SlowSql(SessionSql):
+    """
+    This class writes slowly, so that two write backs overlap.
+    """
+    def ExecuteTrueQuery(self, Cursor, Query, Data = None):
+        if not Query.startswith("SELECT"):
+            time.sleep(0.05)
+        return super().ExecuteTrueQuery(Cursor, Query, Data)
+
+def ChangeCommand(Versions, Rows):
+    Sql = SessionSql(dict(Rows))
+    Store = messages.session.MemorySessionStore(Versions = Versions)
+    Store.Set(Sql, None, 10, Command = "/admin channel")
+    Store.Flush(Sql, None)
+    Rows.update(Sql.Rows)
+
+if __name__ == "__main__":
+    print("Online")
+    Clock = network.limiter.FakeClock()
+    Sql = SessionSql({10: {"Command": "/admin", "Last_Used_Id": None,
+                           "Last_Used_Data": None}})
+    Store = messages.session.MemorySessionStore(TimeToLive = 60,
+                                                FlushInterval = 1,
+                                                Clock = Clock)
+    Store.Prefetch(Sql, None, [10, 20])
+    print(Sql.Reads == 1 and len(Store) == 2)
+    print(Store.Get(Sql, None, 10)["Command"] == "/admin" and
+          Store.Get(Sql, None, 20) is None)
+    # the changes don't touch the database
+    Store.Set(Sql, None, 10, Command = "/admin anime", Last_Used_Id = 5)
+    Store.Set(Sql, None, 20, Command = "/language")
+    Store.Set(Sql, None, 20, Last_Used_Data = "x")
+    print(Sql.Reads == 1 and Sql.Writes == 0 and Sql.Commits == 0)
+    print(Store.Get(Sql, None, 20) == {"Command": "/language",
+                                       "Last_Used_Id": None,
+                                       "Last_Used_Data": "x"})
+    # until they are due, then with a single statement
+    print(Store.FlushIfDue(Sql, None) == 0)
+    Clock.Advance(1)
+    print(Store.FlushIfDue(Sql, None) == 2)
+    print(Sql.Writes == 1 and Sql.Commits == 1)
+    print(Sql.Rows[10]["Last_Used_Id"] == 5 and
+          Sql.Rows[20]["Command"] == "/language")
+    Clock.Advance(1)
+    print(Store.FlushIfDue(Sql, None) == 0 and Sql.Writes == 1)
+
+    # an abandoned conversation is cleared, the session is forgotten
+    Clock.Advance(60)
+    print(Store.FlushIfDue(Sql, None) == 2)
+    print(Sql.Rows[10]["Command"] == "0" and Sql.Rows[10]["Last_Used_Id"] == 0)
+    Clock.Advance(60)
+    Store.FlushIfDue(Sql, None)
+    print(len(Store) == 0 and Store.GetMetrics()["Dirty"] == 0)
+
+    # a session changed by another worker is loaded again
+    Versions = messages.session.SessionVersions(Size = 64)
+    Rows = multiprocessing.Manager().dict(Sql.Rows)
+    Sql = SessionSql(dict(Rows))
+    Store = messages.session.MemorySessionStore(Versions = Versions)
+    print(Store.Get(Sql, None, 10)["Command"] == "0")
+    Process = multiprocessing.Process(target = ChangeCommand,
+                                      args = (Versions, Rows))
+    Process.start()
+    Process.join()
+    Sql.Rows = dict(Rows)
+    print(Store.Get(Sql, None, 10)["Command"] == "/admin channel" and
+          Sql.Reads == 2)
+    # a change not written back yet is waited for
+    Other = messages.session.MemorySessionStore(Versions = Versions,
+                                                WaitTimeout = 0.05)
+    Other.Set(Sql, None, 20, Command = "/settings")
+    print(Versions.IsPending(20) and not Versions.IsPending(10))
+    Start = Other.Clock.Now()
+    Store.Get(Sql, None, 20)
+    print(Other.Clock.Now() - Start >= 0.05)
+    Other.Flush(Sql, None)
+    print(not Versions.IsPending(20) and
+          Store.Get(Sql, None, 20)["Command"] == "/settings")
+
+    # the batch loads the sessions into the store
+    Store = messages.session.MemorySessionStore()
+    Sql = RecordingSql()
+    Batch = messages.batch.Batch.Load(Sql, None, [Update(1, "a"),
+                                                  Update(2, "b")],
+                                      Sessions = Store)
+    print(len(Sql.Queries) == 2 and not Batch.HasSession(10))
+    print(Store.Get(Sql, None, 10)["Command"] == "/admin" and
+          len(Sql.Queries) == 2)
+
+    # the sessions are committed at once, even inside of a batch
+    Versions = messages.session.SessionVersions(Size = 64)
+    Store = messages.session.MemorySessionStore(Versions = Versions)
+    Sql = SessionSql()
+    Sql.Batching = True
+    Store.Set(Sql, None, 30, Command = "/admin")
+    print(Store.Flush(Sql, None) == 1 and Sql.Commits == 1 and
+          not Versions.IsPending(30))
+    # a failed commit leaves them to be written back
+    Sql.Failing = True
+    Store.Set(Sql, None, 30, Command = "/admin anime")
+    print(Store.Flush(Sql, None) == 0 and Versions.IsPending(30))
+    Sql.Failing = False
+    print(Store.Flush(Sql, None) == 1 and not Versions.IsPending(30))
+    # concurrent write backs count a session only once
+    Sql = SlowSql()
+    for InternalId in (40, 41, 42):
+        Store.Set(Sql, None, InternalId, Command = "/settings")
+    Threads = [threading.Thread(target = Store.Flush, args = (Sql, None))
+               for Number in range(4)]
+    for Thread in Threads:
+        Thread.start()
+    for Thread in Threads:
+        Thread.join()
+    print(Sql.Writes == 1 and
+          all(Versions._Pending[InternalId] == 0
+              for InternalId in (40, 41, 42)))
+    print("Offline")
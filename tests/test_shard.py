@@ -0,0 +1,208 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests that the updates of a chat stay in order, while the
+    workers are added and removed.
+'''
+import os
+import sys
+import queue
+import time
+import ctypes
+import threading
+import collections
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import pipeline.shard
+
+class Worker(object):
+    """
+    A worker of the test, it processes the updates of its queue when it's
+    told to.
+    """
+
+    def __init__(self, Name, Processed):
+        self.Name = Name
+        self.Queue = queue.Queue()
+        self.Progress = ctypes.c_uint64(0)
+        self.Processed = Processed
+
+    def Process(self, Amount = None):
+        while Amount is None or Amount > 0:
+            try:
+                Sequence, Update = self.Queue.get_nowait()
+            except queue.Empty:
+                return
+            self.Processed.append((self.Name, Update))
+            self.Progress.value = Sequence
+            if Amount is not None:
+                Amount -= 1
+
+def Update(Number, ChatId):
+    return {"update_id": Number,
+            "message": {"chat": {"id": ChatId}, "text": str(Number)}}
+
+def IsInOrder(Processed):
+    Last = {}
+    for Name, Item in Processed:
+        ChatId = Item["message"]["chat"]["id"]
+        if Last.get(ChatId, -1) > Item["update_id"]:
+            return False
+        Last[ChatId] = Item["update_id"]
+    return True
+
+if __name__ == "__main__":
+    print("Online")
+    # the hash ring moves only the keys of the new node
+    Ring = pipeline.shard.HashRing()
+    for Name in ("Worker-1", "Worker-2", "Worker-3"):
+        Ring.Add(Name)
+    Before = {Key: Ring.Get(Key) for Key in range(10000)}
+    print(min(collections.Counter(Before.values()).values()) > 2000)
+    Ring.Add("Worker-4")
+    Moved = [Key for Key in Before if Ring.Get(Key) != Before[Key]]
+    print(all(Ring.Get(Key) == "Worker-4" for Key in Moved))
+    print(1500 < len(Moved) < 3500)
+    Ring.Remove("Worker-4")
+    print(all(Ring.Get(Key) == Before[Key] for Key in Before))
+    print(len(Ring) == 3 and "Worker-4" not in Ring)
+    print(pipeline.shard.HashRing().Get(1) is None)
+
+    # every chat goes to a single worker
+    Input = queue.Queue()
+    Processed = []
+    Dispatcher = pipeline.shard.ShardDispatcher(Input)
+    print(Dispatcher.RunOnce(0) is False)
+    Workers = {}
+    for Name in ("Worker-1", "Worker-2"):
+        Workers[Name] = Worker(Name, Processed)
+        Dispatcher.AddShard(Name, Workers[Name].Queue,
+                            Workers[Name].Progress)
+    for Number in range(1000):
+        Input.put(Update(Number, Number % 50))
+    while Dispatcher.RunOnce(0):
+        pass
+    print(Dispatcher.GetDepth() == 1000 and Dispatcher.IsIdle())
+    for Name in Workers:
+        Workers[Name].Process()
+    Owners = collections.defaultdict(set)
+    for Name, Item in Processed:
+        Owners[Item["message"]["chat"]["id"]].add(Name)
+    print(all(len(Names) == 1 for Names in Owners.values()))
+    print(len(set.union(*Owners.values())) == 2)
+    print(IsInOrder(Processed) and Dispatcher.GetDepth() == 0)
+
+    # a new worker while the others still have updates queued, the moved
+    # chats wait until their old worker is done with them
+    Processed[:] = []
+    for Number in range(1000, 1200):
+        Input.put(Update(Number, Number % 50))
+    while Dispatcher.RunOnce(0):
+        pass
+    Workers["Worker-3"] = Worker("Worker-3", Processed)
+    Dispatcher.AddShard("Worker-3", Workers["Worker-3"].Queue,
+                        Workers["Worker-3"].Progress)
+    for Number in range(1200, 1400):
+        Input.put(Update(Number, Number % 50))
+    while Dispatcher.RunOnce(0):
+        pass
+    print(len(Dispatcher.Parked) > 0 and Workers["Worker-3"].Queue.empty())
+    Workers["Worker-1"].Process(10)
+    Dispatcher.FlushParked()
+    # the chats of the first worker have not been done yet
+    print(len(Dispatcher.Parked) > 0)
+    for Name in Workers:
+        Workers[Name].Process()
+    Dispatcher.FlushParked()
+    print(not Dispatcher.Parked and not Workers["Worker-3"].Queue.empty())
+    Workers["Worker-3"].Process()
+    print(len(Processed) == 400 and IsInOrder(Processed))
+
+    # a removed worker gets no update anymore
+    Dispatcher.RemoveShard("Worker-1")
+    Processed[:] = []
+    for Number in range(1400, 1600):
+        Input.put(Update(Number, Number % 50))
+    while Dispatcher.RunOnce(0):
+        pass
+    print(Workers["Worker-1"].Queue.empty())
+    for Name in Workers:
+        Workers[Name].Process()
+    print(len(Processed) == 200 and IsInOrder(Processed))
+
+    # without any worker the updates stay in the input queue
+    Dispatcher.RemoveShard("Worker-2")
+    Dispatcher.RemoveShard("Worker-3")
+    Input.put(Update(1600, 1))
+    print(Dispatcher.RunOnce(0) is False and Input.qsize() == 1)
+    print(pipeline.shard.GetChatId({"update_id": 7}) == 7)
+    # every kind of update is keyed on its chat
+    print(pipeline.shard.GetChatId({"update_id": 8, "edited_message":
+                                    {"chat": {"id": 3}}}) == 3)
+    print(pipeline.shard.GetChatId({"update_id": 9, "channel_post":
+                                    {"chat": {"id": -4}}}) == -4)
+    print(pipeline.shard.GetChatId({"update_id": 10, "callback_query":
+                                    {"from": {"id": 6},
+                                     "message": {"chat": {"id": 5}}}}) == 5)
+    print(pipeline.shard.GetChatId({"update_id": 11, "inline_query":
+                                    {"from": {"id": 6}}}) == 6)
+
+    # a full queue holds back the dispatcher, but not the main loop
+    Input = queue.Queue()
+    Processed = []
+    Dispatcher = pipeline.shard.ShardDispatcher(Input, PollTimeout = 0.01)
+    Slow = Worker("Worker-1", Processed)
+    Slow.Queue = queue.Queue(2)
+    Dispatcher.AddShard("Worker-1", Slow.Queue, Slow.Progress)
+    for Number in range(5):
+        Input.put(Update(Number, 1))
+    Thread = threading.Thread(target = lambda: [Dispatcher.RunOnce(0)
+                                                for Number in range(5)])
+    Thread.start()
+    time.sleep(0.1)
+    Start = time.monotonic()
+    print(Dispatcher.GetDepth() == 5 and not Dispatcher.IsIdle() and
+          time.monotonic() - Start < 0.05)
+    Fast = Worker("Worker-2", Processed)
+    Dispatcher.AddShard("Worker-2", Fast.Queue, Fast.Progress)
+    # the worker dies, its updates go to the other one in their order
+    Dispatcher.RemoveShard("Worker-1")
+    Thread.join()
+    print(Dispatcher.Recover("Worker-1", Slow.Queue) == 2)
+    while Dispatcher.RunOnce(0):
+        pass
+    Dispatcher.FlushParked()
+    Fast.Process()
+    print([Item["update_id"] for Name, Item in Processed] == [0, 1, 2, 3, 4]
+          and Dispatcher.IsIdle())
+
+    # the owners are only walked through when their amount has doubled
+    Input = queue.Queue()
+    Dispatcher = pipeline.shard.ShardDispatcher(Input)
+    Busy = Worker("Worker-1", [])
+    Dispatcher.AddShard("Worker-1", Busy.Queue, Busy.Progress)
+    Scans = [0]
+    ForgetDoneOwners = Dispatcher._ForgetDoneOwners_
+    def CountingForget():
+        Limit = Dispatcher._OwnersLimit
+        ForgetDoneOwners()
+        Scans[0] += Dispatcher._OwnersLimit != Limit
+    Dispatcher._ForgetDoneOwners_ = CountingForget
+    for Number in range(20000):
+        Input.put(Update(Number, Number))
+    while Dispatcher.RunOnce(0):
+        pass
+    print(Scans[0] == 3 and len(Dispatcher.Owners) == 20000)
+    Busy.Process()
+    Input.put(Update(20000, 20000))
+    for Number in range(20001, 32768):
+        Input.put(Update(Number, Number))
+    while Dispatcher.RunOnce(0):
+        pass
+    # the done ones are forgotten then
+    print(Scans[0] == 4 and len(Dispatcher.Owners) == 12768 and
+          Dispatcher._OwnersLimit == 2 * 12768)
+    print("Offline")
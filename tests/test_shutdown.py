@@ -0,0 +1,191 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests that the shutdown keeps its deadline and that
+    what's left at the deadline is saved and restored.
+'''
+import os
+import sys
+import time
+import ctypes
+import shutil
+import gettext
+import logging
+import tempfile
+import multiprocessing
+import multiprocessing.managers
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import telegram
+import network.sender
+import network.limiter
+import pipeline.ring
+import pipeline.shutdown
+import messages.message
+
+from fake_telegram_api import FakeTelegramApi
+
+class Language(object):
+    def CreateTranslationObject(self, Languages = None):
+        return gettext.NullTranslations()
+
+def Sleep(Seconds):
+    time.sleep(Seconds)
+
+def StartOutput(Api, Manager, Queue, Deadline, Depth = None, **Options):
+    Events = {"Shutdown": Manager.Event(), "Done": Manager.Event()}
+    Output = telegram.OutputTelegramAPI(
+                     ApiToken = Api.Token,
+                     RequestTimer = "1000",
+                     LoggingObject = logging.getLogger("Test"),
+                     LanguageObject = Language(),
+                     ControllerQueue = Manager.Queue(),
+                     WorkloadQueue = Queue,
+                     SendMessagesQueue = Manager.Queue(1000),
+                     ConnectionEvent = Manager.Event(),
+                     WorkloadDoneEvent = Events["Done"],
+                     ShutDownEvent = Events["Shutdown"],
+                     Configuration = {"Telegram": dict(Options,
+                                                       BaseUrl = Api.BaseUrl,
+                                                       ChatRateLimit = "1")},
+                     ShutdownDeadline = Deadline,
+                     SchedulerDepth = Depth,
+                     )
+    return Output, Events
+
+if __name__ == "__main__":
+    print("Online")
+    # the stages share the deadline
+    Clock = network.limiter.FakeClock()
+    Reports = []
+    Coordinator = pipeline.shutdown.ShutdownCoordinator(
+                                10, Clock, Reports.append, ReportInterval = 1)
+    print(Coordinator.WaitFor("Input", lambda: True) is True)
+    Left = [100]
+    def Drain():
+        Left[0] -= 5
+        return Left[0] <= 0
+    print(Coordinator.WaitFor("Dispatcher", Drain, lambda: Left[0],
+                              PollInterval = 0.1) is True)
+    print(abs(Coordinator.GetRemaining() - 8.1) < 1e-6)
+    # a stage can be limited, so that the next ones get some time
+    print(Coordinator.WaitFor("Workers", lambda: False,
+                              Timeout = 3) is False)
+    print(abs(Coordinator.GetRemaining() - 5.1) < 1e-6)
+    print(Coordinator.WaitFor("Output", lambda: False, Grace = 2) is False)
+    print(Coordinator.IsOver() and Clock.Now() == 12)
+    Metrics = Coordinator.GetMetrics()
+    print([Stage["Stage"] for Stage in Metrics["Stages"]] ==
+          ["Input", "Dispatcher", "Workers", "Output"])
+    print([Stage["Done"] for Stage in Metrics["Stages"]] ==
+          [True, True, False, False])
+    # the progress is reported while a stage drains
+    print(any(Report["Stage"] == "Dispatcher" and not Report["Done"]
+              for Report in Reports))
+
+    # the processes are waited for at the same time
+    Processes = [multiprocessing.Process(target = Sleep, args = (Seconds,))
+                 for Seconds in (0.3, 0.3, 0.3, 30)]
+    for Process in Processes:
+        Process.start()
+    Start = time.monotonic()
+    Coordinator = pipeline.shutdown.ShutdownCoordinator(1)
+    Alive = Coordinator.Join("Workers", Processes, Grace = 0.2)
+    print(Alive == Processes[3:] and time.monotonic() - Start < 1.5)
+    print(Coordinator.Stages[-1]["Left"] == 1)
+    for Process in Alive:
+        Process.terminate()
+        Process.join()
+
+    # the spilled updates come back in their order
+    Directory = tempfile.mkdtemp()
+    try:
+        print(pipeline.shutdown.Spill(os.path.join(Directory, "Worker-1"),
+                                      ({"update_id": Number}
+                                       for Number in range(5))) == 5)
+        print(pipeline.shutdown.Spill(os.path.join(Directory, "Worker-2"),
+                                      []) == 0)
+        print(pipeline.shutdown.Spill(os.path.join(Directory, "MainWorker"),
+                                      [{"update_id": 9}]) == 1)
+        Restored = []
+        print(pipeline.shutdown.Restore(Directory, Restored.append) == 6)
+        print([Update["update_id"] for Update in Restored] ==
+              [9, 0, 1, 2, 3, 4])
+        print(pipeline.shutdown.Restore(Directory, Restored.append) == 0)
+        print(pipeline.shutdown.Restore(os.path.join(Directory, "None"),
+                                        Restored.append) == 0)
+    finally:
+        shutil.rmtree(Directory)
+
+    # the sender stops at the deadline, the rest stays pending
+    Scheduler = network.limiter.MessageScheduler(ChatRate = 1)
+    Sent = []
+    Sender = network.sender.AsyncSender(Scheduler, lambda Timeout: [],
+                                        lambda Message: Message,
+                                        lambda Message, Answer:
+                                            Sent.append(Answer))
+    for Number in range(10):
+        Sender.Push(1, Number)
+    Start = time.monotonic()
+    Sender.Run(lambda: False, lambda: True)
+    Sender.Close()
+    print(time.monotonic() - Start < 1)
+    print(len(Sent) + Sender.Pending() == 10 and Sender.Pending() >= 9)
+
+    # the output process keeps the messages of the deadline in its spool
+    # and sends them after the next start
+    Api = FakeTelegramApi()
+    Api.Start()
+    WorkingDirectory = os.getcwd()
+    Directory = tempfile.mkdtemp()
+    os.chdir(Directory)
+    Manager = multiprocessing.managers.SyncManager()
+    Manager.start()
+    try:
+        Queue = pipeline.ring.RingQueue(1 << 16)
+        Deadline = multiprocessing.RawValue(ctypes.c_double, 0)
+        Output, Events = StartOutput(Api, Manager, Queue, Deadline)
+        for Number in range(10):
+            Queue.put(messages.message.MessageToBeSend(1, str(Number)))
+        time.sleep(0.5)
+        Start = time.monotonic()
+        Deadline.value = time.time() + 1
+        Events["Shutdown"].set()
+        Events["Done"].set()
+        Output.join()
+        # one message per second to the chat
+        print(time.monotonic() - Start < 3)
+        Sent = Api.GetStatistics()["Sent"]
+        print(0 < Sent < 10)
+
+        Deadline.value = 0
+        Output, Events = StartOutput(Api, Manager, Queue, Deadline)
+        Events["Shutdown"].set()
+        Events["Done"].set()
+        Output.join()
+        print(Api.GetStatistics()["Sent"] == 10)
+
+        # the scheduler takes no more than SchedulerLimit messages, the
+        # others wait in the queue
+        Depth = multiprocessing.RawValue(ctypes.c_uint64, 0)
+        Output, Events = StartOutput(Api, Manager, Queue, Deadline, Depth,
+                                     SchedulerLimit = "3")
+        for Number in range(10):
+            Queue.put(messages.message.MessageToBeSend(2, str(Number)))
+        time.sleep(0.5)
+        print(Queue.qsize() >= 6 and 0 < Depth.value <= 3)
+        Deadline.value = time.time() + 0.5
+        Events["Shutdown"].set()
+        Events["Done"].set()
+        Output.join()
+        # the rest is kept in the spool
+        print(Queue.qsize() == 0)
+    finally:
+        Manager.shutdown()
+        Api.Stop()
+        os.chdir(WorkingDirectory)
+        shutil.rmtree(Directory)
+    print("Offline")
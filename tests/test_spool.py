@@ -0,0 +1,73 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests the spool of the outgoing messages, also after
+    the process writing it has been killed.
+'''
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+SourceDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "..", "src")
+sys.path.insert(0, SourceDirectory)
+
+import pipeline.spool
+
+KilledWriter = """
+import os
+import sys
+sys.path.insert(0, {Source!r})
+import pipeline.spool
+Spool = pipeline.spool.Spool({Directory!r})
+for Number in range(1000):
+    Sequence = Spool.Append(str(Number).encode("utf-8"))
+    if Number % 2:
+        Spool.Ack(Sequence)
+os.kill(os.getpid(), 9)
+"""
+
+if __name__ == "__main__":
+    print("Online")
+    Directory = tempfile.mkdtemp()
+    try:
+        Spool = pipeline.spool.Spool(Directory, SegmentSize = 4)
+        Sequences = [Spool.Append(str(Number).encode("utf-8"))
+                     for Number in range(10)]
+        for Sequence in Sequences[:5]:
+            Spool.Ack(Sequence)
+        print(len(Spool) == 5)
+        # the first segment is done and removed
+        print(len(os.listdir(Directory)) == 4)
+        Spool.Close()
+
+        Spool = pipeline.spool.Spool(Directory, SegmentSize = 4)
+        print(Spool.Replay() == [(Number, str(Number).encode("utf-8"))
+                                 for Number in range(5, 10)])
+        Spool.Close()
+
+        # a record torn by a crash while writing is cut off
+        with open(os.path.join(Directory, "{:020d}.log".format(8)),
+                  "ab") as LogFile:
+            LogFile.write(b"\x05\x00\x00")
+        Spool = pipeline.spool.Spool(Directory, SegmentSize = 4)
+        print(len(Spool.Replay()) == 5)
+        print(Spool.Append(b"10") == 10)
+        Spool.Close()
+    finally:
+        shutil.rmtree(Directory)
+
+    Directory = tempfile.mkdtemp()
+    try:
+        subprocess.call([sys.executable, "-c",
+                         KilledWriter.format(Source = SourceDirectory,
+                                             Directory = Directory)])
+        Spool = pipeline.spool.Spool(Directory)
+        print(len(Spool.Replay()) == 500)
+        Spool.Close()
+    finally:
+        shutil.rmtree(Directory)
+    print("Offline")
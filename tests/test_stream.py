@@ -0,0 +1,60 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module decodes a recorded getUpdates answer in small chunks.
+'''
+import io
+import os
+import sys
+import gzip
+import json
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import network.stream
+
+Updates = [{"update_id": 469262057 + Number,
+            "message": {"date": 1439471738,
+                        "text": "/start ✓ {}".format(Number),
+                        "message_id": 111 + Number,
+                        "chat": {"id": 3000006, "first_name": "Max"}
+                        }
+            } for Number in range(100)]
+Body = json.dumps({"ok": True, "result": Updates}).encode("utf-8")
+
+class RecordedResponse(object):
+    def __init__(self, Data, Encoding = None):
+        self.File = io.BytesIO(Data)
+        self.Encoding = Encoding
+
+    def getheader(self, Name):
+        return self.Encoding
+
+    def read(self, Amount):
+        return self.File.read(Amount)
+
+def Split(Data, Size):
+    return [Data[Start:Start + Size] for Start in range(0, len(Data), Size)]
+
+if __name__ == "__main__":
+    print("Online")
+    # every chunk size, also splitting multi byte characters
+    for Size in (1, 7, 1000, len(Body)):
+        Stream = network.stream.ResultStream(Split(Body, Size))
+        print(list(Stream) == Updates and Stream.Fields == {"ok": True})
+
+    Stream = network.stream.ResultStream([b'{"ok":false,"error_code":409,',
+                                          b'"description":"Conflict"}'])
+    print(list(Stream) == [] and Stream.Fields["error_code"] == 409)
+
+    for Encoding, Data in (("gzip", gzip.compress(Body)),
+                           ("deflate", zlib.compress(Body)),
+                           ("deflate", zlib.compress(Body)[2:-4]),
+                           (None, Body)):
+        Chunks = network.stream.IterateBody(RecordedResponse(Data, Encoding),
+                                            1000)
+        print(list(network.stream.ResultStream(Chunks)) == Updates)
+    print("Offline")
@@ -1,17 +1,36 @@
-from importlib.machinery import SourceFileLoader
+import os
+import sys
+import gettext
+import logging
 
-custom_logging = SourceFileLoader("telegram", "../src/telegram.py").load_module()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import telegram
+import messages.message
+
+from fake_telegram_api import FakeTelegramApi
+
+class Language(object):
+    def CreateTranslationObject(self, Languages = None):
+        return gettext.NullTranslations()
 
 if __name__ == "__main__":
     print('online')
     import pprint
 
-    OrgTok = "80578257:AAEt5tHodsbD6P3hqumKYFJAyHTGWEgcyEY"
-    FalTok = "80578257:AAEt5aH64bD6P3hqumKYFJAyHTGWEgcyEY"
-    a = TelegramApi(OrgTok,
-                    500)
+    # The requests go to the local stand-in of the bot API.
+    Server = FakeTelegramApi()
+    Server.Start()
+    Server.AddUpdate(3000006, "/start")
 
-    Update = a.GetUpdates(469262639 + 1)
+    a = telegram.TelegramApi(Server.Token,
+                             500,
+                             logging.getLogger(),
+                             Language(),
+                             BaseUrl = Server.BaseUrl)
+
+    Update = a.GetUpdates()
     print(Update)
     try:
         print(Update["result"][len(Update["result"]) - 1]["update_id"])
@@ -21,7 +40,7 @@ if __name__ == "__main__":
             ["chat"]["id"], "1"
         )
         MessageObject.ReplyKeyboardMarkup(
-                                          Keybord=[["Top Left",
+                                          Keyboard=[["Top Left",
                                                     "Top Right"],
                                                    ["Bottom Left",
                                                     "Bottom Right" ]
@@ -34,6 +53,13 @@ if __name__ == "__main__":
         MessageObject.ReplyKeyboardHide(Selective=True)
 
         print(a.SendMessage(MessageObject))
+
+        # a 429 answer carries the seconds to wait
+        Server.InjectRateLimit()
+        try:
+            a.SendMessage(MessageObject)
+        except telegram.urllib.error.HTTPError as Error:
+            print(Error.code == 429 and Error.RetryAfter == 1)
     except:
         pass
 #     if a:
@@ -41,4 +67,5 @@ if __name__ == "__main__":
 #         pprint.PrettyPrinter(indent=4).pprint((a.GetUpdates()))
 #     else:
 #         print("None")
-    print('offline')
\ No newline at end of file
+    Server.Stop()
+    print('offline')
@@ -0,0 +1,82 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests the cache of the users and that a change of a user
+    is seen by the caches of the other processes.
+'''
+import os
+import sys
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import network.limiter
+import messages.batch
+import messages.user_cache
+
+from test_batch import RecordingSql, Update
+
+def ChangeLanguage(Log, UserId):
+    Cache = messages.user_cache.UserCache(Invalidations = Log)
+    Cache.Update(UserId, 10, True, "en_US")
+
+if __name__ == "__main__":
+    print("Online")
+    Clock = network.limiter.FakeClock()
+    Cache = messages.user_cache.UserCache(MaxSize = 2, TimeToLive = 60,
+                                          Clock = Clock)
+    print(Cache.Get(1) is None)
+    Cache.Set(1, 10, True, "de_DE")
+    print(Cache.Get(1) == {"Internal_Id": 10, "Is_Admin": True,
+                           "Language": "de_DE"})
+    # the returned user is a copy
+    Cache.Get(1)["Language"] = None
+    print(Cache.Get(1)["Language"] == "de_DE")
+    # the least recently used user is forgotten first
+    Cache.Set(2, 20, False, "en_US")
+    Cache.Get(1)
+    Cache.Set(3, 30, False, "en_US")
+    print(Cache.Get(2) is None and Cache.Get(1) is not None)
+    # the users expire
+    Clock.Advance(61)
+    print(Cache.Get(1) is None and len(Cache) == 1)
+    Metrics = Cache.GetMetrics()
+    print(Metrics["Hits"] == 5 and Metrics["Misses"] == 3)
+
+    # the change of a user in another process
+    Log = messages.user_cache.InvalidationLog(Size = 4)
+    Cache = messages.user_cache.UserCache(Invalidations = Log)
+    Cache.Set(1, 10, False, "de_DE")
+    Cache.Set(2, 20, False, "de_DE")
+    Process = multiprocessing.Process(target = ChangeLanguage,
+                                      args = (Log, 1))
+    Process.start()
+    Process.join()
+    print(Cache.Get(1) is None and Cache.Get(2) is not None)
+    # the own change isn't forgotten
+    Cache.Update(2, 20, True, "en_US")
+    print(Cache.Get(2)["Is_Admin"] is True)
+    # too many changes at once, everything is forgotten
+    Cache.Set(1, 10, False, "de_DE")
+    for UserId in range(100, 105):
+        Log.Publish(UserId)
+    print(Cache.Get(2) is None and len(Cache) == 0)
+    Cache.Set(2, 20, True, "en_US")
+    Cache.Invalidate(2)
+    print(Cache.Get(2) is None and Log.GetSequence() == 8)
+
+    # the batch only queries the users that aren't cached
+    Cache = messages.user_cache.UserCache()
+    Sql = RecordingSql()
+    Updates = [Update(1, "a"), Update(2, "b"), Update(3, "c")]
+    messages.batch.Batch.Load(Sql, None, Updates, Cache)
+    print(Sql.Queries[0][1] == (1, 2, 3))
+    print(Cache.Get(1)["Language"] == "de_DE" and Cache.Get(3) is None)
+    Sql = RecordingSql()
+    Batch = messages.batch.Batch.Load(Sql, None, Updates, Cache)
+    print(Sql.Queries[0][1] == (3,))
+    print(Batch.GetUser(2)["Internal_Id"] == 20)
+    print(Batch.HasSession(10) and Batch.HasSession(20))
+    print("Offline")
@@ -0,0 +1,125 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module tests that a new user is added with as few round trips
+    to the database as possible and a single commit.
+'''
+import os
+import sys
+import gettext
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import messages.batch
+import messages.msg_processor
+
+class Language(object):
+    def CreateTranslationObject(self, Languages = None):
+        return gettext.NullTranslations()
+
+class FakeSql(object):
+    """
+    This class answers the queries of the registration like the database
+    and counts the round trips and the commits.
+    """
+    def __init__(self):
+        self.Users = {}
+        self.Settings = {}
+        self.RoundTrips = 0
+        self.Commits = 0
+        self.RowCount = -1
+        self.LastRowId = None
+
+    def AddUser(self, UserId, Language = None, IsAdmin = False):
+        InternalId = 100 + len(self.Users)
+        self.Users[UserId] = {"Internal_Id": InternalId, "Is_Admin": IsAdmin}
+        if Language is not None:
+            self.Settings[InternalId] = Language
+
+    def SelectEntry(self, Cursor, FromTable, Columns, Where, Data):
+        self.RoundTrips += 1
+        return [{"Id": 1, "Default_String": "en_US"}]
+
+    def ExecuteTrueQuery(self, Cursor, Query, Data = None):
+        self.RoundTrips += 1
+        if Query.startswith("INSERT INTO User_Table"):
+            UserId = Data["External_Id"]
+            # with CLIENT_FOUND_ROWS an existing user counts as well
+            self.RowCount = 1
+            if UserId not in self.Users:
+                self.AddUser(UserId)
+            self.LastRowId = self.Users[UserId]["Internal_Id"]
+        elif Query.startswith("INSERT INTO User_Setting_Table"):
+            self.Settings.setdefault(Data["User"], Data["Value"])
+        elif Query == messages.batch.Batch.USER_QUERY.format(
+                                                    Placeholders = "%s"):
+            User = self.Users.get(Data[0])
+            if User is None:
+                return []
+            return [{"External_Id": Data[0],
+                     "Internal_Id": User["Internal_Id"],
+                     "Is_Admin": int(User["Is_Admin"]),
+                     "User_String": self.Settings.get(User["Internal_Id"])}]
+        return []
+
+    def GetRowCount(self, Cursor):
+        return self.RowCount
+
+    def GetLastRowId(self, Cursor):
+        return self.LastRowId
+
+    def Commit(self):
+        self.Commits += 1
+
+def Process(Sql, UserId, Batch = None):
+    Update = {"update_id": 1,
+              "message": {"message_id": 1, "text": "/start",
+                          "from": {"id": UserId, "first_name": "Max"},
+                          "chat": {"id": UserId}}}
+    Sql.RoundTrips = Sql.Commits = 0
+    return messages.msg_processor.MessagePreProcessor(
+                            Update, None, Sql, None, Language(), None, {},
+                            Batch = Batch)
+
+if __name__ == "__main__":
+    print("Online")
+    Sql = FakeSql()
+    # the first new user of the process queries the default settings
+    Processor = Process(Sql, 1)
+    print(Processor.InternalUserId == 100 and Processor.IsAdmin is False)
+    print(Processor.LanguageName == "en_US" and Sql.Settings[100] == "en_US")
+    print(Sql.RoundTrips == 5 and Sql.Commits == 1)
+    # the next ones don't
+    Process(Sql, 2)
+    print(Sql.RoundTrips == 4 and Sql.Commits == 1)
+    # the users of a batch are known to be new
+    Batch = messages.batch.Batch()
+    Processor = Process(Sql, 3, Batch)
+    print(Sql.RoundTrips == 3 and Sql.Commits == 1)
+    print(Batch.GetUser(3) == {"Internal_Id": 102, "Is_Admin": False,
+                               "Language": "en_US"})
+
+    # a known user is loaded with a single query
+    Sql.AddUser(4, "de_DE", IsAdmin = True)
+    Processor = Process(Sql, 4)
+    print(Processor.IsAdmin is True and Processor.LanguageName == "de_DE")
+    print(Sql.RoundTrips == 1 and Sql.Commits == 0)
+    # a user without a language gets the default one
+    Sql.AddUser(5)
+    Processor = Process(Sql, 5)
+    print(Processor.InternalUserId == 104 and
+          Processor.LanguageName == "en_US" and Sql.Settings[104] == "en_US")
+    print(Sql.RoundTrips == 4 and Sql.Commits == 1)
+    # the user has been added by another worker since the batch was
+    # loaded, nothing is added twice and he keeps his own settings
+    Sql.AddUser(6, "de_DE", IsAdmin = True)
+    Batch = messages.batch.Batch()
+    Processor = Process(Sql, 6, Batch)
+    print(Processor.InternalUserId == 105 and Processor.IsAdmin is True and
+          Processor.LanguageName == "de_DE")
+    print(Batch.GetUser(6) == {"Internal_Id": 105, "Is_Admin": True,
+                               "Language": "de_DE"})
+    print(Sql.RoundTrips == 2 and len(Sql.Users) == 6)
+    print("Offline")
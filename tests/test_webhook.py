@@ -0,0 +1,72 @@
+#!/usr/bin/python3.4
+# -*- coding: utf-8 -*-
+
+'''
+    This module posts a recorded update to the webhook server.
+'''
+import os
+import sys
+import json
+import queue
+import threading
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import telegram
+
+RecordedUpdate = {
+    "update_id": 469262057,
+    "message": {
+        "date": 1439471738,
+        "text": "/start",
+        "from": {
+            "id": 3000006,
+            "last_name": "Sample",
+            "first_name": "Max",
+            "username": "TheUserName"
+        },
+        "message_id": 111,
+        "chat": {
+            "id": 3000006,
+            "first_name": "Max"
+        }
+    }
+}
+
+def Post(Url, Data):
+    Request = urllib.request.Request(Url,
+                                     data = json.dumps(Data).encode("utf-8"),
+                                     headers = {"Content-Type":
+                                                "application/json"}
+                                     )
+    try:
+        with urllib.request.urlopen(Request) as Response:
+            return Response.status
+    except urllib.error.HTTPError as Error:
+        return Error.code
+
+if __name__ == "__main__":
+    print("Online")
+    Updates = queue.Queue()
+    Server = telegram.WebhookServer(("127.0.0.1", 0), "/secret", Updates.put)
+    threading.Thread(target = Server.serve_forever, daemon = True).start()
+    Url = "http://127.0.0.1:{}".format(Server.server_port)
+
+    print(Post(Url + "/secret", RecordedUpdate) == 200)
+    print(Updates.get(timeout = 1) == RecordedUpdate)
+
+    # a recorded getUpdates answer
+    print(Post(Url + "/secret", {"ok": True,
+                                 "result": [RecordedUpdate, RecordedUpdate]}
+               ) == 200)
+    print(Updates.qsize() == 2)
+
+    # a wrong secret
+    print(Post(Url + "/wrong", RecordedUpdate) == 404)
+
+    Server.shutdown()
+    Server.server_close()
+    print("Offline")